@@ -1,17 +1,35 @@
+import argparse
+import asyncio
 import json
-import itertools
-import re
+import os
 import requests
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from requests.packages import urllib3
 from datetime import datetime
+from functools import partial
 import time
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.changeset import ChangesetWriter, load_features
+from common.checkpoint import CheckpointStore, remove_checkpoint
+from common.geojson_writer import FeatureCollectionWriter, write_features
+from common.http_cache import create_session
+from common.metrics import propagate, run_instrumented, stage
+from common.opening_hours import DAY_INDEX, compile_opening_hours
+from common.snapshot import snapshot_writers
+
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 # Constants
 SSL_VERIFY = False
 BASE_URL = 'https://www.action.com'
 GRAPHQL_URL = 'https://www.action.com/api/graphql/'
+CONCURRENCY = 8
+HERE = os.path.dirname(os.path.abspath(__file__))
+GEOJSON_FILE = os.path.join(HERE, 'action.geojson')
+CHECKPOINT_FILE = os.path.join(HERE, 'action.checkpoint.sqlite')
+REPORT_FILE = os.path.join(HERE, 'action.metrics.json')
 
 # GraphQL query
 GRAPHQL_QUERY = """
@@ -33,27 +51,74 @@ GRAPHQL_QUERY = """
 """
 
 day_name_mappings = {
-    "Maandag": "Mo",
-    "Dinsdag": "Tu",
-    "Woensdag": "We",
-    "Donderdag": "Th",
-    "Vrijdag": "Fr",
-    "Zaterdag": "Sa",
-    "Zondag": "Su"
+    "Maandag": DAY_INDEX["Mo"],
+    "Dinsdag": DAY_INDEX["Tu"],
+    "Woensdag": DAY_INDEX["We"],
+    "Donderdag": DAY_INDEX["Th"],
+    "Vrijdag": DAY_INDEX["Fr"],
+    "Zaterdag": DAY_INDEX["Sa"],
+    "Zondag": DAY_INDEX["Su"]
 }
 
-def fetch_graphql_data(page):
+def fetch_graphql_data(page, session=requests):
     headers = { 'Content-Type': 'application/json' }
     data = json.loads(GRAPHQL_QUERY % page)
     while True:
         try:
-            response = requests.post(GRAPHQL_URL, headers=headers, json=data, verify=SSL_VERIFY)
+            response = session.post(GRAPHQL_URL, headers=headers, json=data, verify=SSL_VERIFY)
             response.raise_for_status()
-            return response.json()
+            with stage('parse'):
+                return response.json()
         except requests.exceptions.RequestException as e:
             print(f"Error {e} fetching data for page {page}. Retrying in 61 seconds...")
             time.sleep(61)  # Wait for 61 seconds before retrying
 
+async def fetch_all_pages(concurrency=CONCURRENCY, session=requests, store=None):
+    """
+    Fetch StoreSearch pages with up to `concurrency` requests in flight.
+    Pages are requested ahead until an empty page is seen, then the shops
+    of every page before it are returned in page order. With a checkpoint
+    store, pages already fetched are not requested again.
+    """
+    loop = asyncio.get_running_loop()
+    pages = {}
+    in_flight = {}
+    next_page = 0
+    empty_page = None
+
+    def add_page(page, shops):
+        nonlocal empty_page
+        if shops:
+            pages[page] = shops
+        elif empty_page is None or page < empty_page:
+            empty_page = page
+
+    fetch_page = propagate(fetch_graphql_data)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while True:
+            while empty_page is None and len(in_flight) < concurrency:
+                done = store.get(f'page:{next_page}') if store is not None else None
+                if done is not None:
+                    add_page(next_page, done['result'])
+                else:
+                    task = loop.run_in_executor(executor, fetch_page, next_page, session)
+                    in_flight[task] = next_page
+                next_page += 1
+
+            if not in_flight:
+                break
+
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                page = in_flight.pop(task)
+                payload = task.result()
+                shops = payload.get('data', {}).get('storeSearchV2', [])
+                if store is not None:
+                    store.put(f'page:{page}', payload, shops)
+                add_page(page, shops)
+
+    return [shop for page in sorted(pages) if page < empty_page for shop in pages[page]]
+
 def read_prop(obj, prop_path):
     parts = prop_path.split('.')
     value = obj
@@ -65,29 +130,15 @@ def parse_opening_hours(obj):
     data = read_prop(obj, 'openingDays')
     if len(data) <= 0: return ""
 
-    dico = {}
+    slots = []
     for d in data:
-        day = d.get('dayName')
         opening_hours = d.get('openingHour')
+        # Closed days may have no usable dayName: only map the open ones
         if opening_hours:
-            hours = opening_hours[0].get('openFrom') + "-" + opening_hours[0].get('openUntil')
-            if hours in dico:
-                dico[hours].append(day)
-            else:
-                dico[hours] = [day]
-
-    int_to_day = day_name_mappings
-
-    slots = []
-
-    for k in dico:
-        days = dico[k]
-        days = [int_to_day[day] for day in days]  # Convert to short form
-        slots.append(f"{','.join(days)} {k}")
+            day = day_name_mappings[d.get('dayName')]
+            slots.append((day, opening_hours[0].get('openFrom') + "-" + opening_hours[0].get('openUntil')))
 
-    sanitized = "; ".join(slots)
-    sanitized = re.sub("^Mo-Su ", "", sanitized)
-    return sanitized
+    return compile_opening_hours(slots)
 
 def process_shop(shop):
     info = shop
@@ -131,39 +182,46 @@ def process_shop(shop):
         "type": "Feature",
         "properties": properties,
         "geometry": {
+            # The API returns the coordinates as strings
             "coordinates": [
-                info.get('geoLocation').get('long'),
-                info.get('geoLocation').get('lat')
+                float(info.get('geoLocation').get('long')),
+                float(info.get('geoLocation').get('lat'))
             ],
             "type": "Point"
         }
     }
     return shop_feature
 
-def main():
-    page = 0
-    features = []
-    while True:
-        data = fetch_graphql_data(page)
-        shops = data.get('data', {}).get('storeSearchV2', [])
-        if not shops:
-            break
-        for shop in shops:
-            shop_feature = process_shop(shop)
-            if shop_feature:
-                features.append(shop_feature)
-        page += 1
-
-    res = 'action.geojson'
-    geojson = {
-        "type": "FeatureCollection",
-        "features": features
-    }
+def fetch(session=requests, concurrency=CONCURRENCY, resume=False):
+    with CheckpointStore(CHECKPOINT_FILE, resume) as store:
+        if resume:
+            print(f'Resuming: {len(store)} pages already fetched')
+        return asyncio.run(fetch_all_pages(concurrency, session, store))
 
-    with open(res, 'w', encoding='utf-8') as f:
-        json.dump(geojson, f, ensure_ascii=False, indent=2)
+def transform(shops):
+    return [feature for feature in map(process_shop, shops) if feature]
 
-    print(f'Dumped {len(features)} shops in the file: {res}')
+def write(features):
+    # The change-set is closed first: if it fails, the previous GeoJSON is kept to build it again
+    previous = load_features(GEOJSON_FILE)
+    count = write_features(features, ChangesetWriter(os.path.join(HERE, 'action'), previous, 'ref:FR:action:id'),
+                           FeatureCollectionWriter(GEOJSON_FILE), *snapshot_writers(GEOJSON_FILE))
+
+    print(f'Dumped {count} shops in the file: {os.path.basename(GEOJSON_FILE)}')
+    # The run is complete: the next --resume must not reuse its pages
+    remove_checkpoint(CHECKPOINT_FILE)
+
+def main():
+    parser = argparse.ArgumentParser(description='Scrape Action shops from the StoreSearch GraphQL API.')
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY,
+                        help=f'number of pages fetched in parallel (default: {CONCURRENCY})')
+    parser.add_argument('--resume', action='store_true',
+                        help='resume a run that did not complete: pages it fetched are not fetched again')
+    args = parser.parse_args()
+
+    concurrency = max(1, args.concurrency)
+    fetch_pages = partial(fetch, concurrency=concurrency, resume=args.resume)
+    run_instrumented(REPORT_FILE, create_session(concurrency), fetch_pages, transform, write)
 
 if __name__ == "__main__":
     main()
@@ -1,33 +1,30 @@
+import argparse
 import json
-import itertools
 import os
-import re
 import requests
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from requests.packages import urllib3
 from datetime import datetime
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from bs4 import BeautifulSoup
 import subprocess
-from fake_useragent import UserAgent
-from tqdm import tqdm
-from multiprocessing import Pool, cpu_count, current_process
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.browser import BrowserPool, ClearanceSession, HarvestError, chrome_driver
+from common.embedded_json import find_script
+from common.geojson_writer import FeatureCollectionWriter, write_features
+from common.http_cache import create_session
+from common.opening_hours import compile_opening_hours
+from common.snapshot import snapshot_writers
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 # Constants
 SSL_VERIFY = False
 BASE_URL = 'https://www.action.com'
-
-# Set up Selenium WebDriver options
-chrome_options = Options()
-chrome_options.add_argument('--headless')
-chrome_options.add_argument('--disable-gpu')
-chrome_options.add_argument(f'user-agent={UserAgent().chrome}')
+CONCURRENCY = 8
+HERE = os.path.dirname(os.path.abspath(__file__))
+GEOJSON_FILE = os.path.join(HERE, 'action.geojson')
 
 def find_chromedriver_path():
     if os.name == 'nt':  # Windows
@@ -40,32 +37,22 @@ def find_chromedriver_path():
     else:  # Linux or macOS
         return '/path/to/chromedriver'  # Update with the path to your chromedriver
 
-chromedriver_path = find_chromedriver_path()
-service = Service(chromedriver_path)
-
-def download_with_selenium(driver, url):
-    try:
-        driver.get(url)
-        WebDriverWait(driver, 30).until(
-            EC.presence_of_element_located((By.TAG_NAME, "pre"))
-        )
-        element = driver.find_element(By.TAG_NAME, "pre")
-        json_data = element.text
-        return json_data
-    except Exception as e:
-        print(f"Error {e} downloading data from {url}")
-        return None
+def new_driver():
+    from fake_useragent import UserAgent
+    return chrome_driver(find_chromedriver_path(), UserAgent().chrome)
 
-def download_shop_opening_hours(driver, url):
+def download_json(client, url):
+    """
+    Download a JSON document, or the ld+json script of an HTML page, through
+    the plain HTTP client carrying the browser cookies. Return None when the
+    download fails, including when no browser could get the cookies.
+    """
     try:
-        driver.get(url)
-        WebDriverWait(driver, 30).until(
-            EC.presence_of_element_located((By.XPATH, "//script[@type='application/ld+json']"))
-        )
-        script_tag = driver.find_element(By.XPATH, "//script[@type='application/ld+json']")
-        json_data = script_tag.get_attribute('innerHTML')
-        return json_data
-    except Exception as e:
+        response = client.get(url, verify=SSL_VERIFY)
+        response.raise_for_status()
+        script = find_script(response.content, type='application/ld+json')
+        return json.loads(script if script is not None else response.content)
+    except (requests.exceptions.RequestException, HarvestError, ValueError) as e:
         print(f"Error {e} downloading data from {url}")
         return None
 
@@ -73,75 +60,29 @@ def read_prop(obj, prop_name):
     prop = obj.get(prop_name)
     return "" if prop is None else prop
 
-def ranges(i):
-    for a, b in itertools.groupby(enumerate(i), lambda pair: pair[1] - pair[0]):
-        b = list(b)
-        yield b[0][1], b[-1][1]
-
 def parse_opening_hours(obj):
     data = read_prop(obj, 'openingHours')
     if len(data) <= 0: return ""
 
-    dico = {}
+    slots = []
     for d in data:
         day = d.get('dayOfWeek')
         week = d.get('opens')
         opening = week.get('opens')
         closing = week.get('closes')
         if opening is not None and closing is not None:
-            hours = opening + "-" + closing
-            if hours in dico:
-                dico[hours].append(day)
-            else:
-                dico[hours] = [day]
-
-    int_to_day = {
-        0: "Mo",
-        1: "Tu",
-        2: "We",
-        3: "Th",
-        4: "Fr",
-        5: "Sa",
-        6: "Su"
-    }
+            slots.append((day, opening + "-" + closing))
 
-    slots = []
+    return compile_opening_hours(slots)
 
-    for k in dico:
-        d = dico[k]
-        d.sort()
-        days = list(ranges(d))
-        for t in days:
-            first = t[0]
-            last = t[1]
-            if first != last:
-                slots.append({
-                    'index': first,
-                    'range': int_to_day[first] + "-" + int_to_day[last] + " " + k
-                })
-            else:
-                slots.append({
-                    'index': first,
-                    'range': int_to_day[first] + " " + k
-                })
-
-    slots.sort(key=lambda x: x.get('index'))
-    sanitized = "; ".join(o.get('range') for o in slots)
-    sanitized = re.sub("^Mo-Su ", "", sanitized)
-    return sanitized
-
-def process_shop(shop):
-    driver = globals().get(f'driver_{current_process().name}')
+def process_shop(shop, client):
     shop_id = shop.get('id')
     url = BASE_URL + '/api/stores/' + shop_id + '/'
-    shop_json = download_shop_opening_hours(driver, url)
-    if not shop_json:
+    info = download_json(client, url)
+    if not info:
         print(f"Failed to download data for shop {shop_id}. Skipping.")
         return None
 
-    json_data = json.loads(shop_json)
-    info = json_data
-
     start = read_prop(info, 'initialOpeningDate')
 
     # Skip shops that don't have start_date
@@ -191,46 +132,33 @@ def process_shop(shop):
     }
     return shop_feature
 
-def worker_init(driver_path):
-    global driver
-    chrome_options = Options()
-    chrome_options.add_argument('--headless')
-    chrome_options.add_argument('--disable-gpu')
-    chrome_options.add_argument(f'user-agent={UserAgent().chrome}')
-    service = Service(driver_path)
-    driver = webdriver.Chrome(service=service, options=chrome_options)
-    globals()[f'driver_{current_process().name}'] = driver
-
-def worker_exit(driver):
-    driver.quit()
-
 def main():
-    url = BASE_URL + '/api/stores/coordinates/'
-    driver = webdriver.Chrome(service=service, options=chrome_options)
-    shops_json = download_with_selenium(driver, url)
-    driver.quit()
-    if not shops_json:
-        print(f"Failed to download {url}. Exiting.")
-        return
-
-    shops_data = json.loads(shops_json)
-    shops = shops_data.get('data').get('items')
-
-    with Pool(cpu_count(), initializer=worker_init, initargs=(chromedriver_path,)) as pool:
-        features = list(tqdm(pool.imap(process_shop, shops), total=len(shops), desc="Processing shops"))
-
-    features = [feature for feature in features if feature is not None]
-
-    res = 'action.geojson'
-    geojson = {
-        "type": "FeatureCollection",
-        "features": features
-    }
-
-    with open(res, 'w', encoding='utf-8') as f:
-        json.dump(geojson, f, ensure_ascii=False, indent=2)
-
-    print(f'Dumped {len(features)} shops in the file: {res}')
+    parser = argparse.ArgumentParser(description='Scrape Action shops through the browser-protected store API.')
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY,
+                        help=f'number of shops fetched in parallel (default: {CONCURRENCY})')
+    args = parser.parse_args()
+    concurrency = max(1, args.concurrency)
+    from tqdm import tqdm
+
+    # The browser only gets the clearance cookies, the JSON documents are fetched over plain HTTP.
+    # The session holds one set of cookies, harvested by one browser at a time: a single one is enough.
+    with BrowserPool(1, new_driver) as pool:
+        client = ClearanceSession(pool, BASE_URL, create_session(concurrency))
+        url = BASE_URL + '/api/stores/coordinates/'
+        shops_data = download_json(client, url)
+        if not shops_data:
+            print(f"Failed to download {url}. Exiting.")
+            return
+
+        shops = shops_data.get('data').get('items')
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            features = tqdm(executor.map(partial(process_shop, client=client), shops), total=len(shops), desc="Processing shops")
+            count = write_features((feature for feature in features if feature is not None),
+                                   FeatureCollectionWriter(GEOJSON_FILE), *snapshot_writers(GEOJSON_FILE))
+
+    print(f'Dumped {count} shops in the file: {os.path.basename(GEOJSON_FILE)}')
+    print(f'Browser sessions used: {client.harvests}')
 
 if __name__ == "__main__":
     main()
@@ -1,14 +1,15 @@
 import html
-import itertools
-import json
 import os
-import re
-from bs4 import BeautifulSoup
+import sys
 
-def ranges(i):
-    for a, b in itertools.groupby(enumerate(i), lambda pair: pair[1] - pair[0]):
-        b = list(b)
-        yield b[0][1], b[-1][1]
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.address import parse_address
+from common.geojson_writer import FeatureCollectionWriter, write_features
+from common.json_stream import iter_json_array
+from common.metrics import stage
+from common.opening_hours import compile_opening_hours
+from common.pipeline import run_pipeline
+from common.snapshot import snapshot_writers
 
 def getPostcode(data):
     return data.split(" ")[0]
@@ -18,30 +19,11 @@ def getCity(data):
     city = " ".join(b[1:])
     return city.title()
 
-def getHousenumber(s):
-    if re.match('^[0-9].*, ', s):
-        return s.split(", ")[0]
-    if re.match('^[0-9].* ', s):
-        return s.split(" ")[0]
-    return ""
-
-def getStreet(s):
-    if re.match('^[0-9].*, ', s):
-        return " ".join(s.split(", ")[1:])
-    if re.match('^[0-9].* ', s):
-        return " ".join(s.split(" ")[1:])
-    return s
-
-def startWithStreet(s):
-    if re.match('^allée', s, re.IGNORECASE): return True
-    if re.match('^rue', s, re.IGNORECASE): return True
-    if re.match('^chemin', s, re.IGNORECASE): return True
-    if re.match('^avenue', s, re.IGNORECASE): return True
-    if re.match('^boulevard', s, re.IGNORECASE): return True
-    return False
-
 def getAddr(data):
-    soup = BeautifulSoup(data)
+    from bs4 import BeautifulSoup
+
+    with stage('parse'):
+        soup = BeautifulSoup(data)
     # Find div with address
     addr_div = soup.select_one("div.col-xs-12")
     # Remove all the <p> tags inside the addr_div
@@ -59,110 +41,56 @@ def getAddr(data):
     for l in range(len(lines)):
         lines[l] = lines[l].replace('\t', ' ').strip()
 
-    if len(lines) == 2:
-        return {
-            'addr:housenumber': getHousenumber(lines[0]),
-            'addr:street': getStreet(lines[0]),
-            'addr:place': '',
-            'addr:postcode': getPostcode(lines[1]),
-            'addr:city': getCity(lines[1]),
-            'note': " ".join(lines)
-        } 
-    if len(lines) == 3:
-        if re.match("^[0-9]", lines[0]) or startWithStreet(lines[0]):
-            housenumber = getHousenumber(lines[0])
-            street = getStreet(lines[0])
-            place = lines[1]
-        elif re.match("^[0-9]", lines[1]) or startWithStreet(lines[1]):
-            housenumber = getHousenumber(lines[1])
-            street = getStreet(lines[1])
-            place = lines[0]
-        else:
-            housenumber = getHousenumber(lines[0])
-            street = getStreet(lines[0])
-            place = lines[1]
-        
+    if len(lines) == 2 or len(lines) == 3:
+        # Street lines first, then the postcode and city line
+        housenumber, street, place = parse_address(tuple(lines[:-1]), 'bnm')
         return {
             'addr:housenumber': housenumber,
             'addr:street': street,
             'addr:place': place,
-            'addr:postcode': getPostcode(lines[2]),
-            'addr:city': getCity(lines[2]),
+            'addr:postcode': getPostcode(lines[-1]),
+            'addr:city': getCity(lines[-1]),
             'note': " ".join(lines)
         }
     print("error addr: %s" % len(lines))
 
 
 def gethours(day):
-    if len(day) <= 0: return ""
-    hours = ""
-    zero = day.get("0-")
-    if zero is not None and len(zero.get("from")) > 0 and len(zero.get("to")) > 0:
-        hours += zero.get("from")[:5] + "-" + zero.get("to")[:5]
-    one = day.get("1-")
-    if one is not None and len(one.get("from")) > 0 and len(one.get("to")) > 0:
-        hours += "," + one.get("from")[:5] + "-" + one.get("to")[:5]
+    if len(day) <= 0: return []
+    hours = []
+    for slot in (day.get("0-"), day.get("1-")):
+        if slot is not None and len(slot.get("from")) > 0 and len(slot.get("to")) > 0:
+            hours.append(slot.get("from")[:5] + "-" + slot.get("to")[:5])
     return hours
 
 def formatHours(data):
     if len(data) <= 0: return ""
-    dico = {}
     days = ['Mo', 'Tu', 'We', 'Th', 'Fr', 'Sa', 'Su']
-    for i, d in enumerate(days):
-        dat = data.get(d)
-        if dat is not None:
-            hours = gethours(dat)
-            if dico.get(hours) is None:
-                dico[hours] = [i]
-            else:
-                dico[hours].append(i)
-                
-    intToDay = {
-        0: "Mo",
-        1: "Tu",
-        2: "We",
-        3: "Th",
-        4: "Fr",
-        5: "Sa",
-        6: "Su"
-    }
-    
-    slots = []
-
-    for k in dico:
-        if len(k) <= 0: continue
-        d = dico[k]
-        d.sort()
-        days = list(ranges(d))
-        for t in days :
-            first = t[0]
-            last = t[1]
-            if first != last:
-                slots.append({
-                    'index': first,
-                    'range': intToDay[first] + "-" + intToDay[last] + " " + k
-                })
-            else:
-                slots.append({
-                    'index': first,
-                    'range': intToDay[first] + " " + k
-                })
-
-    slots.sort(key=lambda x: x.get('index'))
-    sanitized = "; ".join(o.get('range') for o in slots)
-    sanitized = re.sub("^Mo-Su ", "", sanitized)
-    return sanitized  
-
-file = open('shops.json', mode='r', encoding='utf-')
-data = json.load(file)
-file.close()
-
-features = []
-for dat in data:
+    return compile_opening_hours(
+        (i, hours)
+        for i, d in enumerate(days)
+        if data.get(d) is not None
+        for hours in gethours(data.get(d))
+    )
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SHOPS_FILE = os.path.join(HERE, 'shops.json')
+GEOJSON_FILE = os.path.join(HERE, 'bnm.geojson')
+REPORT_FILE = os.path.join(HERE, 'bnm.metrics.json')
+# The shops are streamed from fetch to write, see common.pipeline
+STREAMING = True
+
+def fetch(session=None):
+    # The shops are saved by hand from the store locator
+    # and read one by one, without loading the whole file
+    with open(SHOPS_FILE, mode='r', encoding='utf-8') as file:
+        yield from iter_json_array(file)
+
+def transform(dat):
     shop = dat[1]
     oh = formatHours(shop.get('hours'))
     addr = getAddr(shop.get('pop'))
-    
+
     properties = {
         'shop': 'variety_store',
         'name': 'B&M',
@@ -191,19 +119,15 @@ for dat in data:
         "properties": properties
     }
 
-    features.append(feature)
-
-res = 'bnm.geojson'
-if os.path.exists(res):
-    os.remove(res)
+    return feature
 
+def write(features):
+    count = write_features(features, FeatureCollectionWriter(GEOJSON_FILE), *snapshot_writers(GEOJSON_FILE))
+    print(f'Dump {count} shops in the file: {os.path.basename(GEOJSON_FILE)}')
+    return count
 
-geojson = {
-  "type": "FeatureCollection",
-  "features": features
-}
+def main():
+    run_pipeline(REPORT_FILE, None, fetch, transform, write)
 
-with open(res, 'w', encoding='utf-8') as f:
-    json.dump(geojson, f, ensure_ascii=False, indent=2)
-  
-print(f'Dump {len(features)} shops in the file: {res}')
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,83 +1,95 @@
-# Import the requests library to get the JSON file from the URL
-import json
-import re
+import os
 import requests
+import sys
+
+# Import the shared HTTP session to get the JSON file from the URL
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.address import split_housenumber
+from common.geojson_writer import FeatureCollectionWriter, write_features
+from common.http_cache import create_session
+from common.metrics import run_instrumented, stage
+from common.snapshot import snapshot_writers
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+GEOJSON_FILE = os.path.join(HERE, 'feuillette.geojson')
+REPORT_FILE = os.path.join(HERE, 'feuillette.metrics.json')
 
 # Define the URL of the JSON file
-url = "https://www.feuillette.fr/wp-content/themes/Divi-Child/api/boulangeries.php"
-
-# Get the response from the URL and parse it as a JSON object
-response = requests.get(url)
-data = response.json()
-
-# Convert the top JSON object into an array of shops
-shops = list(data.values())
-
-# Initialize an empty list to store the geojson features
-features = []
-
-# Loop through each shop in the array
-for shop in shops:
-    # Extract the relevant information from the shop object
-    address = shop["adresse"].strip()
-
-    properties = {
-        "addr:postcode": shop["code_postal"],
-        "addr:city": shop["ville"],
-        "alt_name": shop["title"],
-        "brand": "Feuillette",
-        "email": shop["email"],
-        "fixme": "Check address and opening hours, then delete the fixme, fixme:addr and fixme:oh",
-        "fixme:addr": address,
-        "fixme:oh": shop["texte"],
-        "name": "Boulangerie Feuillette",
-        "ref:FR:Feuillette:extranet": shop["id_extranet"],
-        "ref:FR:Feuillette:id": f'{shop["post_id"]}',
-        "shop": "bakery"
-    }
-    
-    # Use a regular expression to find the house number and street name in the address
-    match = re.search(r"^(\d+[-\/]?\d?[\w]*),?\s+(.*)", address)
+URL = "https://www.feuillette.fr/wp-content/themes/Divi-Child/api/boulangeries.php"
+
+def fetch(session=requests):
+    # Get the response from the URL and parse it as a JSON object
+    response = session.get(URL)
+    with stage('parse'):
+        return response.json()
+
+def transform(data):
+    # Convert the top JSON object into an array of shops
+    shops = list(data.values())
+
+    # Initialize an empty list to store the geojson features
+    features = []
+
+    # Loop through each shop in the array
+    for shop in shops:
+        # Extract the relevant information from the shop object
+        address = shop["adresse"].strip()
+
+        properties = {
+            "addr:postcode": shop["code_postal"],
+            "addr:city": shop["ville"],
+            "alt_name": shop["title"],
+            "brand": "Feuillette",
+            "email": shop["email"],
+            "fixme": "Check address and opening hours, then delete the fixme, fixme:addr and fixme:oh",
+            "fixme:addr": address,
+            "fixme:oh": shop["texte"],
+            "name": "Boulangerie Feuillette",
+            "ref:FR:Feuillette:extranet": shop["id_extranet"],
+            "ref:FR:Feuillette:id": f'{shop["post_id"]}',
+            "shop": "bakery"
+        }
     
-    # If there is a match, assign the groups to the corresponding properties
-    if match:
-        properties["addr:housenumber"] = match.group(1)
-        properties["addr:street"] = match.group(2)
-    else:
-        properties["addr:street"] = address
-
-    # Convert the date of opening into YYYY-MM-DD format
-    o = shop["date_douverture"]
-    if len(o) == 10:
-        properties["start_date"] = f'{o[-4:]}-{o[3:5]}-{o[0:2]}'
-
-    # Format phone +33
-    p = shop["telephone"].replace(" ", "")
-    if len(p) > 9:
-        properties["phone"] = f"+33 {p[-9]} {p[-8:-6]} {p[-6:-4]} {p[-4:-2]} {p[-2:]}"
+        # Find the house number and street name in the address
+        housenumber, street = split_housenumber(address)
+
+        # The whole address is the street when there is no house number
+        if housenumber:
+            properties["addr:housenumber"] = housenumber
+        properties["addr:street"] = street
+
+        # Convert the date of opening into YYYY-MM-DD format
+        o = shop["date_douverture"]
+        if len(o) == 10:
+            properties["start_date"] = f'{o[-4:]}-{o[3:5]}-{o[0:2]}'
+
+        # Format phone +33
+        p = shop["telephone"].replace(" ", "")
+        if len(p) > 9:
+            properties["phone"] = f"+33 {p[-9]} {p[-8:-6]} {p[-6:-4]} {p[-4:-2]} {p[-2:]}"
     
 
-    # Create a geojson feature for the shop with the OpenStreetMap attributes
-    feature = {
-        "type": "Feature",
-        "geometry": {
-            "type": "Point",
-            "coordinates": [float(shop["longitude"]), float(shop["lattitude"])]
-        },
-        "properties": properties
-    }
-
-    # Append the feature to the list of features
-    features.append(feature)
-
-# Create a geojson object with the list of features
-geojson = {
-    "type": "FeatureCollection",
-    "features": features
-}
-
-# Write the geojson feature collection to a file named "feuillette.geojson" with 2 spaces indentation
-with open("feuillette.geojson", "w") as f:
-    json.dump(geojson, f, indent=2)
-
-print(f'Dump {len(features)} shops in feuillette.geojson')
\ No newline at end of file
+        # Create a geojson feature for the shop with the OpenStreetMap attributes
+        feature = {
+            "type": "Feature",
+            "geometry": {
+                "type": "Point",
+                "coordinates": [float(shop["longitude"]), float(shop["lattitude"])]
+            },
+            "properties": properties
+        }
+
+        # Append the feature to the list of features
+        features.append(feature)
+    return features
+
+def write(features):
+    # Write the geojson feature collection to a file named "feuillette.geojson" with 2 spaces indentation
+    write_features(features, FeatureCollectionWriter(GEOJSON_FILE, ensure_ascii=True), *snapshot_writers(GEOJSON_FILE))
+    print(f'Dump {len(features)} shops in feuillette.geojson')
+
+def main():
+    run_instrumented(REPORT_FILE, create_session(), fetch, transform, write)
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,13 @@
-import itertools
-import json
 import os
-import re
+import sys
 
-def ranges(i):
-    for a, b in itertools.groupby(enumerate(i), lambda pair: pair[1] - pair[0]):
-        b = list(b)
-        yield b[0][1], b[-1][1]
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.address import parse_address
+from common.geojson_writer import FeatureCollectionWriter, write_features
+from common.json_stream import iter_json_array
+from common.opening_hours import compile_opening_hours
+from common.pipeline import run_pipeline
+from common.snapshot import snapshot_writers
 
 def formatPhone(p):
     if p is None: return ""
@@ -14,127 +15,37 @@ def formatPhone(p):
     a = (p[:3], p[3], p[4:6], p[6:8], p[8:10], p[10:])
     return " ".join(a)
 
-def getHousenumber(s):
-    if not re.match("^[0-9]", s): return ""
-    index = s.find(",")
-    if index > 0:
-        return s[:index].strip()
-    else:
-        return s.split(" ")[0]
-
-def getStreet(s):
-    if not re.match("^[0-9]", s): return s
-    index = s.find(",")
-    if index > 0:
-        return s[index+1:].strip()
-    else:
-        return " ".join(s.split(" ")[1:])
-
-def compareStreet(s1, s2):
-    s1 = s1.replace(",", "")
-    s2 = s2.replace(",", "")
-    return s1 == s2
-
 def formatAddr(s1, s2):
-    if compareStreet(s1, s2):
-        return {
-            'housenumber': getHousenumber(s1),
-            'street': getStreet(s1),
-            'place': ''
-        }
-
-    if re.match("^[0-9]", s1):
-        return {
-            'housenumber': getHousenumber(s1),
-            'street': getStreet(s1),
-            'place': s2
-        }
-    
-    if re.match("^[0-9]", s2):
-        return {
-            'housenumber': getHousenumber(s2),
-            'street': getStreet(s2),
-            'place': s1
-        }
-
+    housenumber, street, place = parse_address((s1, s2), 'gifi')
     return {
-        'housenumber': getHousenumber(s1),
-        'street': getStreet(s1),
-        'place': s2
+        'housenumber': housenumber,
+        'street': street,
+        'place': place
     }
 
 def formatHours(data):
     if len(data) <=0: return ""
-
-    for d in data:
-        arr = data.get(d)
-        for i, a in enumerate(arr):
-            hh = a.split('-')
-            if re.match("^[0-9]:", hh[0]):
-                hh[0] = "0" + hh[0]
-            if re.match("^[0-9]:", hh[1]):
-                hh[1] = "0" + hh[1]
-            arr[i] = "-".join(hh)
-        
-
-    arr = [
-        ",".join(data.get('monday')),
-        ",".join(data.get('tuesday')),
-        ",".join(data.get('wednesday')),
-        ",".join(data.get('thursday')),
-        ",".join(data.get('friday')),
-        ",".join(data.get('saturday')),
-        ",".join(data.get('sunday'))
-    ]
-
-    dico = {}
-    for i, d in enumerate(arr):
-        if dico.get(d) is None:
-            dico[d] = [i]
-        else:
-            dico[d].append(i)
-
-    intToDay = {
-        0: "Mo",
-        1: "Tu",
-        2: "We",
-        3: "Th",
-        4: "Fr",
-        5: "Sa",
-        6: "Su"
-    }
-    
-    slots = []
-
-    for k in dico:
-        if len(k) <= 0: continue
-        d = dico[k]
-        d.sort()
-        days = list(ranges(d))
-        for t in days :
-            first = t[0]
-            last = t[1]
-            if first != last:
-                slots.append({
-                    'index': first,
-                    'range': intToDay[first] + "-" + intToDay[last] + " " + k
-                })
-            else:
-                slots.append({
-                    'index': first,
-                    'range': intToDay[first] + " " + k
-                })
-
-    slots.sort(key=lambda x: x.get('index'))
-    sanitized = "; ".join(o.get('range') for o in slots)
-    sanitized = re.sub("^Mo-Su ", "", sanitized)
-    return sanitized  
-
-file = open('gifi.json', mode='r', encoding='utf-8')
-jsonData = json.load(file)
-
-features = []
-for data in jsonData:
+    days = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+    return compile_opening_hours(
+        (i, hours)
+        for i, day in enumerate(days)
+        for hours in data.get(day)
+    )
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+JSON_FILE = os.path.join(HERE, 'gifi.json')
+GEOJSON_FILE = os.path.join(HERE, 'gifi.geojson')
+REPORT_FILE = os.path.join(HERE, 'gifi.metrics.json')
+# The stores are streamed from fetch to write, see common.pipeline
+STREAMING = True
+
+def fetch(session=None):
+    # The stores are saved by hand from the store locator
+    # and read one by one, without loading the whole file
+    with open(JSON_FILE, mode='r', encoding='utf-8') as file:
+        yield from iter_json_array(file)
+
+def transform(data):
     phone = formatPhone(data.get('international_phone'))
     addr = formatAddr(data.get('street1'), data.get('street2'))
     oh = formatHours(data.get('formatted_opening_hours'))
@@ -171,19 +82,15 @@ for data in jsonData:
         "properties": properties
     }
 
-    features.append(feature)
-
-res = 'gifi.geojson'
-if os.path.exists(res):
-    os.remove(res)
+    return feature
 
+def write(features):
+    count = write_features(features, FeatureCollectionWriter(GEOJSON_FILE), *snapshot_writers(GEOJSON_FILE))
+    print(f'Dump {count} shops in file: {os.path.basename(GEOJSON_FILE)}')
+    return count
 
-geojson = {
-	"type": "FeatureCollection",
-	"features": features
-}
+def main():
+    run_pipeline(REPORT_FILE, None, fetch, transform, write)
 
-with open(res, 'w', encoding='utf-8') as f:
-    json.dump(geojson, f, ensure_ascii=False, indent=2)
-  
-print(f'Dump {len(features)} shops in file: {res}')
\ No newline at end of file
+if __name__ == "__main__":
+    main()
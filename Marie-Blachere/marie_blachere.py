@@ -1,36 +1,61 @@
+import argparse
 import csv
 import datetime
+import hashlib
 import html
 import json
+import os
 import re
 import requests
-from bs4 import BeautifulSoup
-from geojson2osm import geojson2osm
-from tqdm import tqdm
-from multiprocessing import Pool, cpu_count
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.address import split_housenumber
+from common.changeset import ChangesetWriter, load_features
+from common.checkpoint import CheckpointStore, remove_checkpoint
+from common.embedded_json import find_script
+from common.geojson_writer import FeatureCollectionWriter, write_features
+from common.history import record_features
+from common.http_cache import create_session
+from common.metrics import propagate, run_instrumented, stage
+from common.opening_hours import DAY_INDEX, compile_opening_hours
+from common.osm_writer import OsmWriter
+from common.snapshot import snapshot_writers
 
 # Constants
 SSL_VERIFY = True
 ALL_URL = 'https://boulangeries.marieblachere.com/fr/france-FR/all'
-HISTORY_FILE = 'bakery_count_history.csv'
+HERE = os.path.dirname(os.path.abspath(__file__))
+HISTORY_FILE = os.path.join(HERE, 'bakery_count_history.csv')
+HISTORY_DB = os.path.join(HERE, 'history.sqlite')
+GEOJSON_FILE = os.path.join(HERE, 'marie_blachere.geojson')
+OSM_FILE = os.path.join(HERE, 'marie_blachere.osm')
+STATE_FILE = os.path.join(HERE, 'marie_blachere_state.json')
+CHECKPOINT_FILE = os.path.join(HERE, 'marie_blachere.checkpoint.sqlite')
+REPORT_FILE = os.path.join(HERE, 'marie_blachere.metrics.json')
+CONCURRENCY = 16
+MAX_AGE_DAYS = 90
+
+# State of the bakeries fetched by the current run, saved by write() once the outputs are written
+pending_state = None
 
-def fetch_embedded_json():
+def fetch_embedded_json(session=requests):
     """
-    Fetch the page at ALL_URL, then use BeautifulSoup
-    to get JSON embedded that contains all bakeries
+    Fetch the page at ALL_URL, then get the JSON
+    embedded in __NEXT_DATA__ that contains all bakeries
     """
-    response = requests.get(ALL_URL, verify=SSL_VERIFY)
+    response = session.get(ALL_URL, verify=SSL_VERIFY)
     if response.status_code == 200:
-        soup = BeautifulSoup(response.content, 'html.parser')
-        script_tag = soup.find('script', id='__NEXT_DATA__')
-        if script_tag:
-            return json.loads(script_tag.string)
-        else:
-            print('Error: Could not find the __NEXT_DATA__ script tag.')
-            exit()
+        with stage('parse'):
+            script = find_script(response.content, id='__NEXT_DATA__')
+            if script is not None:
+                return json.loads(script)
+            else:
+                raise ValueError(f'Could not find the __NEXT_DATA__ script tag in {ALL_URL}')
     else:
-        print(f'Error {response.status_code} when fetching data from: {ALL_URL}')
-        exit()
+        raise requests.HTTPError(f'Error {response.status_code} when fetching data from: {ALL_URL}', response=response)
 
 def capitalize_first_letter(input_string):
     """Capitalize the first letter of the input string."""
@@ -41,31 +66,28 @@ def capitalize_first_letter(input_string):
 def parse_street_address(street_address):
     """Parse the street address into house number and street name."""
     properties = {}
-    pattern = r'(?P<number>\d+\sà\s\d+)\s(?P<street>.+)'
-    match = re.search(pattern, street_address)
-    if match:
-        properties['addr:housenumber'] = match.group('number')
-        properties['addr:street'] = capitalize_first_letter(match.group('street'))
+    housenumber, street = split_housenumber(street_address, 'marie')
+    if housenumber:
+        properties['addr:housenumber'] = housenumber
+        properties['addr:street'] = capitalize_first_letter(street)
     return properties
 
 def convert_opening_hours(opening_hours_spec):
     """Convert opening hours specification to a formatted string."""
     day_mapping = {
-        "http://schema.org/Monday": "Mo",
-        "http://schema.org/Tuesday": "Tu",
-        "http://schema.org/Wednesday": "We",
-        "http://schema.org/Thursday": "Th",
-        "http://schema.org/Friday": "Fr",
-        "http://schema.org/Saturday": "Sa",
-        "http://schema.org/Sunday": "Su"
+        "http://schema.org/Monday": DAY_INDEX["Mo"],
+        "http://schema.org/Tuesday": DAY_INDEX["Tu"],
+        "http://schema.org/Wednesday": DAY_INDEX["We"],
+        "http://schema.org/Thursday": DAY_INDEX["Th"],
+        "http://schema.org/Friday": DAY_INDEX["Fr"],
+        "http://schema.org/Saturday": DAY_INDEX["Sa"],
+        "http://schema.org/Sunday": DAY_INDEX["Su"]
     }
-    formatted_hours = []
-    for spec in opening_hours_spec:
-        day = day_mapping.get(spec["dayOfWeek"], "")
-        opens = spec["opens"]
-        closes = spec["closes"]
-        formatted_hours.append(f"{day} {opens}-{closes}")
-    return "; ".join(formatted_hours)
+    return compile_opening_hours(
+        (day_mapping[spec["dayOfWeek"]], f"{spec['opens']}-{spec['closes']}")
+        for spec in opening_hours_spec
+        if spec["dayOfWeek"] in day_mapping
+    )
 
 def format_fr_phone_number(phone_number):
     """Format a French phone number to the international format."""
@@ -76,26 +98,33 @@ def format_fr_phone_number(phone_number):
         return f"+33 {digits[3]} {digits[4:6]} {digits[6:8]} {digits[8:10]} {digits[10:12]}"
     return digits
 
-def extract_json_ld(url):
+def parse_json_ld(content):
+    """Return the JSON-LD data embedded in a bakery page, or None."""
+    with stage('parse'):
+        script = find_script(content, type='application/ld+json')
+        if script is not None:
+            return json.loads(script)
+    return None
+
+def extract_json_ld(url, session=requests):
     """Extract JSON-LD data from the given URL."""
-    response = requests.get(url, verify=SSL_VERIFY)
+    response = session.get(url, verify=SSL_VERIFY)
     if response.status_code == 200:
-        soup = BeautifulSoup(response.content, 'html.parser')
-        script_tag = soup.find('script', type='application/ld+json')
-        if script_tag:
-            return json.loads(script_tag.string)
+        return parse_json_ld(response.content)
     return None
 
-def process_bakery(bakery_data):
-    """Process a single bakery's data and return a GeoJSON feature."""
+def get_bakery_url(bakery_data):
+    return f"https://boulangeries.marieblachere.com{bakery_data['url']}"
+
+def bakery_feature(bakery_data, json_ld):
+    """Convert a bakery's data and the JSON-LD of its page to a GeoJSON feature."""
     properties = {
         'alt_name': html.unescape(bakery_data['label']),
         'addr:city': bakery_data['City'].capitalize(),
         'addr:postcode': bakery_data['PostalCode']
     }
 
-    bakery_url = f"https://boulangeries.marieblachere.com{bakery_data['url']}"
-    json_ld = extract_json_ld(bakery_url)
+    bakery_url = get_bakery_url(bakery_data)
 
     if json_ld:
         bakery_info = json_ld[0]
@@ -143,40 +172,141 @@ def process_bakery(bakery_data):
         return feature
     return None
 
-def main():
-    print(f"Number of CPU cores available: {cpu_count()}")
+def process_bakery(bakery_data, session=requests, store=None):
+    """
+    Process a single bakery's data and return a GeoJSON feature. With a
+    checkpoint store, a bakery already fetched is not fetched again.
+    """
+    bakery_url = get_bakery_url(bakery_data)
+    done = store.get(bakery_url) if store is not None else None
+    if done is not None:
+        return done['result']
+
+    json_ld = extract_json_ld(bakery_url, session)
+    feature = bakery_feature(bakery_data, json_ld)
+    if store is not None and feature is not None:
+        store.put(bakery_url, json_ld, feature)
+    return feature
 
-    data = fetch_embedded_json()
+def fingerprint(bakery_data):
+    """Hash of an allPois entry, used to detect bakeries changed since the last run."""
+    raw = json.dumps(bakery_data, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def load_json_file(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+def split_unchanged(bakery_data_list, previous_features, state, max_age):
+    """
+    Split bakeries into the ones to fetch again (new, changed or older than
+    max_age) and the previous features that can be reused as-is.
+    """
+    today = datetime.date.today()
+    to_fetch = []
+    reused = {}
+    for bakery_data in bakery_data_list:
+        bakery_id = bakery_data['Id']
+        known = state.get(bakery_id)
+        if (known and bakery_id in previous_features
+                and known['fingerprint'] == fingerprint(bakery_data)
+                and today - datetime.date.fromisoformat(known['fetched']) <= max_age):
+            reused[bakery_id] = previous_features[bakery_id]
+        else:
+            to_fetch.append(bakery_data)
+    return to_fetch, reused
+
+def fetch(session=requests, concurrency=CONCURRENCY, incremental=False, max_age=MAX_AGE_DAYS, resume=False):
+    """
+    Fetch the list of bakeries, then the pages of the bakeries to update.
+    Return the list with the features of the bakeries by Id. With resume,
+    the bakeries fetched by the previous run are read from the checkpoint.
+    The updated state is kept in pending_state until write() succeeds.
+    """
+    global pending_state
+    from tqdm import tqdm
+
+    data = fetch_embedded_json(session)
     bakery_data_list = data['props']['pageProps']['allPois']
 
-    # Use multiprocessing Pool to process bakeries in parallel
-    with Pool(cpu_count()) as pool:
-        results = list(tqdm(pool.imap_unordered(process_bakery, bakery_data_list), total=len(bakery_data_list), desc="Processing bakeries"))
+    state = load_json_file(STATE_FILE, {})
+    if incremental:
+        previous_features = {f['properties']['ref:FR:MarieBlachere:id']: f for f in load_features(GEOJSON_FILE)}
+        to_fetch, features = split_unchanged(bakery_data_list, previous_features, state, datetime.timedelta(days=max_age))
+        print(f"Reusing {len(features)} unchanged bakeries, fetching {len(to_fetch)}")
+    else:
+        to_fetch, features = bakery_data_list, {}
 
-    features = [feature for feature in results if feature is not None]
+    # Fetching is I/O bound: use threads sharing one keep-alive connection pool
+    with CheckpointStore(CHECKPOINT_FILE, resume) as store:
+        if resume:
+            print(f"Resuming: {len(store)} bakeries already fetched")
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            worker = propagate(partial(process_bakery, session=session, store=store))
+            results = list(tqdm(executor.map(worker, to_fetch), total=len(to_fetch), desc="Processing bakeries"))
 
-    geojson = {
-        'type': 'FeatureCollection',
-        'features': features
-    }
+    today = datetime.date.today().isoformat()
+    for bakery_data, feature in zip(to_fetch, results):
+        if feature is not None:
+            features[bakery_data['Id']] = feature
+            state[bakery_data['Id']] = {'fingerprint': fingerprint(bakery_data), 'fetched': today}
+
+    current_ids = {bakery_data['Id'] for bakery_data in bakery_data_list}
+    pending_state = {bakery_id: known for bakery_id, known in state.items() if bakery_id in current_ids}
 
-    with open('marie_blachere.geojson', 'w', encoding='utf-8') as file:
-        json.dump(geojson, file, indent=4, ensure_ascii=False)
+    return bakery_data_list, features
 
-    print('The geojson file has been created successfully.')
+def save_state(state):
+    tmp_path = f'{STATE_FILE}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(state, file, indent=2, sort_keys=True)
+    os.replace(tmp_path, STATE_FILE)
 
-    osm_xml = geojson2osm(geojson)
+def transform(data):
+    # Keep the order of allPois whether the feature was fetched or reused
+    bakery_data_list, features = data
+    return [features[bakery_data['Id']] for bakery_data in bakery_data_list if bakery_data['Id'] in features]
 
-    with open('marie_blachere.osm', 'w', encoding='utf-8') as output_file:
-        output_file.write(osm_xml)
+def write(features):
+    global pending_state
+    # The change-set is closed first: if it fails, the previous GeoJSON is kept to build it again
+    previous = load_features(GEOJSON_FILE)
+    write_features(features, ChangesetWriter(os.path.join(HERE, 'marie_blachere'), previous, 'ref:FR:MarieBlachere:id'),
+                   FeatureCollectionWriter(GEOJSON_FILE, indent=4), OsmWriter(OSM_FILE), *snapshot_writers(GEOJSON_FILE))
 
-    print('The OSM file has been created successfully.')
+    print('The geojson and OSM files have been created successfully.')
+    # Only now: the next --incremental run reuses the features of the GeoJSON file the state describes
+    if pending_state is not None:
+        save_state(pending_state)
+        pending_state = None
 
     # Record the number of bakeries extracted
     current_date = datetime.datetime.now().strftime('%Y-%m-%d')
+    record_features(HISTORY_DB, 'Marie Blachère', current_date, features, 'ref:FR:MarieBlachere:id', HISTORY_FILE)
     with open(HISTORY_FILE, 'a', newline='') as csvfile:
         writer = csv.writer(csvfile)
         writer.writerow([current_date, len(features)])
+    # The run is complete: the next --resume must not reuse its bakeries
+    remove_checkpoint(CHECKPOINT_FILE)
+
+def main():
+    parser = argparse.ArgumentParser(description='Scrape Marie Blachère bakeries.')
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY,
+                        help=f'number of bakery pages fetched in parallel (default: {CONCURRENCY})')
+    parser.add_argument('--incremental', action='store_true',
+                        help=f'only fetch bakeries that are new or changed since the previous {os.path.basename(GEOJSON_FILE)}')
+    parser.add_argument('--max-age', type=int, default=MAX_AGE_DAYS,
+                        help=f'with --incremental, fetch again bakeries older than this number of days (default: {MAX_AGE_DAYS})')
+    parser.add_argument('--resume', action='store_true',
+                        help='resume a run that did not complete: bakeries it fetched are not fetched again')
+    args = parser.parse_args()
+    concurrency = max(1, args.concurrency)
+
+    fetch_bakeries = partial(fetch, concurrency=concurrency, incremental=args.incremental,
+                             max_age=args.max_age, resume=args.resume)
+    run_instrumented(REPORT_FILE, create_session(concurrency), fetch_bakeries, transform, write)
 
 if __name__ == "__main__":
     main()
@@ -1,38 +1,114 @@
+import bisect
 import csv
 import datetime
-import json
+import os
 import re
 import requests
-from bs4 import BeautifulSoup
-from geojson2osm import geojson2osm
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.changeset import ChangesetWriter, load_features
+from common.geojson_writer import FeatureCollectionWriter, write_features
+from common.history import HistoryWriter
+from common.http_cache import create_session
+from common.metrics import stage
+from common.osm_writer import OsmWriter
+from common.pipeline import run_pipeline
+from common.snapshot import snapshot_writers
 
 # Constants
 SSL_VERIFY = False
-HISTORY_FILE = 'webcam_count_history.csv'
-
-def fetch_html_content(url):
+URL = "https://www.skaping.com/camera/map"
+HERE = os.path.dirname(os.path.abspath(__file__))
+HISTORY_FILE = os.path.join(HERE, 'webcam_count_history.csv')
+HISTORY_DB = os.path.join(HERE, 'history.sqlite')
+GEOJSON_FILE = os.path.join(HERE, 'skaping.geojson')
+OSM_FILE = os.path.join(HERE, 'skaping.osm')
+REPORT_FILE = os.path.join(HERE, 'skaping.metrics.json')
+# The webcams are streamed from fetch to write, see common.pipeline
+STREAMING = True
+RE_MARKER_OR_WINDOW = re.compile(r'(markers|windows)\[(\d+)\]')
+RE_MARKER_COORDS = re.compile(r'.*?\[(.*?), (.*?)\]')
+# Every position where a blank line (\n\s*\n) starts, including overlapping ones
+RE_BLANK_LINE_START = re.compile(r'\n(?=\s*\n)')
+SET_CONTENT = '.setContent("'
+
+def fetch_html_content(url, session=requests):
     """Fetch the HTML content from the given URL."""
-    response = requests.get(url, verify=SSL_VERIFY)
+    response = session.get(url, verify=SSL_VERIFY)
     response.raise_for_status()  # Raise an error for bad status codes
     return response.text
 
-def parse_html(html_content):
-    """Parse the HTML content and extract marker and window information."""
-    soup = BeautifulSoup(html_content, 'html.parser')
-    scripts = soup.find_all('script')
-    features = []
+def find_window_content(script_text, pos, blank_lines):
+    """
+    Find the setContent("...") call of the window referenced at `pos`: the
+    first one on the following lines before a blank line, or else the last
+    one on the same line. blank_lines is the sorted list of the positions
+    where blank lines start. Return the content and the end of the call.
+    """
+    line_end = script_text.find('\n', pos)
+    if line_end == -1:
+        line_end = len(script_text)
+    i = bisect.bisect_left(blank_lines, line_end)
+    block_end = blank_lines[i] if i < len(blank_lines) else len(script_text)
+
+    start = script_text.find(SET_CONTENT, line_end, block_end)
+    if start == -1:
+        start = script_text.rfind(SET_CONTENT, pos, line_end)
+        if start == -1:
+            return None
+    start += len(SET_CONTENT)
+    end = script_text.find('")', start)
+    if end == -1:
+        return None
+    return script_text[start:end], end + 2
+
+def scan_script(script_text):
+    """
+    Walk the script once and collect, by index, the coordinates of every
+    markers[i] and the content of every windows[i].setContent(...).
+    """
+    markers = {}
+    windows = {}
+    # Matches of a same reference never overlap, as with re.findall
+    match_ends = {}
+    # Looked up for every window instead of searching the rest of the script each time
+    blank_lines = [match.start() for match in RE_BLANK_LINE_START.finditer(script_text)]
+
+    for match in RE_MARKER_OR_WINDOW.finditer(script_text):
+        key = (match.group(1), int(match.group(2)))
+        if match.start() < match_ends.get(key, 0):
+            continue
+        if key[0] == 'markers':
+            coords = RE_MARKER_COORDS.match(script_text, match.end())
+            if coords:
+                markers.setdefault(key[1], []).append(coords.groups())
+                match_ends[key] = coords.end()
+        else:
+            window = find_window_content(script_text, match.end(), blank_lines)
+            if window:
+                windows.setdefault(key[1], []).append(window[0])
+                match_ends[key] = window[1]
+
+    return markers, windows
+
+def iter_markers(html_content):
+    """Parse the HTML content and yield the (lon, lat, window content) of every marker."""
+    from bs4 import BeautifulSoup
+
+    with stage('parse'):
+        soup = BeautifulSoup(html_content, 'html.parser')
+        scripts = soup.find_all('script')
 
     for script in scripts:
         script_text = script.string
         if script_text:
+            markers, windows = scan_script(script_text)
             index = 1
 
             while True:
-                marker_regex = re.compile(r'markers\[' + str(index) + '\].*?\[(.*?), (.*?)\]')
-                window_regex = re.compile(r'windows\[' + str(index) + '\].*(?:(?!\n\s*\n)[\s\S])*?\.setContent\(\"([\s\S]*?)\"\)')
-
-                marker = marker_regex.findall(script_text)
-                window = window_regex.findall(script_text)
+                marker = markers.get(index, [])
+                window = windows.get(index, [])
 
                 if len(marker) == 0 and len(window) == 0:
                     break
@@ -42,20 +118,12 @@ def parse_html(html_content):
 
                 lat = float(marker[0][0])
                 lon = float(marker[0][1])
-                content = window[0]
-
-                feature = create_geojson_feature(lon, lat, content)
-                features.append(feature)
+                yield lon, lat, window[0]
                 index += 1
 
-    return features
-
-def create_geojson(features):
-    """Create a GeoJSON structure from the features."""
-    return {
-        "type": "FeatureCollection",
-        "features": features
-    }
+def parse_html(html_content):
+    """Parse the HTML content and extract marker and window information."""
+    return [create_geojson_feature(lon, lat, content) for lon, lat, content in iter_markers(html_content)]
 
 def extract_href(content: str) -> str:
     pattern = r'href=\\"([^\\"]+)\\"'
@@ -79,44 +147,39 @@ def create_geojson_feature(lon, lat, content):
         }
     }
 
-def save_geojson(geojson, filename):
-    """Save the GeoJSON structure to a file."""
-    with open(filename, 'w', encoding='utf-8') as geojson_file:
-        json.dump(geojson, geojson_file, indent=2, ensure_ascii=False)
-
 def record_history(date, count):
     """Record the date and count of webcams to a CSV file."""
     with open(HISTORY_FILE, 'a', newline='') as csvfile:
         writer = csv.writer(csvfile)
         writer.writerow([date, count])
 
-def main():
-    url = "https://www.skaping.com/camera/map"
-    geojson_filename = "skaping.geojson"
-
-    # Fetch the HTML content
-    html_content = fetch_html_content(url)
+def fetch(session=requests):
+    yield from iter_markers(fetch_html_content(URL, session))
 
-    # Parse the HTML content
-    features = parse_html(html_content)
+def transform(marker):
+    return create_geojson_feature(*marker)
 
-    # Create the GeoJSON structure
-    geojson = create_geojson(features)
-
-    # Save the GeoJSON to a file
-    save_geojson(geojson, geojson_filename)
+def write(features):
+    # Save the GeoJSON, OSM, change-set and history in a single pass
+    previous = load_features(GEOJSON_FILE)
+    current_date = datetime.datetime.now().strftime('%Y-%m-%d')
+    # The change-set is closed first: if it fails, the previous GeoJSON is kept to build it again
+    count = write_features(features, ChangesetWriter(os.path.join(HERE, 'skaping'), previous, 'contact:webcam'),
+                           FeatureCollectionWriter(GEOJSON_FILE), OsmWriter(OSM_FILE),
+                           HistoryWriter(HISTORY_DB, 'Skaping', current_date, 'contact:webcam', HISTORY_FILE),
+                           *snapshot_writers(GEOJSON_FILE))
 
     # Print the count of webcams
-    print(f"{len(features)} webcams saved to {geojson_filename}")
-
-    osm_xml = geojson2osm(geojson)
-    with open('skaping.osm', 'w', encoding='utf-8') as output_file:
-        output_file.write(osm_xml)
+    print(f"{count} webcams saved to {os.path.basename(GEOJSON_FILE)}")
     print('The OSM file has been created successfully.')
 
     # Record the date and count of webcams to a CSV file
-    current_date = datetime.datetime.now().strftime('%Y-%m-%d')
-    record_history(current_date, len(features))
+    record_history(current_date, count)
+    return count
+
+def main():
+    # Stream the markers of the HTML content to the output files
+    run_pipeline(REPORT_FILE, create_session(), fetch, transform, write)
 
 if __name__ == "__main__":
     main()
@@ -1,60 +1,63 @@
 import csv
 import datetime
-import geojson
-import itertools
+import json
+import os
 import re
 import requests
+import sys
 import unicodedata
 import urllib3
-from geojson2osm import geojson2osm
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.address import parse_address, split_lines
+from common.changeset import ChangesetWriter, load_features
+from common.geojson_writer import FeatureCollectionWriter, write_features
+from common.history import record_features
+from common.http_cache import create_session
+from common.metrics import propagate, run_instrumented, stage
+from common.opening_hours import compile_opening_hours
+from common.osm_writer import OsmWriter
+from common.snapshot import snapshot_writers
 
 # Disable SSL warnings
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 # Constants
 SSL_VERIFY = False
-HISTORY_FILE = 'shop_count_history.csv'
 URL_JSON = 'https://shops.stkmn.tech/get.php'
-GEOJSON_FILE = 'stokomani.geojson'
-RE_STREET = re.compile(r'(av |avenue |bd |boulevard |chemin |route |rue |esplanade |place )', re.IGNORECASE)
-RE_NUMBER = re.compile(r'^[0-9]', re.IGNORECASE)
-
-def fetch_json_data(url):
-    response = requests.get(url, verify=SSL_VERIFY)
+HERE = os.path.dirname(os.path.abspath(__file__))
+HISTORY_FILE = os.path.join(HERE, 'shop_count_history.csv')
+HISTORY_DB = os.path.join(HERE, 'history.sqlite')
+GEOJSON_FILE = os.path.join(HERE, 'stokomani.geojson')
+OSM_FILE = os.path.join(HERE, 'stokomani.osm')
+WEBSITE_CACHE_FILE = os.path.join(HERE, 'website_cache.json')
+WEBSITE_CACHE_TTL = datetime.timedelta(days=30)
+VERIFY_CONCURRENCY = 16
+REPORT_FILE = os.path.join(HERE, 'stokomani.metrics.json')
+
+def fetch_json_data(url, session=requests):
+    response = session.get(url, verify=SSL_VERIFY)
     if response.ok:
-        return response.json()
+        with stage('parse'):
+            return response.json()
     print(f"Error {response.status_code} while downloading: {url}")
     return []
 
-def group_consecutive_indices(indices):
-    for _, group in itertools.groupby(enumerate(indices), lambda x: x[1] - x[0]):
-        group = list(group)
-        yield group[0][1], group[-1][1]
-
 def extract_hour(time_str):
     return time_str[:5] if time_str and len(time_str) >= 4 else None
 
 def format_opening_hours(store):
     days_fr = ['lundi', 'mardi', 'mercredi', 'jeudi', 'vendredi', 'samedi', 'dimanche']
-    days_en = ['Mo', 'Tu', 'We', 'Th', 'Fr', 'Sa', 'Su']
-    time_slots = {}
+    slots = []
 
     for i, day in enumerate(days_fr):
         start = extract_hour(store.get(f'magasin_{day}_am_start'))
         end = extract_hour(store.get(f'magasin_{day}_pm_stop'))
         if start and end:
-            slot = f"{start}-{end}"
-            time_slots.setdefault(slot, []).append(i)
-
-    formatted = []
-    for slot, indices in time_slots.items():
-        indices.sort()
-        for start_idx, end_idx in group_consecutive_indices(indices):
-            if start_idx == end_idx:
-                formatted.append(f"{days_en[start_idx]} {slot}")
-            else:
-                formatted.append(f"{days_en[start_idx]}-{days_en[end_idx]} {slot}")
-    return '; '.join(formatted)
+            slots.append((i, f"{start}-{end}"))
+
+    return compile_opening_hours(slots)
 
 def raw_opening_hours(store):
     days_fr = ['lundi', 'mardi', 'mercredi', 'jeudi', 'vendredi', 'samedi', 'dimanche']
@@ -66,26 +69,8 @@ def raw_opening_hours(store):
     )
 
 def parse_address_components(street: str):
-    result = {'housenumber': '', 'place': '', 'street': ''}
-    if not street:
-        return result
-
-    parts = re.split(r'\n|, ', street)
-    has_street = any(RE_STREET.match(part) for part in parts)
-
-    for part in parts:
-        part = part.strip()
-        if RE_NUMBER.match(part):
-            tokens = part.split(' ', 1)
-            result['housenumber'] = tokens[0]
-            result['street'] = tokens[1] if len(tokens) > 1 else ''
-        elif RE_STREET.match(part):
-            result['street'] = part
-        elif not has_street:
-            result['street'] = part
-        else:
-            result['place'] = part
-    return result
+    housenumber, street, place = parse_address(split_lines(street), 'stokomani')
+    return {'housenumber': housenumber, 'place': place, 'street': street}
 
 def normalize_phone_number(phone: str) -> str:
     if not phone or not phone.startswith('0'):
@@ -99,21 +84,58 @@ def slugify_city(name: str) -> str:
     name = name.lower().replace("'", "-").replace("’", "-").replace(" ", "-")
     return unicodedata.normalize('NFD', name).encode('ascii', 'ignore').decode('utf-8')
 
-def transform_store_to_feature(store):
+def store_website(store):
     addr_raw = store['address']
-    addr = parse_address_components(addr_raw.get('address1', ''))
-    opening_hours = format_opening_hours(store)
-
     city_slug = slugify_city(addr_raw.get('city', ''))
-    zip_code = addr_raw.get('zip', '')
-    website = f"https://www.stokomani.fr/pages/boutique-stokomani-{city_slug}-{zip_code}"
+    return f"https://www.stokomani.fr/pages/boutique-stokomani-{city_slug}-{addr_raw.get('zip', '')}"
 
+def load_website_cache(path=WEBSITE_CACHE_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_website_cache(cache, path=WEBSITE_CACHE_FILE):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+def check_website(website, session=requests):
     try:
-        response = requests.head(website, allow_redirects=True, timeout=5)
-        if response.status_code != 200:
-            print(f"\033[93m⚠️  URL not accessible: {website}\033[0m")
+        return session.head(website, allow_redirects=True, timeout=5).status_code
     except Exception as e:
         print(f"\033[93m⚠️  Error checking URL: {website}\n💥 {e}\033[0m")
+        return None
+
+def verify_websites(websites, concurrency=VERIFY_CONCURRENCY, ttl=WEBSITE_CACHE_TTL, session=requests,
+                    cache_file=WEBSITE_CACHE_FILE):
+    """
+    Check that every website answers 200, with at most `concurrency` requests
+    in flight. URLs verified less than `ttl` ago are read from the cache.
+    """
+    now = datetime.datetime.now()
+    cache = {url: checked for url, checked in load_website_cache(cache_file).items()
+             if now - datetime.datetime.fromisoformat(checked) < ttl}
+    unchecked = sorted(set(websites) - cache.keys())
+
+    print(f"\033[96m🔎 Checking {len(unchecked)} URLs ({len(cache)} cached)...\033[0m")
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        statuses = executor.map(propagate(lambda website: check_website(website, session)), unchecked)
+        for website, status in zip(unchecked, statuses):
+            if status == 200:
+                cache[website] = now.isoformat(timespec='seconds')
+            elif status is not None:
+                print(f"\033[93m⚠️  URL not accessible: {website}\033[0m")
+
+    save_website_cache(cache, cache_file)
+
+def transform_store_to_feature(store):
+    import geojson
+
+    addr_raw = store['address']
+    addr = parse_address_components(addr_raw.get('address1', ''))
+    opening_hours = format_opening_hours(store)
+    zip_code = addr_raw.get('zip', '')
+    website = store_website(store)
 
     phone = normalize_phone_number(addr_raw.get('phone', ''))
     fixme = ', '.join(filter(None, [addr_raw.get('address1'), addr_raw.get('address2')]))
@@ -145,23 +167,30 @@ def log_shop_count(date_str, count):
     with open(HISTORY_FILE, 'a', newline='') as file:
         csv.writer(file).writerow([date_str, count])
 
-def main():
+def fetch(session=requests):
     print("\033[96m📡 Downloading JSON data...\033[0m")
-    stores = fetch_json_data(URL_JSON)
-    features = sorted([transform_store_to_feature(s) for s in stores],
-                      key=lambda f: f['properties']['ref:FR:Stokomani:id'])
-
-    geojson_data = geojson.FeatureCollection(features)
-    with open(GEOJSON_FILE, 'w', encoding='utf-8') as f:
-        geojson.dump(geojson_data, f, ensure_ascii=False, indent=2)
-    print(f"\033[92m✅ {len(features)} stores exported to: {GEOJSON_FILE}\033[0m")
-
-    with open('stokomani.osm', 'w', encoding='utf-8') as f:
-        f.write(geojson2osm(geojson_data))
-    print("\033[94m🗺️ OSM file successfully generated!\033[0m")
+    stores = fetch_json_data(URL_JSON, session)
+    verify_websites([store_website(s) for s in stores], session=session)
+    return stores
+
+def transform(stores):
+    return sorted([transform_store_to_feature(s) for s in stores],
+                  key=lambda f: f['properties']['ref:FR:Stokomani:id'])
+
+def write(features):
+    # The change-set is closed first: if it fails, the previous GeoJSON is kept to build it again
+    previous = load_features(GEOJSON_FILE)
+    write_features(features, ChangesetWriter(os.path.join(HERE, 'stokomani'), previous, 'ref:FR:Stokomani:id'),
+                   FeatureCollectionWriter(GEOJSON_FILE), OsmWriter(OSM_FILE), *snapshot_writers(GEOJSON_FILE))
+    print(f"\033[92m✅ {len(features)} stores exported to: {os.path.basename(GEOJSON_FILE)}\033[0m")
+    print(f"\033[94m🗺️ OSM file successfully generated: {os.path.basename(OSM_FILE)}\033[0m")
 
     today = datetime.datetime.now().strftime('%Y-%m-%d')
+    record_features(HISTORY_DB, 'Stokomani', today, features, 'ref:FR:Stokomani:id', HISTORY_FILE)
     log_shop_count(today, len(features))
 
+def main():
+    run_instrumented(REPORT_FILE, create_session(VERIFY_CONCURRENCY), fetch, transform, write)
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
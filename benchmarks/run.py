@@ -0,0 +1,210 @@
+"""
+Benchmark the transformers, formatters and writers on stored payloads.
+
+Every benchmark runs a function of a brand script over the items of a fixture
+(shops of the stored B&M, GiFi, Action and Stokomani payloads, Marie Blachère
+pages, the Skaping map page) and reports items per second, the best of
+several passes. The startup benchmark imports every entry point in a fresh
+interpreter. The address and opening hours caches are cleared before each
+pass, so every pass is as cold as a scraper run.
+
+Results are compared with a baseline saved by an earlier run: throughput is
+reported relative to it, and a digest of the outputs tells whether the
+optimized code still gives the same features.
+
+    python -m benchmarks.run --save            # on the reference branch
+    python -m benchmarks.run                   # on the branch to compare
+    python -m benchmarks.run skaping.parse_html --repeat 10
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+from common.address import parse_address, split_housenumber
+from common.embedded_json import find_script
+from common.geojson_writer import FeatureCollectionWriter, write_features
+from common.opening_hours import format_schedule, intern_schedule
+from common.osm_writer import OsmWriter
+from common.runner import ROOT, load_brand
+from common.startup import ENTRY_POINTS, import_entry_point
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURES = os.path.join(HERE, 'fixtures')
+BASELINE_FILE = os.path.join(HERE, 'baseline.json')
+REPEAT = 5
+# Slower than this fraction of the baseline is reported as a regression
+TOLERANCE = 0.9
+
+BENCHMARKS = {}
+
+def benchmark(name):
+    """
+    Register a benchmark. The decorated function loads its fixture and
+    returns (items, function): a pass calls function on every item.
+    """
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+def load_json(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), 'rb') as file:
+        return file.read()
+
+def bnm_shops():
+    return [shop for _, shop in load_json(os.path.join(ROOT, 'B&M', 'shops.json'))]
+
+def gifi_stores():
+    return [
+        store
+        for path in sorted(glob.glob(os.path.join(ROOT, 'GiFi', 'tomerge', '*.json')))
+        for store in load_json(path).get('hits', [])
+    ]
+
+@benchmark('action.process_shop')
+def action_process_shop():
+    action = load_brand('action')
+    pages = load_json(os.path.join(FIXTURES, 'action_pages.json'))
+    return [shop for page in pages for shop in page['data']['storeSearchV2']], action.process_shop
+
+@benchmark('bnm.formatHours')
+def bnm_format_hours():
+    bnm = load_brand('bnm')
+    return [shop.get('hours') for shop in bnm_shops()], bnm.formatHours
+
+@benchmark('bnm.getAddr')
+def bnm_get_addr():
+    bnm = load_brand('bnm')
+    return [shop.get('pop') for shop in bnm_shops()], bnm.getAddr
+
+@benchmark('gifi.formatHours')
+def gifi_format_hours():
+    gifi = load_brand('gifi')
+    return [store.get('formatted_opening_hours') for store in gifi_stores()], gifi.formatHours
+
+@benchmark('gifi.transform')
+def gifi_transform():
+    gifi = load_brand('gifi')
+    return gifi_stores(), gifi.transform
+
+@benchmark('marie-blachere.next_data')
+def marie_next_data():
+    return [read_fixture('marie_blachere_all.html')], lambda page: json.loads(find_script(page, id='__NEXT_DATA__'))
+
+@benchmark('marie-blachere.bakery_page')
+def marie_bakery_page():
+    marie = load_brand('marie-blachere')
+    bakeries = [
+        (bakery['bakery'], bakery['page'].encode('utf-8'))
+        for bakery in load_json(os.path.join(FIXTURES, 'marie_blachere_bakeries.json'))
+    ]
+    return bakeries, lambda bakery: marie.bakery_feature(bakery[0], marie.parse_json_ld(bakery[1]))
+
+@benchmark('skaping.parse_html')
+def skaping_parse_html():
+    skaping = load_brand('skaping')
+    return [read_fixture('skaping_map.html').decode('utf-8')], skaping.parse_html
+
+@benchmark('stokomani.transform_store_to_feature')
+def stokomani_transform():
+    stokomani = load_brand('stokomani')
+    return load_json(os.path.join(FIXTURES, 'stokomani_stores.json')), stokomani.transform_store_to_feature
+
+@benchmark('serialize')
+def serialize():
+    """Write the GiFi features as GeoJSON and OSM, end to end."""
+    gifi = load_brand('gifi')
+    features = [gifi.transform(store) for store in gifi_stores()]
+    # Removed once the benchmark is done with write
+    folder = tempfile.TemporaryDirectory(prefix='benchmark-')
+
+    def write(feature_list):
+        geojson_file = os.path.join(folder.name, 'features.geojson')
+        osm_file = os.path.join(folder.name, 'features.osm')
+        write_features(feature_list, FeatureCollectionWriter(geojson_file), OsmWriter(osm_file))
+        with open(geojson_file, 'rb') as geojson, open(osm_file, 'rb') as osm:
+            return hashlib.sha1(geojson.read() + osm.read()).hexdigest()
+    # One item per feature: the throughput is in features per second
+    return [features], write
+
+@benchmark('startup')
+def startup():
+    """Import every entry point in a fresh interpreter, without network."""
+    def start(path):
+        report = import_entry_point(path)
+        return report['heavy'], report['network']
+    return ENTRY_POINTS, start
+
+def clear_caches():
+    for function in (parse_address, split_housenumber, format_schedule, intern_schedule):
+        function.cache_clear()
+
+def digest(outputs):
+    raw = json.dumps(outputs, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def measure(items, function, repeat=REPEAT):
+    """Return (items per second of the fastest pass, digest of the outputs)."""
+    best = None
+    outputs = None
+    for _ in range(repeat):
+        clear_caches()
+        start = time.perf_counter()
+        outputs = [function(item) for item in items]
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    count = sum(len(item) for item in items) if items and isinstance(items[0], list) else len(items)
+    return count / best, digest(outputs)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the scrapers on stored payloads.')
+    parser.add_argument('benchmarks', nargs='*', metavar='benchmark',
+                        help=f"benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument('--repeat', type=int, default=REPEAT, help=f'passes per benchmark, the best is kept (default: {REPEAT})')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='baseline file (default: benchmarks/baseline.json)')
+    parser.add_argument('--save', action='store_true', help='save the results as the new baseline')
+    args = parser.parse_args(argv)
+    names = args.benchmarks or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(unknown)}")
+
+    baseline = load_json(args.baseline) if os.path.exists(args.baseline) else {}
+    results = {}
+    regressions = 0
+    for name in names:
+        items, function = BENCHMARKS[name]()
+        throughput, output_digest = measure(items, function, max(1, args.repeat))
+        results[name] = {'throughput': round(throughput, 1), 'digest': output_digest}
+
+        line = f'{name:<40} {throughput:>12,.0f} items/s'
+        reference = baseline.get(name)
+        if reference:
+            ratio = throughput / reference['throughput']
+            line += f'  x{ratio:.2f}'
+            if ratio < TOLERANCE:
+                line += '  slower'
+                regressions += 1
+            if reference['digest'] != output_digest:
+                line += '  OUTPUT CHANGED'
+                regressions += 1
+        print(line)
+
+    if args.save:
+        with open(args.baseline, 'w', encoding='utf-8') as file:
+            json.dump({**baseline, **results}, file, indent=2, sort_keys=True)
+            file.write('\n')
+        print(f'Baseline saved to {os.path.relpath(args.baseline)}')
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+Address parsing shared by all brands.
+
+Every brand writes its addresses in its own dialect: "12, rue X", "12 à 14
+rue X", a street line mixed with a shopping centre name... The patterns of
+each dialect are compiled once, the street type keywords are combined in a
+single alternation, and parsed lines are cached since many address lines
+repeat between runs and stores.
+
+split_housenumber(line, dialect) returns (housenumber, street) and
+parse_address(lines, dialect) returns (housenumber, street, place).
+"""
+import re
+from functools import lru_cache
+
+CACHE_SIZE = 4096
+
+RE_STARTS_WITH_DIGIT = re.compile(r'^[0-9]')
+RE_NUMBER_THEN_COMMA = re.compile(r'^[0-9].*, ')
+RE_NUMBER_THEN_SPACE = re.compile(r'^[0-9].* ')
+RE_NUMBER_STREET = re.compile(r'^(\d+[-\/]?\d?[\w]*),?\s+(.*)')
+RE_NUMBER_RANGE_STREET = re.compile(r'(?P<number>\d+\sà\s\d+)\s(?P<street>.+)')
+RE_LINE_SEPARATOR = re.compile(r'\n|, ')
+
+def street_types_pattern(keywords, suffix=''):
+    """Combine street type keywords into one pattern matched at the start of a line."""
+    alternation = '|'.join(re.escape(keyword) + suffix for keyword in sorted(keywords, key=len, reverse=True))
+    return re.compile(f'^(?:{alternation})', re.IGNORECASE)
+
+STREET_TYPES = {
+    'bnm': street_types_pattern(['allée', 'rue', 'chemin', 'avenue', 'boulevard']),
+    'stokomani': street_types_pattern(['av', 'avenue', 'bd', 'boulevard', 'chemin', 'route', 'rue', 'esplanade', 'place'], ' '),
+}
+
+def split_comma_or_space(line):
+    """'12, rue X' or '12 rue X': split on the first ', ', else on the first space."""
+    if RE_NUMBER_THEN_COMMA.match(line):
+        parts = line.split(', ')
+        return parts[0], ' '.join(parts[1:])
+    if RE_NUMBER_THEN_SPACE.match(line):
+        parts = line.split(' ')
+        return parts[0], ' '.join(parts[1:])
+    return '', line
+
+def split_first_comma(line):
+    """'12 bis, rue X' or '12 rue X': split on the first comma, else on the first space."""
+    if not RE_STARTS_WITH_DIGIT.match(line):
+        return '', line
+    index = line.find(',')
+    if index > 0:
+        return line[:index].strip(), line[index + 1:].strip()
+    parts = line.split(' ')
+    return parts[0], ' '.join(parts[1:])
+
+def split_first_space(line):
+    """'12 rue X': the first word is the housenumber."""
+    if not RE_STARTS_WITH_DIGIT.match(line):
+        return '', line
+    parts = line.split(' ', 1)
+    return parts[0], parts[1] if len(parts) > 1 else ''
+
+def split_number_street(line):
+    """'12b, rue X', '12-14 rue X' or '12/1 rue X'."""
+    match = RE_NUMBER_STREET.search(line)
+    if match:
+        return match.group(1), match.group(2)
+    return '', line
+
+def split_number_range(line):
+    """'12 à 14 rue X': only ranges are housenumbers, the street is empty otherwise."""
+    match = RE_NUMBER_RANGE_STREET.search(line)
+    if match:
+        return match.group('number'), match.group('street')
+    return '', ''
+
+SPLITTERS = {
+    'bnm': split_comma_or_space,
+    'gifi': split_first_comma,
+    'stokomani': split_first_space,
+    'marie': split_number_range,
+    'default': split_number_street,
+}
+
+@lru_cache(maxsize=CACHE_SIZE)
+def split_housenumber(line, dialect='default'):
+    """Split an address line into (housenumber, street)."""
+    return SPLITTERS[dialect](line)
+
+def starts_with_street(line, dialect='default'):
+    """Tell if the line starts with a number or a street type of the dialect."""
+    if RE_STARTS_WITH_DIGIT.match(line):
+        return True
+    street_types = STREET_TYPES.get(dialect)
+    return bool(street_types and street_types.match(line))
+
+def same_line(line1, line2):
+    return line1.replace(',', '') == line2.replace(',', '')
+
+def parse_street_and_place(lines, dialect):
+    """
+    The street is the first line starting with a number or a street type, or
+    else the first line. Another line is the place (shopping centre, zone...).
+    GiFi repeats the street on its second line: it is not a place.
+    """
+    if len(lines) < 2 or (dialect == 'gifi' and same_line(lines[0], lines[1])):
+        return (*split_housenumber(lines[0], dialect), '')
+    if not starts_with_street(lines[0], dialect) and starts_with_street(lines[1], dialect):
+        return (*split_housenumber(lines[1], dialect), lines[0])
+    return (*split_housenumber(lines[0], dialect), lines[1])
+
+def parse_street_parts(lines, dialect):
+    """
+    Each part is a numbered street, a street, or a place. Without any street
+    type in the address, unnumbered parts are the street.
+    """
+    housenumber, street, place = '', '', ''
+    street_types = STREET_TYPES[dialect]
+    has_street = any(street_types.match(line) for line in lines)
+    for line in lines:
+        line = line.strip()
+        if RE_STARTS_WITH_DIGIT.match(line):
+            housenumber, street = split_housenumber(line, dialect)
+        elif street_types.match(line) or not has_street:
+            street = line
+        else:
+            place = line
+    return housenumber, street, place
+
+PLACE_RULES = {
+    'bnm': parse_street_and_place,
+    'gifi': parse_street_and_place,
+    'stokomani': parse_street_parts,
+}
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_address(lines, dialect='default'):
+    """Parse a tuple of address lines into (housenumber, street, place)."""
+    if not lines:
+        return '', '', ''
+    rule = PLACE_RULES.get(dialect)
+    if rule is None:
+        return (*split_housenumber(lines[0], dialect), '')
+    return rule(lines, dialect)
+
+def split_lines(address):
+    """Split a multi-line address ('\\n' or ', ' separated) into a tuple of lines."""
+    return tuple(RE_LINE_SEPARATOR.split(address)) if address else ()
@@ -0,0 +1,158 @@
+"""
+Pass anti-bot checks with a few browsers, fetch everything else over HTTP.
+
+A site protected by a JavaScript challenge only needs a real browser to get
+its clearance cookies. BrowserPool keeps a bounded number of headless
+browsers, started on demand, that load the site and hand their cookies and
+user agent over to a ClearanceSession: the bulk requests then go through a
+plain pooled HTTP session, and a browser is used again only when the
+cookies expire or a response is blocked. A ClearanceSession holds a single
+set of cookies and harvests them one at a time, so it never uses more than
+one browser of its pool.
+
+    pool = BrowserPool(1, chrome_driver)
+    client = ClearanceSession(pool, BASE_URL, create_session(8))
+    response = client.get(BASE_URL + '/api/stores/coordinates/')
+
+Selenium is only imported when a Chrome driver is started.
+"""
+import contextlib
+import queue
+import threading
+import time
+
+BROWSERS = 1
+PAGE_TIMEOUT = 30
+BLOCKED_STATUS = {401, 403, 429, 503}
+MAX_REFRESH = 2
+
+class HarvestError(Exception):
+    """A browser could not be started or could not load the page to get its cookies."""
+
+def chrome_driver(driver_path=None, user_agent=None):
+    """Start a headless Chrome; without driver_path, Selenium looks up chromedriver itself."""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+
+    options = Options()
+    options.add_argument('--headless')
+    options.add_argument('--disable-gpu')
+    if user_agent:
+        options.add_argument(f'user-agent={user_agent}')
+    return webdriver.Chrome(service=Service(driver_path), options=options)
+
+def wait_until_loaded(driver, timeout=PAGE_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while driver.execute_script('return document.readyState') != 'complete':
+        if time.monotonic() > deadline:
+            raise TimeoutError(f'{driver.current_url} not loaded after {timeout}s')
+        time.sleep(0.1)
+
+class BrowserPool:
+    """At most `size` browsers, started by `factory()` when first needed and reused."""
+
+    def __init__(self, size=BROWSERS, factory=chrome_driver):
+        self.size = max(1, size)
+        self.factory = factory
+        self._idle = queue.LifoQueue()
+        self._drivers = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._drivers) < self.size:
+                driver = self.factory()
+                self._drivers.append(driver)
+                return driver
+        return self._idle.get()
+
+    def release(self, driver):
+        self._idle.put(driver)
+
+    @contextlib.contextmanager
+    def browser(self):
+        driver = self.acquire()
+        try:
+            yield driver
+        finally:
+            self.release(driver)
+
+    def harvest(self, url):
+        """
+        Load url in a browser and return its (cookies, user agent). Any
+        failure of the browser (timeout, WebDriverException...) is raised as
+        a HarvestError, so that callers do not have to import Selenium.
+        """
+        try:
+            with self.browser() as driver:
+                driver.get(url)
+                wait_until_loaded(driver)
+                return driver.get_cookies(), driver.execute_script('return navigator.userAgent')
+        except Exception as e:
+            raise HarvestError(f'Could not get the cookies of {url}: {e!r}') from e
+
+    def close(self):
+        with self._lock:
+            for driver in self._drivers:
+                driver.quit()
+            self._drivers.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def is_blocked(response):
+    return response.status_code in BLOCKED_STATUS
+
+class ClearanceSession:
+    """
+    Send requests through an HTTP session carrying the cookies and user agent
+    of a browser of the pool. The cookies are harvested on the first request,
+    and again when they expire or a response is blocked; concurrent requests
+    blocked at the same time trigger a single harvest.
+    """
+
+    def __init__(self, pool, url, session, max_refresh=MAX_REFRESH):
+        self.pool = pool
+        self.url = url
+        self.session = session
+        self.max_refresh = max_refresh
+        self.harvests = 0
+        self._expires = None
+        self._lock = threading.Lock()
+
+    def refresh(self, seen=None):
+        """Harvest new cookies, unless another thread did since harvest number `seen`."""
+        with self._lock:
+            if seen is not None and seen != self.harvests:
+                return
+            cookies, user_agent = self.pool.harvest(self.url)
+            self.session.cookies.clear()
+            for cookie in cookies:
+                self.session.cookies.set(cookie['name'], cookie['value'],
+                                         domain=cookie.get('domain', ''), path=cookie.get('path', '/'))
+            self.session.headers['User-Agent'] = user_agent
+            expiries = [cookie['expiry'] for cookie in cookies if cookie.get('expiry')]
+            self._expires = min(expiries) if expiries else None
+            self.harvests += 1
+
+    def expired(self):
+        return self.harvests == 0 or (self._expires is not None and time.time() >= self._expires)
+
+    def get(self, url, **kwargs):
+        for attempt in range(self.max_refresh + 1):
+            seen = self.harvests
+            if self.expired():
+                self.refresh(seen)
+                seen = self.harvests
+            response = self.session.get(url, **kwargs)
+            if not is_blocked(response) or attempt == self.max_refresh:
+                return response
+            self.refresh(seen)
@@ -0,0 +1,156 @@
+"""
+Change-set between two runs of a scraper.
+
+The new features are hash-joined with the previous output on the brand ref
+key (ref:FR:Stokomani:id, ref:FR:MarieBlachere:id...) and split into added,
+removed and changed features. A changed feature carries a "changes" member
+with the delta of each tag ({tag: [old, new]}) and, when it moved by more
+than the threshold, the distance in meters.
+
+Only added and changed features go to the delta OSM file, so that the
+MapRoulette challenge is built from what changed since the last run.
+Streaming brands write the same files with a ChangesetWriter sink.
+"""
+import json
+import math
+import os
+
+from common.geojson_writer import FeatureCollectionWriter, write_feature_collection, write_features
+from common.opening_hours import same_opening_hours
+from common.osm_writer import OsmWriter
+
+MOVE_THRESHOLD = 50  # meters
+EARTH_RADIUS = 6371008.8  # meters
+
+def load_features(path):
+    """Load the features of a previous GeoJSON output, or nothing on the first run."""
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)['features']
+
+def distance(coordinates1, coordinates2):
+    """Haversine distance in meters between two [lon, lat] points, given as numbers or strings."""
+    lon1, lat1 = (math.radians(float(c)) for c in coordinates1[:2])
+    lon2, lat2 = (math.radians(float(c)) for c in coordinates2[:2])
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(a))
+
+def same_value(tag, old, new):
+    if tag == 'opening_hours':
+        # The outputs written before the shared compiler format the same schedules differently
+        return same_opening_hours(old, new)
+    return old == new
+
+def tag_changes(old_properties, new_properties):
+    """Return {tag: [old, new]} for every tag added, removed or modified."""
+    return {
+        tag: [old_properties.get(tag), new_properties.get(tag)]
+        for tag in {**old_properties, **new_properties}
+        if not same_value(tag, old_properties.get(tag), new_properties.get(tag))
+    }
+
+def index_features(features, ref_key):
+    """Return {ref: feature} of the features that have a ref."""
+    index = {}
+    for feature in features:
+        ref = feature['properties'].get(ref_key)
+        if ref is not None:
+            index[ref] = feature
+    return index
+
+def compare(old, new, move_threshold=MOVE_THRESHOLD):
+    """Return the changes of a feature since the previous run: {'tags': ..., 'moved': ...}, empty if none."""
+    changes = {}
+    tags = tag_changes(old['properties'], new['properties'])
+    if tags:
+        changes['tags'] = tags
+    moved = distance(old['geometry']['coordinates'], new['geometry']['coordinates'])
+    if moved > move_threshold:
+        changes['moved'] = round(moved, 1)
+    return changes
+
+def diff_features(old_features, new_features, ref_key, move_threshold=MOVE_THRESHOLD):
+    """
+    Compare two runs on ref_key and return the (added, removed, changed)
+    feature lists. New features without a ref are always reported as added.
+    """
+    old_index = index_features(old_features, ref_key)
+
+    added = []
+    changed = []
+    seen = set()
+    for feature in new_features:
+        ref = feature['properties'].get(ref_key)
+        old = old_index.get(ref) if ref is not None else None
+        if old is None:
+            added.append(feature)
+            continue
+        seen.add(ref)
+
+        changes = compare(old, feature, move_threshold)
+        if changes:
+            changed.append({**feature, 'changes': changes})
+
+    removed = [feature for ref, feature in old_index.items() if ref not in seen]
+    return added, removed, changed
+
+def write_changeset(prefix, old_features, new_features, ref_key, move_threshold=MOVE_THRESHOLD):
+    """
+    Write <prefix>.added.geojson, <prefix>.removed.geojson and
+    <prefix>.changed.geojson, and the added and changed features to
+    <prefix>.delta.osm for challenge generation.
+    """
+    added, removed, changed = diff_features(old_features, new_features, ref_key, move_threshold)
+    write_feature_collection(f'{prefix}.added.geojson', added)
+    write_feature_collection(f'{prefix}.removed.geojson', removed)
+    write_features(changed, FeatureCollectionWriter(f'{prefix}.changed.geojson'))
+    write_features(added + changed, OsmWriter(f'{prefix}.delta.osm'))
+    print(f'Changes since the last run: {len(added)} added, {len(removed)} removed, {len(changed)} changed')
+    return added, removed, changed
+
+class ChangesetWriter:
+    """
+    Write the change-set of a run feature by feature, as a sink of
+    write_features: only the previous features are kept in memory. The
+    files are the same as write_changeset, except that the added and
+    changed nodes of the delta OSM file are in the order of the run.
+    """
+    stage = 'changeset'
+
+    def __init__(self, prefix, old_features, ref_key, move_threshold=MOVE_THRESHOLD):
+        self.prefix = prefix
+        self.ref_key = ref_key
+        self.move_threshold = move_threshold
+        self.removed = None
+        self._old_index = index_features(old_features, ref_key)
+        self._seen = set()
+        self._added = FeatureCollectionWriter(f'{prefix}.added.geojson')
+        self._changed = FeatureCollectionWriter(f'{prefix}.changed.geojson')
+        self._delta = OsmWriter(f'{prefix}.delta.osm')
+
+    def write(self, feature):
+        ref = feature['properties'].get(self.ref_key)
+        old = self._old_index.get(ref) if ref is not None else None
+        if old is None:
+            self._added.write(feature)
+            self._delta.write(feature)
+            return
+        self._seen.add(ref)
+
+        changes = compare(old, feature, self.move_threshold)
+        if changes:
+            feature = {**feature, 'changes': changes}
+            self._changed.write(feature)
+            self._delta.write(feature)
+
+    def close(self):
+        removed = (feature for ref, feature in self._old_index.items() if ref not in self._seen)
+        self.removed = write_feature_collection(f'{self.prefix}.removed.geojson', removed)
+        for writer in (self._added, self._changed, self._delta):
+            writer.close()
+        print(f'Changes since the last run: {self._added.count} added, {self.removed} removed, {self._changed.count} changed')
+
+    def abort(self):
+        for writer in (self._added, self._changed, self._delta):
+            writer.abort()
@@ -0,0 +1,94 @@
+"""
+Render the count history charts of every brand in a single process.
+
+The date,count history files are read with the csv module, and matplotlib is
+only imported (with the non-interactive Agg backend) when a chart has to be
+drawn: a chart is rendered again only when its history file is newer than
+its PNG file.
+
+    python -m common.charts                 # every brand
+    python -m common.charts stokomani --force
+"""
+import argparse
+import csv
+import datetime
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Brand: (history file, chart file, name of the counted features)
+CHARTS = {
+    'marie-blachere': ('Marie-Blachere/bakery_count_history.csv', 'Marie-Blachere/bakery_count_history.png', 'Bakeries'),
+    'skaping': ('Skaping/webcam_count_history.csv', 'Skaping/webcam_count_history.png', 'Webcams'),
+    'stokomani': ('Stokomani/shop_count_history.csv', 'Stokomani/shop_count_history.png', 'Shops'),
+}
+
+def read_history(path):
+    """Return the dates and counts of a date,count CSV file."""
+    dates = []
+    counts = []
+    with open(path, newline='') as file:
+        for date, count in csv.reader(file):
+            dates.append(datetime.date.fromisoformat(date))
+            counts.append(int(count))
+    return dates, counts
+
+def is_stale(history_file, graphic_file):
+    return not os.path.exists(graphic_file) or os.path.getmtime(history_file) > os.path.getmtime(graphic_file)
+
+def render(history_file, graphic_file, name):
+    """Plot the history of the number of features extracted and save it as an image."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from matplotlib.ticker import MaxNLocator
+
+    dates, counts = read_history(history_file)
+
+    # Plot the data
+    plt.figure(figsize=(10, 6))
+    plt.plot(dates, counts, marker='o', linestyle='-')
+    plt.title(f'Number of {name} Extracted Over Time')
+    plt.xlabel('Date')
+    plt.ylabel(f'Number of {name}')
+    plt.grid(True)
+    plt.xticks(rotation=45)
+    plt.tight_layout()
+
+    # Set y-axis to show only integer ticks
+    plt.gca().yaxis.set_major_locator(MaxNLocator(integer=True))
+
+    # Save the plot as an image file
+    plt.savefig(graphic_file)
+    plt.close()
+
+def render_brand(brand, force=False):
+    """Render the chart of a brand if its history changed, return True if it was rendered."""
+    history_file, graphic_file, name = CHARTS[brand]
+    history_file = os.path.join(ROOT, history_file)
+    graphic_file = os.path.join(ROOT, graphic_file)
+    if not force and not is_stale(history_file, graphic_file):
+        return False
+    render(history_file, graphic_file, name)
+    return True
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render the count history charts.')
+    parser.add_argument('brands', nargs='*', metavar='brand',
+                        help=f"brands to render (default: all of {', '.join(CHARTS)})")
+    parser.add_argument('--force', action='store_true', help='render the charts even if their history did not change')
+    args = parser.parse_args(argv)
+    names = args.brands or list(CHARTS)
+    unknown = [name for name in names if name not in CHARTS]
+    if unknown:
+        parser.error(f"unknown brand: {', '.join(unknown)}")
+
+    for brand in names:
+        if render_brand(brand, args.force):
+            print(f'{brand}: {CHARTS[brand][1]} rendered')
+        else:
+            print(f'{brand}: up to date')
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+Checkpoint store of the units of work of a run (pages, bakery URLs...).
+
+Each unit is saved in a local SQLite database as soon as it completes, with
+its raw payload and its transformed result, so a run that crashed or was
+killed can be resumed: completed units are read back from the store and only
+the others are fetched again.
+
+The database is in WAL mode and every unit is committed on its own, so
+worker threads can record units concurrently and a crash loses at most the
+units in flight. Once the outputs of the run are written, the script removes
+the store with remove_checkpoint, so a later --resume cannot rebuild the
+outputs from the pages of a run that already completed.
+"""
+import datetime
+import json
+import os
+import sqlite3
+import threading
+
+# SQLite files of a database in WAL mode
+SQLITE_SUFFIXES = ('', '-wal', '-shm')
+
+class CheckpointStore:
+    """
+    Record completed units of work:
+
+        store = CheckpointStore('marie_blachere.checkpoint.sqlite', resume=args.resume)
+        done = store.get(url)
+        if done is None:
+            ...
+            store.put(url, payload, feature)
+
+    Without resume the units of the previous run are discarded.
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS units ('
+            'key TEXT PRIMARY KEY, payload TEXT, result TEXT, completed TEXT NOT NULL)'
+        )
+        if not resume:
+            self.clear()
+
+    def get(self, key):
+        """Return {'payload', 'result'} of a completed unit, or None."""
+        with self._lock:
+            row = self._db.execute('SELECT payload, result FROM units WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        return {'payload': json.loads(row[0]), 'result': json.loads(row[1])}
+
+    def put(self, key, payload, result):
+        """Record a completed unit, replacing any previous record of it."""
+        completed = datetime.datetime.now().isoformat(timespec='seconds')
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO units (key, payload, result, completed) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(payload, ensure_ascii=False), json.dumps(result, ensure_ascii=False), completed),
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM units').fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self._db.execute('DELETE FROM units')
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def remove_checkpoint(path):
+    """Delete the store of a run whose outputs were written."""
+    for suffix in SQLITE_SUFFIXES:
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,242 @@
+"""
+Conflate scraped features with an existing OSM extract.
+
+The brand nodes of the extract (selected on brand:wikidata or on the ref key)
+are put in a grid spatial index whose cells are as large as the matching
+radius, so each scraped feature is only compared with the nodes of its
+neighbouring cells. Candidate pairs are ranked by ref, then name, then
+distance, and assigned greedily: matching stays O(n log n) even against full
+regional extracts.
+
+The result is written directly as a MapRoulette cooperative challenge, one
+task per line like mr coop change:
+- unmatched features become "create" tasks (osmChange file),
+- matched nodes whose tags differ become tag fix tasks.
+
+    python -m common.conflate --extract france.osm --ref-key ref:FR:MarieBlachere:id marie_blachere.geojson
+"""
+import argparse
+import base64
+import json
+import math
+import os
+import sys
+import xml.etree.ElementTree as ET
+
+from common.changeset import distance, load_features
+from common.osm_writer import escape_attribute
+
+RADIUS = 100  # meters
+METERS_PER_DEGREE = 111320
+MATCH_KEYS = ('brand:wikidata',)
+RS = '\x1e'
+
+class GridIndex:
+    """Hash grid of points with cells of radius meters of latitude."""
+
+    def __init__(self, radius):
+        self.cell = radius / METERS_PER_DEGREE
+        self.cells = {}
+
+    def key(self, lon, lat):
+        return math.floor(lon / self.cell), math.floor(lat / self.cell)
+
+    def insert(self, lon, lat, item):
+        self.cells.setdefault(self.key(lon, lat), []).append(item)
+
+    def nearby(self, lon, lat):
+        """Yield the items of the cells within one radius of the point."""
+        x, y = self.key(lon, lat)
+        # A degree of longitude gets shorter towards the poles
+        span = math.ceil(1 / max(math.cos(math.radians(lat)), 0.01))
+        for dx in range(-span, span + 1):
+            for dy in (-1, 0, 1):
+                yield from self.cells.get((x + dx, y + dy), ())
+
+def brand_filter(features, keys=MATCH_KEYS):
+    """Return {tag: {values}} of the brand tags found in the scraped features."""
+    match_tags = {}
+    for feature in features:
+        for key in keys:
+            value = feature['properties'].get(key)
+            if value:
+                match_tags.setdefault(key, set()).add(value)
+    return match_tags
+
+def load_osm_nodes(path, match_tags, ref_key=None):
+    """
+    Stream an OSM XML extract and return the nodes carrying one of match_tags
+    (or the ref key) as {'id', 'lon', 'lat', 'tags'} dicts.
+    """
+    nodes = []
+    root = None
+    depth = 0
+    for event, element in ET.iterparse(path, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = element
+            depth += 1
+            continue
+        depth -= 1
+        # Only the children of <osm> (nodes, ways, relations...) are processed
+        if depth != 1:
+            continue
+        if element.tag == 'node':
+            tags = {tag.get('k'): tag.get('v') for tag in element.iter('tag')}
+            if (ref_key in tags) or any(tags.get(key) in values for key, values in match_tags.items()):
+                nodes.append({
+                    'id': int(element.get('id')),
+                    'lon': float(element.get('lon')),
+                    'lat': float(element.get('lat')),
+                    'tags': tags,
+                })
+        # Drop the processed elements from the tree, or it keeps the whole extract
+        root.clear()
+    return nodes
+
+def match_features(features, nodes, ref_key=None, radius=RADIUS):
+    """
+    Return {feature index: node index}. A node with the same ref always
+    matches; otherwise the nearest node within radius is preferred after the
+    ones with the same name. Nodes with another ref are never matched.
+    """
+    index = GridIndex(radius)
+    by_ref = {}
+    for i, node in enumerate(nodes):
+        index.insert(node['lon'], node['lat'], i)
+        if ref_key and ref_key in node['tags']:
+            by_ref[node['tags'][ref_key]] = i
+
+    pairs = []
+    for f, feature in enumerate(features):
+        lon, lat = feature['geometry']['coordinates'][:2]
+        ref = feature['properties'].get(ref_key) if ref_key else None
+        if ref is not None and str(ref) in by_ref:
+            pairs.append((0, 0.0, f, by_ref[str(ref)]))
+            continue
+
+        name = (feature['properties'].get('name') or '').casefold()
+        for i in index.nearby(lon, lat):
+            node = nodes[i]
+            if ref_key and ref_key in node['tags']:
+                continue
+            d = distance([lon, lat], [node['lon'], node['lat']])
+            if d <= radius:
+                rank = 1 if name and node['tags'].get('name', '').casefold() == name else 2
+                pairs.append((rank, d, f, i))
+
+    pairs.sort()
+    matches = {}
+    used = set()
+    for _, _, f, i in pairs:
+        if f not in matches and i not in used:
+            matches[f] = i
+            used.add(i)
+    return matches
+
+def tag_updates(feature, node):
+    """Tags of the feature missing or different on the node, without the fixme notes meant for new nodes."""
+    return {
+        key: str(value)
+        for key, value in feature['properties'].items()
+        if value is not None and not key.startswith('fixme') and node['tags'].get(key) != str(value)
+    }
+
+def create_task(feature, node_id):
+    lon, lat = feature['geometry']['coordinates'][:2]
+    tags = {key: value for key, value in feature['properties'].items() if value is not None}
+    xml_tags = ''.join(f'<tag k="{escape_attribute(k)}" v="{escape_attribute(v)}"/>' for k, v in tags.items())
+    osc = (
+        "<?xml version='1.0' encoding='UTF-8'?>\n<osmChange version='0.6'>\n  <create>\n"
+        f'  <node id="{node_id}" lat="{lat}" lon="{lon}">{xml_tags}</node>\n'
+        '  </create>\n</osmChange>'
+    )
+    return {
+        'type': 'FeatureCollection',
+        'features': [{
+            'type': 'Feature',
+            'properties': {**tags, '@id': f'node/{node_id}'},
+            'geometry': {'type': 'Point', 'coordinates': [lon, lat]},
+        }],
+        'cooperativeWork': {
+            'meta': {'version': 2, 'type': 2},
+            'file': {
+                'type': 'xml',
+                'format': 'osc',
+                'encoding': 'base64',
+                'content': base64.b64encode(osc.encode('utf-8')).decode('ascii'),
+            },
+        },
+    }
+
+def tag_fix_task(node, updates):
+    osm_id = f"node/{node['id']}"
+    return {
+        'type': 'FeatureCollection',
+        'features': [{
+            'type': 'Feature',
+            'properties': {**node['tags'], '@id': osm_id},
+            'geometry': {'type': 'Point', 'coordinates': [node['lon'], node['lat']]},
+        }],
+        'cooperativeWork': {
+            'meta': {'version': 2, 'type': 1},
+            'operations': [{
+                'operationType': 'modifyElement',
+                'data': {'id': osm_id, 'operations': [{'operation': 'setTags', 'data': updates}]},
+            }],
+        },
+    }
+
+def conflate(features, nodes, matches):
+    """Yield the challenge tasks: creations for unmatched features, tag fixes for matched ones."""
+    created = 0
+    for f, feature in enumerate(features):
+        if f in matches:
+            node = nodes[matches[f]]
+            updates = tag_updates(feature, node)
+            if updates:
+                yield tag_fix_task(node, updates)
+        else:
+            created += 1
+            yield create_task(feature, -created)
+
+def write_challenge(path, tasks):
+    """Write tasks as line-delimited GeoJSON (RFC 8142) and return their number."""
+    count = 0
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        for task in tasks:
+            file.write(RS + json.dumps(task, ensure_ascii=False, separators=(',', ':')) + '\n')
+            count += 1
+    os.replace(tmp_path, path)
+    return count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Conflate scraped features with an OSM extract into a MapRoulette challenge.')
+    parser.add_argument('geojson', help='scraped features')
+    parser.add_argument('--extract', required=True, help='OSM XML extract (.osm)')
+    parser.add_argument('--ref-key', help='brand ref tag, e.g. ref:FR:MarieBlachere:id')
+    parser.add_argument('--radius', type=float, default=RADIUS,
+                        help=f'matching radius in meters (default: {RADIUS})')
+    parser.add_argument('--match', action='append', metavar='TAG=VALUE',
+                        help='select the brand nodes of the extract (default: brand:wikidata of the features)')
+    parser.add_argument('--out', default='challenge.geojson', help='challenge file (default: challenge.geojson)')
+    args = parser.parse_args(argv)
+
+    features = [f for f in load_features(args.geojson) if (f.get('geometry') or {}).get('type') == 'Point']
+    if args.match:
+        match_tags = {}
+        for item in args.match:
+            key, _, value = item.partition('=')
+            match_tags.setdefault(key, set()).add(value)
+    else:
+        match_tags = brand_filter(features)
+
+    nodes = load_osm_nodes(args.extract, match_tags, args.ref_key)
+    matches = match_features(features, nodes, args.ref_key, args.radius)
+    count = write_challenge(args.out, conflate(features, nodes, matches))
+    print(f'{len(nodes)} brand nodes in the extract, {len(matches)} of {len(features)} features matched')
+    print(f'{count} tasks written to {args.out}')
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,48 @@
+"""
+Extract <script> payloads from raw HTML without building a DOM.
+
+Pages embed their data as JSON in a script tag (__NEXT_DATA__, ld+json,
+text/x-magento-init...). Instead of parsing the whole document, the raw bytes
+are scanned for script tags and the scan stops as soon as the wanted tag is
+found. Payloads are returned as bytes, ready for json.loads.
+"""
+import re
+
+RE_SCRIPT_OPEN = re.compile(rb'<script\b([^>]*)>', re.IGNORECASE)
+RE_SCRIPT_CLOSE = re.compile(rb'</script\s*>', re.IGNORECASE)
+RE_ATTRIBUTE = re.compile(rb'([^\s=/>]+)(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+)))?')
+
+def parse_attributes(raw):
+    attributes = {}
+    for match in RE_ATTRIBUTE.finditer(raw):
+        value = match.group(2) or match.group(3) or match.group(4) or b''
+        attributes[match.group(1).decode('latin-1').lower()] = value.decode('utf-8', 'replace')
+    return attributes
+
+def iter_scripts(content, id=None, type=None):
+    """Yield the body of every <script> tag with the given id and/or type, in document order."""
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    wanted = [(name, value) for name, value in (('id', id), ('type', type)) if value is not None]
+
+    pos = 0
+    while True:
+        opening = RE_SCRIPT_OPEN.search(content, pos)
+        if not opening:
+            return
+        closing = RE_SCRIPT_CLOSE.search(content, opening.end())
+        if not closing:
+            return
+        pos = closing.end()
+
+        raw_attributes = opening.group(1)
+        # Cheap rejection before parsing the attributes of every script tag
+        if any(value.encode('utf-8') not in raw_attributes for _, value in wanted):
+            continue
+        attributes = parse_attributes(raw_attributes)
+        if all(attributes.get(name) == value for name, value in wanted):
+            yield content[opening.end():closing.start()]
+
+def find_script(content, id=None, type=None):
+    """Return the body of the first <script> tag with the given id and/or type, or None."""
+    return next(iter_scripts(content, id=id, type=type), None)
@@ -0,0 +1,154 @@
+"""
+Streaming GeoJSON FeatureCollection writer.
+
+Features are serialized one at a time through a buffered file handle, so
+memory does not grow with the number of features. The file is written next
+to its destination and renamed on completion: readers never see a partial
+file and a failed run keeps the previous output.
+
+With indent set, the output is byte-identical to json.dump(collection, f,
+indent=indent, ensure_ascii=False). With indent=None the compact mode writes
+no whitespace at all.
+"""
+import contextlib
+import json
+import os
+import time
+
+from common.metrics import current
+
+BUFFER_SIZE = 1024 * 1024
+
+def round_coordinates(coordinates, precision):
+    if isinstance(coordinates, (list, tuple)):
+        return [round_coordinates(c, precision) for c in coordinates]
+    return round(coordinates, precision)
+
+class FeatureCollectionWriter:
+    """
+    Write a FeatureCollection feature by feature:
+
+        with FeatureCollectionWriter('shops.geojson') as writer:
+            for feature in features:
+                writer.write(feature)
+    """
+    stage = 'serialize'
+
+    def __init__(self, path, indent=2, precision=None, ensure_ascii=False):
+        self.path = path
+        self.indent = indent
+        self.precision = precision
+        self.ensure_ascii = ensure_ascii
+        self.count = 0
+        self._tmp_path = f'{path}.{os.getpid()}.tmp'
+        # Opened on the first write, so that a writer never used leaves no file
+        self._file = None
+        if indent is None:
+            self._separators = (',', ':')
+        else:
+            self._separators = None
+            self._prefix = ' ' * (2 * indent)
+
+    def _open(self):
+        self._file = open(self._tmp_path, 'w', encoding='utf-8', buffering=BUFFER_SIZE)
+        if self.indent is None:
+            self._file.write('{"type":"FeatureCollection","features":[')
+        else:
+            pad = ' ' * self.indent
+            self._file.write(f'{{\n{pad}"type": "FeatureCollection",\n{pad}"features": [')
+
+    def write(self, feature):
+        if self._file is None:
+            self._open()
+        if self.precision is not None and feature.get('geometry'):
+            geometry = dict(feature['geometry'])
+            geometry['coordinates'] = round_coordinates(geometry['coordinates'], self.precision)
+            feature = {**feature, 'geometry': geometry}
+
+        text = json.dumps(feature, indent=self.indent, separators=self._separators, ensure_ascii=self.ensure_ascii)
+        if self.indent is None:
+            self._file.write(text if self.count == 0 else ',' + text)
+        else:
+            text = self._prefix + text.replace('\n', '\n' + self._prefix)
+            self._file.write(('\n' if self.count == 0 else ',\n') + text)
+        self.count += 1
+
+    def close(self):
+        """Write the end of the collection and move the file to its destination."""
+        if self._file is None:
+            self._open()
+        if self.indent is None:
+            self._file.write(']}')
+        elif self.count == 0:
+            self._file.write(']\n}')
+        else:
+            pad = ' ' * self.indent
+            self._file.write(f'\n{pad}]\n}}')
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        """Drop the partial file and keep the previous output."""
+        if self._file is not None:
+            # Also called when close() failed: the file may be closed or already moved
+            self._file.close()
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            try:
+                self.close()
+            except BaseException:
+                self.abort()
+                raise
+        else:
+            self.abort()
+
+def write_feature_collection(path, features, indent=2, precision=None, ensure_ascii=False):
+    """Write an iterable of features as a FeatureCollection and return the number of features."""
+    with FeatureCollectionWriter(path, indent=indent, precision=precision, ensure_ascii=ensure_ascii) as writer:
+        for feature in features:
+            writer.write(feature)
+    return writer.count
+
+def write_features(features, *writers):
+    """
+    Write every feature to all writers (GeoJSON, OSM...) in a single pass over
+    the features, then close the writers. Return the number of features.
+    If anything fails, the writers not closed yet drop their partial files,
+    including the one whose close failed.
+    In an instrumented run, the time spent in each writer is added to its stage.
+    """
+    count = 0
+    seconds = [0.0] * len(writers)
+    try:
+        for feature in features:
+            for i, writer in enumerate(writers):
+                start = time.perf_counter()
+                writer.write(feature)
+                seconds[i] += time.perf_counter() - start
+            count += 1
+    except BaseException:
+        for writer in writers:
+            writer.abort()
+        raise
+    for i, writer in enumerate(writers):
+        start = time.perf_counter()
+        try:
+            writer.close()
+        except BaseException:
+            # The writers closed before keep their output, this one and the others are dropped
+            for remaining in writers[i:]:
+                remaining.abort()
+            raise
+        seconds[i] += time.perf_counter() - start
+
+    metrics = current()
+    if metrics is not None:
+        for writer, spent in zip(writers, seconds):
+            metrics.add_time(getattr(writer, 'stage', 'serialize'), spent)
+    return count
@@ -0,0 +1,287 @@
+"""
+Per-feature history of the scraped stores, in a SQLite database.
+
+Every run records the number of features of the brand, and for each store
+(identified by its ref) the dates it was first and last seen, the dates it
+appeared, disappeared or reopened, and every tag that changed since the
+previous run. Count series,
+churn and openings/closures per month are then indexed queries instead of
+diffs of the GeoJSON files committed in git. Streaming brands record their
+run with a HistoryWriter sink, one store at a time.
+
+    python -m common.history Marie-Blachere/history.sqlite counts
+    python -m common.history Marie-Blachere/history.sqlite churn
+    python -m common.history Marie-Blachere/history.sqlite monthly
+"""
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+
+from common.changeset import tag_changes
+from common.geojson_writer import write_features
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    brand TEXT NOT NULL,
+    date TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (brand, date)
+);
+CREATE TABLE IF NOT EXISTS features (
+    brand TEXT NOT NULL,
+    ref TEXT NOT NULL,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    removed TEXT,
+    lon REAL,
+    lat REAL,
+    properties TEXT NOT NULL,
+    PRIMARY KEY (brand, ref)
+);
+CREATE TABLE IF NOT EXISTS changes (
+    brand TEXT NOT NULL,
+    ref TEXT NOT NULL,
+    date TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    old TEXT,
+    new TEXT
+);
+CREATE TABLE IF NOT EXISTS events (
+    brand TEXT NOT NULL,
+    ref TEXT NOT NULL,
+    date TEXT NOT NULL,
+    kind TEXT NOT NULL CHECK (kind IN ('added', 'removed', 'reopened'))
+);
+CREATE INDEX IF NOT EXISTS features_last_seen ON features (brand, last_seen);
+CREATE INDEX IF NOT EXISTS events_ref ON events (brand, ref);
+CREATE INDEX IF NOT EXISTS events_date ON events (brand, date);
+CREATE INDEX IF NOT EXISTS changes_ref ON changes (brand, ref);
+CREATE INDEX IF NOT EXISTS changes_date ON changes (brand, date);
+"""
+
+class HistoryStore:
+
+    def __init__(self, path):
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.executescript(SCHEMA)
+
+    def has_runs(self, brand):
+        return self._db.execute('SELECT 1 FROM runs WHERE brand = ? LIMIT 1', (brand,)).fetchone() is not None
+
+    def import_counts(self, brand, csv_path):
+        """Seed the count series with a date,count history CSV."""
+        with open(csv_path, newline='') as file, self._db:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO runs (brand, date, count) VALUES (?, ?, ?)',
+                ((brand, date, int(count)) for date, count in csv.reader(file)),
+            )
+
+    def record_run(self, brand, date, features, ref_key):
+        """
+        Record the features of a run on date (YYYY-MM-DD) and return the
+        number of (added, removed, changed) stores since the previous run.
+        """
+        features = list(features)
+        added = changed = 0
+        with self._db:
+            for feature in last_by_ref(features, ref_key).values():
+                is_added, is_changed = self.record_feature(brand, date, feature, ref_key)
+                added += is_added
+                changed += is_changed
+            removed = self.end_run(brand, date, len(features))
+        return added, removed, changed
+
+    def record_feature(self, brand, date, feature, ref_key):
+        """
+        Record a feature of the run on date, looked up by its ref, and return
+        whether the store was (added or reopened, changed). Nothing is committed.
+        """
+        properties = feature['properties']
+        ref = properties.get(ref_key)
+        if ref is None:
+            return False, False
+        ref = str(ref)
+        lon, lat = (feature.get('geometry') or {}).get('coordinates', (None, None))[:2]
+        raw = json.dumps(properties, ensure_ascii=False, sort_keys=True)
+
+        known = self._db.execute(
+            'SELECT properties, removed FROM features WHERE brand = ? AND ref = ?', (brand, ref)).fetchone()
+        if known is None:
+            self._db.execute(
+                'INSERT INTO features (brand, ref, first_seen, last_seen, lon, lat, properties) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (brand, ref, date, date, lon, lat, raw))
+            self._add_event(brand, ref, date, 'added')
+            return True, False
+
+        previous, removed = known
+        if removed is not None:
+            self._add_event(brand, ref, date, 'reopened')
+        tags = tag_changes(json.loads(previous), properties)
+        if tags:
+            self._db.executemany(
+                'INSERT INTO changes (brand, ref, date, tag, old, new) VALUES (?, ?, ?, ?, ?, ?)',
+                ((brand, ref, date, tag, old, new) for tag, (old, new) in sorted(tags.items())))
+        self._db.execute(
+            'UPDATE features SET last_seen = ?, removed = NULL, lon = ?, lat = ?, properties = ? '
+            'WHERE brand = ? AND ref = ?',
+            (date, lon, lat, raw, brand, ref))
+        return removed is not None, bool(tags)
+
+    def end_run(self, brand, date, count):
+        """
+        Record the count of the run and mark the stores it did not see as
+        removed, return their number. Nothing is committed.
+        """
+        self._db.execute('INSERT OR REPLACE INTO runs (brand, date, count) VALUES (?, ?, ?)',
+                         (brand, date, count))
+        gone = [ref for ref, in self._db.execute(
+            'SELECT ref FROM features WHERE brand = ? AND removed IS NULL AND last_seen < ?', (brand, date))]
+        self._db.execute(
+            'UPDATE features SET removed = ? WHERE brand = ? AND removed IS NULL AND last_seen < ?',
+            (date, brand, date))
+        for ref in gone:
+            self._add_event(brand, ref, date, 'removed')
+        return len(gone)
+
+    def commit(self):
+        self._db.commit()
+
+    def rollback(self):
+        self._db.rollback()
+
+    def _add_event(self, brand, ref, date, kind):
+        self._db.execute('INSERT INTO events (brand, ref, date, kind) VALUES (?, ?, ?, ?)', (brand, ref, date, kind))
+
+    def counts(self, brand):
+        """Return [(date, count)] of every run."""
+        return self._db.execute('SELECT date, count FROM runs WHERE brand = ? ORDER BY date', (brand,)).fetchall()
+
+    def churn(self, brand):
+        """Return [(date, added, removed, changed)] of every run recorded with its features."""
+        return self._db.execute("""
+            SELECT runs.date,
+                   (SELECT COUNT(*) FROM events WHERE brand = runs.brand AND date = runs.date AND kind != 'removed'),
+                   (SELECT COUNT(*) FROM events WHERE brand = runs.brand AND date = runs.date AND kind = 'removed'),
+                   (SELECT COUNT(DISTINCT ref) FROM changes WHERE brand = runs.brand AND date = runs.date)
+            FROM runs
+            WHERE brand = ? AND runs.date >= (SELECT MIN(date) FROM events WHERE brand = runs.brand)
+            ORDER BY runs.date
+        """, (brand,)).fetchall()
+
+    def monthly(self, brand):
+        """Return [(YYYY-MM, openings, closures)]; stores of the first run are not counted as openings."""
+        return self._db.execute("""
+            SELECT substr(date, 1, 7) AS month, SUM(kind != 'removed'), SUM(kind = 'removed')
+            FROM events
+            WHERE brand = :brand AND date > (SELECT MIN(date) FROM events WHERE brand = :brand)
+            GROUP BY month
+            ORDER BY month
+        """, {'brand': brand}).fetchall()
+
+    def brands(self):
+        return [brand for brand, in self._db.execute('SELECT DISTINCT brand FROM runs ORDER BY brand')]
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def last_by_ref(features, ref_key):
+    """
+    Return {ref: feature} of the features that have a ref. A ref repeated in
+    a run is a single store: the last feature wins, so that it is compared
+    with the previous run instead of with the first one.
+    """
+    stores = {}
+    for feature in features:
+        ref = feature['properties'].get(ref_key)
+        if ref is not None:
+            stores[str(ref)] = feature
+    return stores
+
+class HistoryWriter:
+    """
+    Record a run as a sink of write_features: each store is looked up by its
+    ref instead of loading the previous run, and the run is committed on
+    close. Stores are recorded on close, once the last feature of each ref
+    is known. The first time, the count series is seeded with the existing
+    date,count CSV.
+    """
+    stage = 'history'
+
+    def __init__(self, path, brand, date, ref_key, counts_csv=None):
+        self.brand = brand
+        self.date = date
+        self.ref_key = ref_key
+        self.path = path
+        self.counts_csv = counts_csv
+        self.count = self.added = self.changed = 0
+        self.removed = None
+        self._stores = {}
+
+    def write(self, feature):
+        ref = feature['properties'].get(self.ref_key)
+        if ref is not None:
+            self._stores[str(ref)] = feature
+        self.count += 1
+
+    def close(self):
+        store = HistoryStore(self.path)
+        try:
+            if self.counts_csv and not store.has_runs(self.brand) and os.path.exists(self.counts_csv):
+                store.import_counts(self.brand, self.counts_csv)
+            for feature in self._stores.values():
+                added, changed = store.record_feature(self.brand, self.date, feature, self.ref_key)
+                self.added += added
+                self.changed += changed
+            self.removed = store.end_run(self.brand, self.date, self.count)
+            store.commit()
+        except BaseException:
+            store.rollback()
+            raise
+        finally:
+            store.close()
+
+    def abort(self):
+        self._stores = {}
+
+def record_features(path, brand, date, features, ref_key, counts_csv=None):
+    """
+    Record a run in the history database at path and return the number of
+    (added, removed, changed) stores. The first time, the count series is
+    seeded with the existing date,count CSV.
+    """
+    writer = HistoryWriter(path, brand, date, ref_key, counts_csv)
+    write_features(features, writer)
+    return writer.added, writer.removed, writer.changed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Query the history of the scraped stores.')
+    parser.add_argument('database', help='history database, e.g. Stokomani/history.sqlite')
+    parser.add_argument('query', choices=['counts', 'churn', 'monthly'])
+    parser.add_argument('--brand', help='brand to query (default: every brand of the database)')
+    args = parser.parse_args(argv)
+
+    headers = {
+        'counts': ('date', 'count'),
+        'churn': ('date', 'added', 'removed', 'changed'),
+        'monthly': ('month', 'openings', 'closures'),
+    }
+    with HistoryStore(args.database) as store:
+        writer = csv.writer(sys.stdout)
+        writer.writerow(('brand', *headers[args.query]))
+        for brand in [args.brand] if args.brand else store.brands():
+            for row in getattr(store, args.query)(brand):
+                writer.writerow((brand, *row))
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,182 @@
+"""
+On-disk HTTP cache shared by all scrapers.
+
+Response bodies are stored on disk with their ETag/Last-Modified validators.
+The next GET of the same URL is sent with If-None-Match/If-Modified-Since and
+a 304 answer is served from the stored body. The cache is bounded in size and
+evicts the least recently used entries first.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+# One cache at the root of the repository, whatever the current directory
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.http_cache')
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+POOL_SIZE = 10
+
+# Headers describing the transfer, not the cached body
+SKIPPED_HEADERS = {'connection', 'content-encoding', 'content-length', 'keep-alive', 'transfer-encoding'}
+
+class CachedSession(requests.Session):
+    """
+    A requests session with a keep-alive pool and a conditional GET cache.
+    Caching is disabled when cache_dir is None.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, pool_size=POOL_SIZE):
+        super().__init__()
+        adapter = HTTPAdapter(pool_maxsize=pool_size)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> (size, last access), kept in memory to evict without rescanning the disk
+        self._index = {}
+        self._size = 0
+        if cache_dir is None:
+            return
+        os.makedirs(cache_dir, exist_ok=True)
+        for name in os.listdir(cache_dir):
+            if name.endswith('.body'):
+                stat = os.stat(os.path.join(cache_dir, name))
+                self._index[name[:-5]] = (stat.st_size, stat.st_mtime)
+        self._size = sum(size for size, _ in self._index.values())
+
+    def request(self, method, url, **kwargs):
+        if self.cache_dir is None or method.upper() != 'GET' or kwargs.get('stream'):
+            return super().request(method, url, **kwargs)
+
+        key = cache_key(url, kwargs.get('params'))
+        entry = self._load(key)
+        conditional = kwargs
+        if entry:
+            headers = dict(kwargs.get('headers') or {})
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+            conditional = {**kwargs, 'headers': headers}
+
+        response = super().request(method, url, **conditional)
+
+        if response.status_code == 304 and entry:
+            cached = self._cached_response(key, entry, response)
+            if cached is not None:
+                return cached
+            # Entry evicted in the meantime: send the request again without validators
+            response = super().request(method, url, **kwargs)
+        if response.status_code == 200 and ('ETag' in response.headers or 'Last-Modified' in response.headers):
+            self._store(key, response)
+        return response
+
+    def _paths(self, key):
+        return os.path.join(self.cache_dir, f'{key}.json'), os.path.join(self.cache_dir, f'{key}.body')
+
+    def _load(self, key):
+        if key not in self._index:
+            return None
+        meta_path, _ = self._paths(key)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _cached_response(self, key, entry, not_modified):
+        """Build a 200 response from the stored body of a 304 answer, None if the body is gone."""
+        _, body_path = self._paths(key)
+        try:
+            with open(body_path, 'rb') as f:
+                body = f.read()
+        except OSError:
+            return None
+        self._touch(key, len(body))
+
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.headers.update({k: v for k, v in not_modified.headers.items() if k.lower() in ('etag', 'last-modified')})
+        response._content = body
+        response.encoding = entry.get('encoding')
+        response.url = entry['url']
+        response.request = not_modified.request
+        response.elapsed = not_modified.elapsed
+        response.from_cache = True
+        return response
+
+    def _store(self, key, response):
+        meta_path, body_path = self._paths(key)
+        body = response.content
+        meta = {
+            'url': response.url,
+            'encoding': response.encoding,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'headers': {k: v for k, v in response.headers.items() if k.lower() not in SKIPPED_HEADERS},
+        }
+        with self._lock:
+            write_atomic(body_path, body)
+            write_atomic(meta_path, json.dumps(meta).encode('utf-8'))
+            self._size -= self._index.get(key, (0, 0))[0]
+            self._index[key] = (len(body), time.time())
+            self._size += len(body)
+            self._evict()
+
+    def _touch(self, key, size):
+        with self._lock:
+            # Evicted since its body was read: adding it back would count a removed entry in _size
+            if key not in self._index:
+                return
+            self._index[key] = (size, time.time())
+        try:
+            os.utime(self._paths(key)[1])
+        except OSError:
+            pass
+
+    def _evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        if self._size <= self.max_bytes:
+            return
+        for key, (size, _) in sorted(self._index.items(), key=lambda item: item[1][1]):
+            for path in self._paths(key):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            del self._index[key]
+            self._size -= size
+            if self._size <= self.max_bytes:
+                break
+
+def cache_key(url, params=None):
+    raw = url if not params else f'{url}?{json.dumps(params, sort_keys=True, default=str)}'
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def write_atomic(path, data):
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def create_session(pool_size=POOL_SIZE, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    """
+    Create the session used by scrapers to fetch data.
+    When recording or replaying fixtures (see common.replay), the disk cache
+    is disabled so that every exchange goes through the fixture archive.
+    """
+    from common.replay import http_mode, mount_replay_adapters
+
+    if http_mode():
+        cache_dir = None
+    session = CachedSession(cache_dir=cache_dir, max_bytes=max_bytes, pool_size=pool_size)
+    mount_replay_adapters(session, pool_size)
+    return session
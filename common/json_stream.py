@@ -0,0 +1,66 @@
+"""
+Read the items of a large JSON array one at a time.
+
+The file is read by chunks and every item is decoded as soon as it is
+complete, so memory use depends on the largest item, not on the size of the
+file. The items are the same as with json.load.
+
+    with open('shops.json', encoding='utf-8') as file:
+        for shop in iter_json_array(file):
+            ...
+"""
+import json
+import re
+
+CHUNK_SIZE = 64 * 1024
+RE_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+def iter_json_array(file, chunk_size=CHUNK_SIZE):
+    """Yield the items of the JSON array of a text file, raise ValueError if it is not one."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+    # '[' before the array, 'first' or 'item' before an item, ',' after an item
+    expected = '['
+
+    while True:
+        pos = RE_WHITESPACE.match(buffer, pos).end()
+        if pos < len(buffer):
+            if expected == '[':
+                if buffer[pos] != '[':
+                    raise ValueError(f'Expected a JSON array, found {buffer[pos]!r}')
+                pos += 1
+                expected = 'first'
+                continue
+            if expected == 'first' and buffer[pos] == ']':
+                return
+            if expected == ',':
+                separator = buffer[pos]
+                pos += 1
+                if separator == ']':
+                    return
+                if separator != ',':
+                    raise ValueError(f'Expected , or ] after an item, found {separator!r}')
+                expected = 'item'
+                continue
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                # A number cut by the end of the buffer may go on in the next chunk
+                if eof or (end < len(buffer) and buffer[end] in ' \t\n\r,]'):
+                    yield item
+                    pos = end
+                    expected = ','
+                    continue
+        elif eof:
+            raise ValueError('Unexpected end of the JSON array')
+
+        # The item is cut by the end of the buffer: read the next chunk
+        chunk = file.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
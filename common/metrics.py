@@ -0,0 +1,208 @@
+"""
+Timers and counters of a scraper run, written as a JSON report.
+
+A run is split in stages (fetch, parse, transform, serialize, osm-export...)
+timed with `stage(name)`. Stages nest, e.g. parse is part of fetch or
+transform, and the time of a stage run by several threads is summed over the
+threads. The HTTP session reports every response (count, bytes, latency) to
+the metrics of the run that sent the request.
+
+The metrics of the current run are kept in a context variable, so brands run
+concurrently by common.runner each get their own report. Worker threads
+started by a run must be given its metrics with `propagate(func)`.
+With SCRAPER_PROFILE=1 the stages are also profiled, see common.profiling.
+
+    run_instrumented(REPORT_FILE, create_session(), fetch, transform, write)
+"""
+import contextlib
+import contextvars
+import datetime
+import json
+import math
+import os
+import threading
+import time
+
+from common.profiling import RunProfiler, profiling_enabled
+
+_current = contextvars.ContextVar('metrics', default=None)
+
+def percentile(values, p):
+    """Nearest-rank percentile of a list of values, None if it is empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+class RunMetrics:
+
+    def __init__(self, name):
+        self.name = name
+        self.started = datetime.datetime.now()
+        self.seconds = None
+        self.features = None
+        self.stages = {}
+        self.counters = {}
+        self.latencies = []
+        self.profiler = None
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    def add_time(self, stage, seconds, calls=1):
+        with self._lock:
+            timer = self.stages.setdefault(stage, {'seconds': 0.0, 'calls': 0})
+            timer['seconds'] += seconds
+            timer['calls'] += calls
+
+    def count(self, counter, n=1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def observe_response(self, response):
+        with self._lock:
+            self.latencies.append(response.elapsed.total_seconds())
+        self.count('requests')
+        self.count('bytes', len(response.content or b''))
+        if response.status_code == 304:
+            self.count('not_modified')
+        elif response.status_code >= 400:
+            self.count('errors')
+
+    @contextlib.contextmanager
+    def activate(self):
+        """Record the stages and requests of the current thread in these metrics."""
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+    @contextlib.contextmanager
+    def run_stage(self, name):
+        """Time a top-level stage of the run, and profile it when profiling is enabled."""
+        with stage(name):
+            if self.profiler is None:
+                yield
+            else:
+                with self.profiler.stage(name):
+                    yield
+
+    def stop(self, features=None):
+        self.seconds = time.perf_counter() - self._start
+        self.features = features
+
+    def report(self):
+        seconds = self.seconds if self.seconds is not None else time.perf_counter() - self._start
+        return {
+            'name': self.name,
+            'started': self.started.isoformat(timespec='seconds'),
+            'seconds': round(seconds, 6),
+            'features': self.features,
+            'features_per_second': round(self.features / seconds, 1) if self.features and seconds else None,
+            'stages': {
+                stage: {'seconds': round(timer['seconds'], 6), 'calls': timer['calls']}
+                for stage, timer in self.stages.items()
+            },
+            'requests': {
+                'count': self.counters.get('requests', 0),
+                'bytes': self.counters.get('bytes', 0),
+                'not_modified': self.counters.get('not_modified', 0),
+                'errors': self.counters.get('errors', 0),
+                'latency_p50': percentile(self.latencies, 50),
+                'latency_p95': percentile(self.latencies, 95),
+            },
+            'counters': {
+                counter: n for counter, n in self.counters.items()
+                if counter not in ('requests', 'bytes', 'not_modified', 'errors')
+            },
+        }
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.report(), file, indent=2)
+            file.write('\n')
+
+def current():
+    """Metrics of the current run, or None when the run is not instrumented."""
+    return _current.get()
+
+@contextlib.contextmanager
+def stage(name):
+    """Time a stage of the current run; does nothing outside an instrumented run."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add_time(name, time.perf_counter() - start)
+
+def propagate(func):
+    """Wrap func to record its stages and requests in the current run when called from another thread."""
+    metrics = _current.get()
+    if metrics is None:
+        return func
+    if metrics.profiler is not None:
+        func = metrics.profiler.wrap(func)
+
+    def run_with_metrics(*args, **kwargs):
+        with metrics.activate():
+            return func(*args, **kwargs)
+    return run_with_metrics
+
+def record_response(response, *args, **kwargs):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.observe_response(response)
+
+def instrument(session):
+    """
+    Report the responses of a requests session to the current run metrics.
+    Without hooks (None or the requests module) the session is left as is.
+    """
+    hooks = getattr(session, 'hooks', None)
+    if hooks is None:
+        return session
+    hooks = hooks.setdefault('response', [])
+    if record_response not in hooks:
+        hooks.append(record_response)
+    return session
+
+@contextlib.contextmanager
+def instrumented_run(report_file, session, name=None):
+    """
+    Record a run in new metrics, and write them to report_file (unless None)
+    at the end, with the profiles when profiling is enabled.
+    """
+    if name is None:
+        name = os.path.basename(report_file).split('.')[0]
+    metrics = RunMetrics(name)
+    if profiling_enabled():
+        metrics.profiler = RunProfiler()
+    instrument(session)
+    with metrics.activate():
+        yield metrics
+    if metrics.seconds is None:
+        metrics.stop()
+    if report_file is not None:
+        metrics.write(report_file)
+        if metrics.profiler is not None:
+            files = metrics.profiler.write(os.path.join(os.path.dirname(report_file), name))
+            print(f"Profiles written to {', '.join(os.path.basename(path) for path in files)}")
+
+def run_instrumented(report_file, session, fetch, transform, write, name=None):
+    """
+    Run the fetch(session), transform and write stages of a scraper, write the
+    metrics of the run to report_file (unless None) and return them.
+    """
+    with instrumented_run(report_file, session, name) as metrics:
+        with metrics.run_stage('fetch'):
+            data = fetch(session)
+        with metrics.run_stage('transform'):
+            features = transform(data)
+        with metrics.run_stage('write'):
+            write(features)
+        metrics.stop(len(features))
+    return metrics
@@ -0,0 +1,110 @@
+"""
+Opening hours compiler shared by all brands.
+
+Each brand adapter turns its own data into (day, interval) pairs, where day is
+0 for Monday to 6 for Sunday and interval is a "HH:MM-HH:MM" string. The pairs
+are normalized into a canonical weekly schedule: a tuple of 7 sorted tuples of
+intervals, all interned. Chain stores share a handful of schedules, so the
+OSM opening_hours value of each schedule is computed once and memoized.
+"""
+import re
+import sys
+from functools import lru_cache
+
+CACHE_SIZE = 1024
+
+DAYS = ('Mo', 'Tu', 'We', 'Th', 'Fr', 'Sa', 'Su')
+DAY_INDEX = {day: i for i, day in enumerate(DAYS)}
+
+RE_SHORT_HOUR = re.compile(r'(?<![0-9])([0-9]):')
+RE_RULE = re.compile(r'^(?:(?P<days>[A-Z][a-z](?:-[A-Z][a-z])?(?:\s*,\s*[A-Z][a-z](?:-[A-Z][a-z])?)*)\s+)?(?P<intervals>[0-9].*)$')
+RE_INTERVAL = re.compile(r'^[0-9]{1,2}:[0-9]{2}-[0-9]{1,2}:[0-9]{2}$')
+
+def normalize_interval(interval):
+    """Strip spaces and pad single-digit hours: ' 9:00-12:00' -> '09:00-12:00'."""
+    return sys.intern(RE_SHORT_HOUR.sub(r'0\1:', interval.replace(' ', '')))
+
+@lru_cache(maxsize=CACHE_SIZE)
+def intern_schedule(schedule):
+    """Return the first equal schedule among the recent ones, so identical schedules share one object."""
+    return schedule
+
+def make_schedule(pairs):
+    """Build the canonical weekly schedule from (day, interval) pairs."""
+    week = [set() for _ in DAYS]
+    for day, interval in pairs:
+        if interval:
+            week[day].add(normalize_interval(interval))
+    schedule = tuple(tuple(sorted(intervals)) for intervals in week)
+    return intern_schedule(schedule)
+
+@lru_cache(maxsize=CACHE_SIZE)
+def format_schedule(schedule):
+    """
+    Format a canonical schedule as an OSM opening_hours value. Consecutive
+    days with the same intervals are grouped (Mo-Fr 09:00-19:00) and a single
+    rule for the whole week is written without days.
+    """
+    rules = []
+    first = 0
+    while first < len(DAYS):
+        intervals = schedule[first]
+        last = first
+        while last + 1 < len(DAYS) and schedule[last + 1] == intervals:
+            last += 1
+        if intervals:
+            days = DAYS[first] if first == last else f'{DAYS[first]}-{DAYS[last]}'
+            rules.append(f"{days} {','.join(intervals)}")
+        first = last + 1
+
+    if len(rules) == 1 and rules[0].startswith('Mo-Su '):
+        return rules[0][len('Mo-Su '):]
+    return '; '.join(rules)
+
+def parse_days(days):
+    """Return the day numbers of 'Mo-We, Sa', None if a day is unknown."""
+    numbers = []
+    for part in days.split(','):
+        first, _, last = part.strip().partition('-')
+        if first not in DAY_INDEX or (last and last not in DAY_INDEX):
+            return None
+        start = DAY_INDEX[first]
+        end = DAY_INDEX[last] if last else start
+        numbers.extend((start + i) % len(DAYS) for i in range((end - start) % len(DAYS) + 1))
+    return numbers
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_schedule(value):
+    """
+    Parse an opening_hours value made of days and time intervals back into
+    its canonical schedule, None for anything else (off, PH, comments...).
+    A later rule replaces the intervals of its days, as in OSM.
+    """
+    week = {}
+    for rule in value.split(';'):
+        match = RE_RULE.match(rule.strip())
+        if match is None:
+            return None
+        days = parse_days(match['days']) if match['days'] else range(len(DAYS))
+        intervals = [interval.strip() for interval in match['intervals'].split(',')]
+        if days is None or not all(RE_INTERVAL.match(interval) for interval in intervals):
+            return None
+        for day in days:
+            week[day] = intervals
+    return make_schedule((day, interval) for day, intervals in week.items() for interval in intervals)
+
+def same_opening_hours(value1, value2):
+    """
+    Whether two opening_hours values describe the same schedule, whatever
+    their formatting ('Mo 09:00-19:00; Tu 09:00-19:00' and 'Mo-Tu 09:00-19:00').
+    """
+    if value1 == value2:
+        return True
+    if not isinstance(value1, str) or not isinstance(value2, str):
+        return False
+    schedule = parse_schedule(value1)
+    return schedule is not None and schedule == parse_schedule(value2)
+
+def compile_opening_hours(pairs):
+    """Compile (day, interval) pairs into an OSM opening_hours value."""
+    return format_schedule(make_schedule(pairs))
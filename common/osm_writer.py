@@ -0,0 +1,93 @@
+"""
+Streaming OSM XML writer.
+
+Point features are written as <node> elements with their properties as tags,
+straight to disk, with negative ids assigned in write order (-1, -2...). The
+XML is the same as geojson2osm output, without building the whole document
+in memory first. Unlike geojson2osm, points sharing the same coordinates are
+kept as separate nodes instead of having their tags merged.
+"""
+import contextlib
+import os
+
+BUFFER_SIZE = 1024 * 1024
+GENERATOR = 'geojson2osm'
+
+ATTRIBUTE_ESCAPES = str.maketrans({
+    '&': '&amp;',
+    '<': '&lt;',
+    '>': '&gt;',
+    '"': '&quot;',
+    '\r': '&#13;',
+    '\n': '&#10;',
+    '\t': '&#09;',
+})
+
+def escape_attribute(value):
+    return str(value).translate(ATTRIBUTE_ESCAPES)
+
+class OsmWriter:
+    """Write Point features as OSM nodes, with the same interface as FeatureCollectionWriter."""
+    stage = 'osm-export'
+
+    def __init__(self, path, generator=GENERATOR):
+        self.path = path
+        self.generator = generator
+        self.count = 0
+        self._tmp_path = f'{path}.{os.getpid()}.tmp'
+        # Opened on the first write, so that a writer never used leaves no file
+        self._file = None
+
+    def _open(self):
+        self._file = open(self._tmp_path, 'w', encoding='utf-8', buffering=BUFFER_SIZE)
+        self._file.write(f'<osm version="0.6" generator="{escape_attribute(self.generator)}">')
+
+    def write(self, feature):
+        if self._file is None:
+            self._open()
+        geometry = feature.get('geometry') or {}
+        if geometry.get('type') != 'Point':
+            print(f"Unknown or unsupported geometry type: {geometry.get('type')}")
+            return
+
+        lon, lat = geometry['coordinates'][:2]
+        tags = ''.join(
+            f'<tag k="{escape_attribute(k)}" v="{escape_attribute(v)}" />'
+            for k, v in (feature.get('properties') or {}).items()
+            if v is not None
+        )
+        node_id = -(self.count + 1)
+        if tags:
+            self._file.write(f'<node id="{node_id}" lat="{lat}" lon="{lon}">{tags}</node>')
+        else:
+            self._file.write(f'<node id="{node_id}" lat="{lat}" lon="{lon}" />')
+        self.count += 1
+
+    def close(self):
+        """Write the end of the document and move the file to its destination."""
+        if self._file is None:
+            self._open()
+        self._file.write('</osm>')
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        """Drop the partial file and keep the previous output."""
+        if self._file is not None:
+            # Also called when close() failed: the file may be closed or already moved
+            self._file.close()
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            try:
+                self.close()
+            except BaseException:
+                self.abort()
+                raise
+        else:
+            self.abort()
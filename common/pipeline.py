@@ -0,0 +1,165 @@
+"""
+Stream records from fetch to write through bounded queues.
+
+A streaming brand does not build the list of its stores, then the list of
+its features, before writing them. The fetch source, every transform stage
+and the writers run at the same time, each step in its own thread, and are
+connected by queues of at most `depth` items: when the writers are slower
+than the fetch, the queues fill up and the fetch waits. Memory use depends
+on the depth of the queues, not on the number of stores, as long as the
+source reads its input as it yields records (see common.json_stream) and the
+sinks do not keep the features.
+
+    pipeline = Pipeline(fetch_records(session), transform_record)
+    count = write_features(pipeline, FeatureCollectionWriter(GEOJSON_FILE), OsmWriter(OSM_FILE))
+
+A stage returning None drops the record. An exception raised by the source
+or a stage is raised again by the iteration over the pipeline, and the
+writers drop their partial files. Closing the iteration before the end (as
+run_pipeline does when the writers fail) stops the source and the stages.
+
+A streaming brand script sets STREAMING = True and its three stages become:
+
+    fetch(session)     -> iterable of raw records
+    transform(record)  -> GeoJSON feature, or None to skip the record
+    write(features)    -> writes an iterable of features, returns their number
+
+run_pipeline runs them like common.metrics.run_instrumented: the metrics
+report has the time spent in fetch, transform and write (queue waits left
+out), and `backpressure` counts the records that waited for a full queue.
+"""
+import queue
+import threading
+import time
+
+from common.metrics import current, instrumented_run, propagate, stage
+
+QUEUE_DEPTH = 64
+# How often a blocked step checks that the pipeline was not stopped
+POLL_SECONDS = 0.1
+
+_END = object()
+
+class _Failure:
+    """An exception raised upstream, passed down the queues to the consumer."""
+
+    def __init__(self, exception):
+        self.exception = exception
+
+class _Stopped(Exception):
+    pass
+
+class Pipeline:
+    """Iterate over the features of source passed through stages, each step in its own thread."""
+
+    def __init__(self, source, *stages, depth=QUEUE_DEPTH):
+        self.source = source
+        self.stages = stages
+        self.depth = max(1, depth)
+        # Seconds the consumer spent waiting for the next feature
+        self.waiting = 0.0
+        self._stopped = threading.Event()
+
+    def _put(self, output, item):
+        if output.full():
+            metrics = current()
+            if metrics is not None:
+                metrics.count('backpressure')
+        while not self._stopped.is_set():
+            try:
+                output.put(item, timeout=POLL_SECONDS)
+                return
+            except queue.Full:
+                pass
+        raise _Stopped()
+
+    def _get(self, input):
+        while not self._stopped.is_set():
+            try:
+                return input.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                pass
+        raise _Stopped()
+
+    def _fail(self, output, exception):
+        try:
+            self._put(output, _Failure(exception))
+        except _Stopped:
+            pass
+
+    def _produce(self, output):
+        try:
+            records = iter(self.source)
+            while True:
+                with stage('fetch'):
+                    record = next(records, _END)
+                if record is _END:
+                    break
+                self._put(output, record)
+            self._put(output, _END)
+        except _Stopped:
+            pass
+        except BaseException as e:
+            self._fail(output, e)
+
+    def _transform(self, function, input, output):
+        try:
+            while True:
+                item = self._get(input)
+                if item is _END or isinstance(item, _Failure):
+                    self._put(output, item)
+                    return
+                with stage('transform'):
+                    result = function(item)
+                if result is not None:
+                    self._put(output, result)
+        except _Stopped:
+            pass
+        except BaseException as e:
+            self._fail(output, e)
+
+    def __iter__(self):
+        queues = [queue.Queue(self.depth) for _ in range(len(self.stages) + 1)]
+        threads = [threading.Thread(target=propagate(self._produce), args=(queues[0],), daemon=True)]
+        for function, input, output in zip(self.stages, queues, queues[1:]):
+            threads.append(threading.Thread(target=propagate(self._transform), args=(function, input, output), daemon=True))
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                start = time.perf_counter()
+                item = queues[-1].get()
+                self.waiting += time.perf_counter() - start
+                if item is _END:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.exception
+                yield item
+        finally:
+            self._stopped.set()
+            for thread in threads:
+                thread.join()
+
+def run_pipeline(report_file, session, fetch, transform, write, name=None, depth=QUEUE_DEPTH):
+    """
+    Run the stages of a streaming scraper through a Pipeline, write the
+    metrics of the run to report_file (unless None) and return them.
+    """
+    def records():
+        yield from fetch(session)
+
+    with instrumented_run(report_file, session, name) as metrics:
+        # The steps overlap: they are profiled as one stage
+        with metrics.run_stage('pipeline'):
+            pipeline = Pipeline(records(), transform, depth=depth)
+            features = iter(pipeline)
+            start = time.perf_counter()
+            try:
+                count = write(features)
+            finally:
+                # Stop the threads if write failed before the end
+                features.close()
+            metrics.add_time('write', time.perf_counter() - start - pipeline.waiting)
+        metrics.stop(count)
+    return metrics
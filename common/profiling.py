@@ -0,0 +1,111 @@
+"""
+Opt-in CPU and memory profiling of the stages of a scraper run.
+
+With SCRAPER_PROFILE=1 (or `python -m common.runner --profile`), every run
+profiles its fetch, transform and write stages and writes next to its
+metrics report:
+
+    <brand>.<stage>.prof    cProfile stats, read with `python -m pstats`
+    <brand>.memory.txt      top allocations of each stage, from tracemalloc
+
+Work done in worker threads (Marie Blachère bakery pages, Action pages,
+Stokomani website checks) is profiled by the threads started through
+common.metrics.propagate and merged into the stats of the stage. Profiling
+slows the run down: the timings of the metrics report are not comparable
+with an unprofiled run. The profilers are only imported when enabled.
+"""
+import contextlib
+import os
+import threading
+
+PROFILE_ENV = 'SCRAPER_PROFILE'
+TOP = 20
+
+def profiling_enabled():
+    return os.environ.get(PROFILE_ENV, '') not in ('', '0')
+
+class RunProfiler:
+
+    def __init__(self, top=TOP):
+        self.top = top
+        self.stats = {}
+        self.memory = {}
+        self._stage = None
+        self._lock = threading.Lock()
+
+    def _add(self, stage, profile):
+        import pstats
+
+        with self._lock:
+            if stage in self.stats:
+                self.stats[stage].add(profile)
+            else:
+                self.stats[stage] = pstats.Stats(profile)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Profile a stage of the run, and the allocations made during it by every thread."""
+        import cProfile
+        import pstats
+        import tracemalloc
+
+        # Allocations of the profilers themselves are left out of the memory report
+        ignored = [tracemalloc.Filter(False, module.__file__) for module in (cProfile, pstats, tracemalloc)]
+        ignored.append(tracemalloc.Filter(False, __file__))
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        before = tracemalloc.take_snapshot().filter_traces(ignored)
+        self._stage = name
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            self._stage = None
+            self._add(name, profile)
+            after = tracemalloc.take_snapshot().filter_traces(ignored)
+            self.memory[name] = after.compare_to(before, 'lineno')[:self.top]
+            if started:
+                tracemalloc.stop()
+
+    def wrap(self, func):
+        """Wrap func to profile it in a worker thread, within the current stage."""
+        stage = self._stage
+        if stage is None:
+            return func
+
+        import cProfile
+
+        def run_profiled(*args, **kwargs):
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Python 3.12+: the profiler of the stage already sees every thread
+                return func(*args, **kwargs)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+                self._add(stage, profile)
+        return run_profiled
+
+    def write(self, prefix):
+        """Write <prefix>.<stage>.prof for every stage and <prefix>.memory.txt, return the file names."""
+        files = []
+        for stage, stats in self.stats.items():
+            path = f'{prefix}.{stage}.prof'
+            stats.dump_stats(path)
+            files.append(path)
+
+        path = f'{prefix}.memory.txt'
+        with open(path, 'w', encoding='utf-8') as file:
+            for stage, top in self.memory.items():
+                total = sum(stat.size_diff for stat in top)
+                file.write(f'{stage}: {total / 1024:+.1f} KiB in the top {len(top)} lines\n')
+                for stat in top:
+                    file.write(f'    {stat}\n')
+        files.append(path)
+        return files
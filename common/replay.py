@@ -0,0 +1,115 @@
+"""
+Record and replay HTTP exchanges to run scrapers without network.
+
+In record mode every request/response a scraper makes is saved in a fixture
+archive (one JSON file per exchange). In replay mode the same requests are
+served from the archive by an in-process transport, with an optional
+artificial latency per request, so whole pipelines can be benchmarked and
+profiled offline.
+
+Both modes are enabled through environment variables read by create_session:
+
+    SCRAPER_HTTP_MODE=record|replay
+    SCRAPER_FIXTURES=path/to/archive        (default: .http_fixtures)
+    SCRAPER_REPLAY_LATENCY=0.05             (seconds, default: 0)
+"""
+import base64
+import hashlib
+import io
+import json
+import os
+import time
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from common.http_cache import SKIPPED_HEADERS, write_atomic
+
+FIXTURES_DIR = '.http_fixtures'
+
+def exchange_key(method, url, body=None):
+    digest = hashlib.sha256(f'{method.upper()} {url}\n'.encode('utf-8'))
+    if body:
+        digest.update(body if isinstance(body, bytes) else body.encode('utf-8'))
+    return digest.hexdigest()
+
+def fixture_path(fixtures_dir, request):
+    return os.path.join(fixtures_dir, exchange_key(request.method, request.url, request.body) + '.json')
+
+class RecordingAdapter(HTTPAdapter):
+    """Transport sending requests to the network and saving every exchange."""
+
+    def __init__(self, fixtures_dir=FIXTURES_DIR, **kwargs):
+        super().__init__(**kwargs)
+        self.fixtures_dir = fixtures_dir
+        os.makedirs(fixtures_dir, exist_ok=True)
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        if kwargs.get('stream'):
+            return response
+        exchange = {
+            'method': request.method,
+            'url': request.url,
+            'status': response.status_code,
+            'reason': response.reason,
+            'headers': {k: v for k, v in response.headers.items() if k.lower() not in SKIPPED_HEADERS},
+            'body': base64.b64encode(response.content).decode('ascii'),
+        }
+        write_atomic(fixture_path(self.fixtures_dir, request), json.dumps(exchange, indent=2).encode('utf-8'))
+        return response
+
+class ReplayAdapter(BaseAdapter):
+    """Transport answering requests from a fixture archive, without network."""
+
+    def __init__(self, fixtures_dir=FIXTURES_DIR, latency=0.0):
+        super().__init__()
+        self.fixtures_dir = fixtures_dir
+        self.latency = latency
+
+    def send(self, request, **kwargs):
+        path = fixture_path(self.fixtures_dir, request)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                exchange = json.load(f)
+        except FileNotFoundError:
+            raise requests.ConnectionError(f'No recorded response for {request.method} {request.url}', request=request)
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        body = base64.b64decode(exchange['body'])
+        response = requests.Response()
+        response.status_code = exchange['status']
+        response.reason = exchange.get('reason')
+        response.headers = CaseInsensitiveDict(exchange['headers'])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = io.BytesIO(body)
+        response._content = body
+        response._content_consumed = True
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        pass
+
+def http_mode():
+    return os.environ.get('SCRAPER_HTTP_MODE', '').lower()
+
+def mount_replay_adapters(session, pool_size):
+    """Mount the record or replay transport selected by SCRAPER_HTTP_MODE, if any."""
+    mode = http_mode()
+    fixtures_dir = os.environ.get('SCRAPER_FIXTURES', FIXTURES_DIR)
+    if mode == 'record':
+        adapter = RecordingAdapter(fixtures_dir, pool_maxsize=pool_size)
+    elif mode == 'replay':
+        adapter = ReplayAdapter(fixtures_dir, float(os.environ.get('SCRAPER_REPLAY_LATENCY', 0)))
+    elif mode:
+        raise ValueError(f'Unknown SCRAPER_HTTP_MODE: {mode}')
+    else:
+        return
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
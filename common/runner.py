@@ -0,0 +1,121 @@
+"""
+Run several brand scrapers concurrently in one process.
+
+Every brand script is a plugin exposing three stages:
+
+    fetch(session)     -> raw data (from the network or a local input file)
+    transform(data)    -> list of GeoJSON features
+    write(features)    -> GeoJSON, OSM, change-set and history files
+
+A script setting STREAMING = True streams its records through the three
+stages instead, see common.pipeline.
+The runner loads the scripts from their folders and runs the stages of each
+brand in its own thread, with one HTTP session for all of them: the
+connection pool, the HTTP cache and the memoized address and opening hours
+parsers are shared, and running every brand takes about as long as the
+slowest one instead of the sum. Each brand writes the metrics of its run
+to its REPORT_FILE, like when its script is run on its own. With --profile
+the brands are profiled (see common.profiling) and run one at a time, so
+their profiles do not mix.
+
+    python -m common.runner                      # every brand
+    python -m common.runner paul stokomani
+"""
+import argparse
+import importlib.util
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common.http_cache import create_session
+from common.metrics import run_instrumented
+from common.pipeline import run_pipeline
+from common.profiling import PROFILE_ENV
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BRANDS = {
+    'action': 'Action/action.py',
+    'bnm': 'B&M/bnm.py',
+    'feuillette': 'Feuillette/make_geojson.py',
+    'gifi': 'GiFi/gifi.py',
+    'marie-blachere': 'Marie-Blachere/marie_blachere.py',
+    'paul': 'Paul/paul.py',
+    'skaping': 'Skaping/skaping.py',
+    'stokomani': 'Stokomani/stokomani.py',
+}
+POOL_SIZE = 32
+
+def load_brand(name):
+    """Import a brand script from its folder, which is not a Python package."""
+    path = os.path.join(ROOT, BRANDS[name])
+    spec = importlib.util.spec_from_file_location(f"brands.{name.replace('-', '_')}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def run_brand(module, session):
+    """Run the fetch, transform and write stages of a brand, return the time taken."""
+    name = module.__name__.split('.')[-1]
+    run_stages = run_pipeline if getattr(module, 'STREAMING', False) else run_instrumented
+    metrics = run_stages(getattr(module, 'REPORT_FILE', None), session,
+                         module.fetch, module.transform, module.write, name=name)
+    return metrics.seconds
+
+def run(names, session, concurrency=None):
+    """Run the brands concurrently and return {name: seconds, or the exception raised}."""
+    results = {}
+    modules = {}
+    for name in names:
+        try:
+            modules[name] = load_brand(name)
+        except (Exception, SystemExit) as e:
+            results[name] = e
+
+    if modules:
+        with ThreadPoolExecutor(max_workers=concurrency or len(modules)) as executor:
+            futures = {name: executor.submit(run_brand, module, session) for name, module in modules.items()}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except (Exception, SystemExit) as e:
+                # A script calling exit() must not stop the other brands
+                results[name] = e
+    return {name: results[name] for name in names}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run brand scrapers concurrently.')
+    parser.add_argument('brands', nargs='*', metavar='brand',
+                        help=f"brands to run (default: all of {', '.join(BRANDS)})")
+    parser.add_argument('--concurrency', type=int,
+                        help='number of brands run at the same time (default: all)')
+    parser.add_argument('--pool-size', type=int, default=POOL_SIZE,
+                        help=f'connections kept alive per host (default: {POOL_SIZE})')
+    parser.add_argument('--profile', action='store_true',
+                        help='write cProfile and tracemalloc reports of every brand, running one brand at a time')
+    args = parser.parse_args(argv)
+    names = args.brands or list(BRANDS)
+    unknown = [name for name in names if name not in BRANDS]
+    if unknown:
+        parser.error(f"unknown brand: {', '.join(unknown)}")
+
+    concurrency = args.concurrency
+    if args.profile:
+        os.environ[PROFILE_ENV] = '1'
+        concurrency = 1
+
+    start = time.perf_counter()
+    results = run(names, create_session(args.pool_size), concurrency)
+
+    failed = 0
+    for name, result in results.items():
+        if isinstance(result, BaseException):
+            failed += 1
+            print(f'{name}: failed: {result!r}')
+        else:
+            print(f'{name}: {result:.1f}s')
+    print(f'{len(results) - failed} of {len(results)} brands done in {time.perf_counter() - start:.1f}s')
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+Columnar snapshot of a scraper output, next to its GeoJSON file.
+
+The snapshot has one column per OSM tag plus lon/lat float columns, and
+repeated strings (brand, wikidata, addr:city...) are dictionary-encoded.
+Analytics jobs can load, filter and join brands without parsing the
+pretty-printed GeoJSON; the Arrow IPC format can even be memory-mapped.
+
+Snapshots need pyarrow, which is optional, and are enabled through an
+environment variable read by snapshot_writers:
+
+    SCRAPER_SNAPSHOT=parquet|arrow
+"""
+import contextlib
+import os
+
+FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+def snapshot_format():
+    return os.environ.get('SCRAPER_SNAPSHOT', '').lower() or None
+
+def build_column(values):
+    """Build an Arrow array, dictionary-encoding strings that repeat."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    try:
+        array = pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        array = pa.array([None if value is None else str(value) for value in values])
+    # Counted on the array: the values may be lists or dicts, which are not hashable
+    if pa.types.is_string(array.type) and pc.count_distinct(array, mode='all').as_py() <= len(values) // 2:
+        array = array.dictionary_encode()
+    return array
+
+class SnapshotWriter:
+    """Collect features and write them as a columnar table on close."""
+    stage = 'snapshot'
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._coordinates = []
+        self._columns = {}
+        self._tmp_path = f'{path}.{os.getpid()}.tmp'
+
+    def write(self, feature):
+        geometry = feature.get('geometry') or {}
+        if geometry.get('type') == 'Point':
+            # Some sources give the coordinates as strings
+            self._coordinates.append(tuple(float(c) for c in geometry['coordinates'][:2]))
+        else:
+            self._coordinates.append((None, None))
+        for tag, value in feature['properties'].items():
+            column = self._columns.setdefault(tag, [None] * self.count)
+            column.append(value)
+        self.count += 1
+        for column in self._columns.values():
+            if len(column) < self.count:
+                column.append(None)
+
+    def close(self):
+        import pyarrow as pa
+
+        lon, lat = zip(*self._coordinates) if self._coordinates else ((), ())
+        arrays = {'lon': pa.array(lon, pa.float64()), 'lat': pa.array(lat, pa.float64())}
+        for tag in sorted(self._columns):
+            arrays[tag] = build_column(self._columns[tag])
+        table = pa.table(arrays)
+
+        try:
+            if self.path.endswith(FORMATS['parquet']):
+                import pyarrow.parquet as pq
+                pq.write_table(table, self._tmp_path)
+            else:
+                import pyarrow.feather as feather
+                feather.write_feather(table, self._tmp_path, compression='uncompressed')
+            os.replace(self._tmp_path, self.path)
+        except BaseException:
+            self._remove_tmp()
+            raise
+
+    def _remove_tmp(self):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self._tmp_path)
+
+    def abort(self):
+        self._coordinates = []
+        self._columns = {}
+        self._remove_tmp()
+
+def snapshot_writers(geojson_path):
+    """
+    Return the snapshot writer for geojson_path as a list to pass to
+    write_features, or an empty list when snapshots are disabled.
+    """
+    fmt = snapshot_format()
+    if fmt is None:
+        return []
+    if fmt not in FORMATS:
+        print(f"Unknown snapshot format {fmt!r}, expected one of: {', '.join(FORMATS)}")
+        return []
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        print('pyarrow is not installed, skipping the columnar snapshot')
+        return []
+    return [SnapshotWriter(os.path.splitext(geojson_path)[0] + FORMATS[fmt])]
+
+def load_snapshot(path):
+    """Load a snapshot as a pyarrow Table, memory-mapping Arrow IPC files."""
+    if path.endswith(FORMATS['parquet']):
+        import pyarrow.parquet as pq
+        return pq.read_table(path, memory_map=True)
+    import pyarrow.feather as feather
+    return feather.read_table(path, memory_map=True)
@@ -0,0 +1,64 @@
+"""
+Check that importing a scraper entry point is cheap and does no network I/O.
+
+Each entry point is imported in a fresh interpreter with sockets disabled.
+The time taken, the heavy dependencies loaded and any network access are
+reported: heavy dependencies must only be imported by the functions that use
+them, and nothing may be fetched before main() is called.
+
+    python -m common.startup
+"""
+import json
+import os
+import subprocess
+import sys
+
+from common.runner import BRANDS, ROOT
+
+ENTRY_POINTS = sorted([*BRANDS.values(), 'Action/old_action.py'])
+HEAVY_MODULES = {
+    'bs4', 'cProfile', 'fake_useragent', 'geojson', 'geojson2osm', 'lxml', 'matplotlib',
+    'pandas', 'pstats', 'pyarrow', 'selenium', 'tqdm', 'tracemalloc',
+}
+
+# Run in the child interpreter with the path of the entry point as argument
+CHILD = """
+import importlib.util, json, socket, sys, time
+
+attempts = []
+def refuse(*args, **kwargs):
+    attempts.append(repr(args[1:3]))
+    raise OSError('network access while importing')
+socket.socket.connect = refuse
+socket.getaddrinfo = refuse
+
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location('entry_point', sys.argv[1])
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+seconds = time.perf_counter() - start
+print(json.dumps({'seconds': seconds, 'modules': sorted(sys.modules), 'network': attempts}))
+"""
+
+def import_entry_point(path):
+    """Import an entry point in a new interpreter, return {'seconds', 'heavy', 'network'}."""
+    result = subprocess.run([sys.executable, '-c', CHILD, os.path.join(ROOT, path)],
+                            capture_output=True, text=True, cwd=ROOT)
+    if result.returncode != 0:
+        raise RuntimeError(f'importing {path} failed:\n{result.stderr}')
+    report = json.loads(result.stdout.splitlines()[-1])
+    loaded = {name.split('.')[0] for name in report['modules']}
+    return {'seconds': report['seconds'], 'heavy': sorted(loaded & HEAVY_MODULES), 'network': report['network']}
+
+def main():
+    failed = 0
+    for path in ENTRY_POINTS:
+        report = import_entry_point(path)
+        problems = [f'imports {name}' for name in report['heavy']]
+        problems += [f'connects to {address}' for address in report['network']]
+        failed += bool(problems)
+        print(f"{path:<36} {report['seconds'] * 1000:6.1f} ms  {', '.join(problems) or 'ok'}")
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
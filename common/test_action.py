@@ -0,0 +1,86 @@
+import asyncio
+import threading
+import time
+
+from common.checkpoint import CheckpointStore
+from common.runner import load_brand
+
+action = load_brand('action')
+
+PAGES = 12
+
+def shops(page):
+    return [{'id': f'{page}-{i}'} for i in range(3)] if page < PAGES else []
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+class FakeSession:
+    """StoreSearch API with PAGES pages of shops, answering the first pages last."""
+
+    def __init__(self):
+        self.requested = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def post(self, url, headers=None, json=None, verify=True):
+        page = json['variables']['input']['page']
+        with self._lock:
+            self.requested.append(page)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.002 * max(0, PAGES - page))
+        with self._lock:
+            self.in_flight -= 1
+        return FakeResponse({'data': {'storeSearchV2': shops(page)}})
+
+def expected_shops():
+    return [shop for page in range(PAGES) for shop in shops(page)]
+
+def test_pages_are_returned_in_order():
+    session = FakeSession()
+    assert asyncio.run(action.fetch_all_pages(4, session)) == expected_shops()
+    assert 1 < session.max_in_flight <= 4
+    # Pages are requested ahead of the first empty page, at most one batch
+    assert sorted(session.requested) == list(range(len(session.requested)))
+    assert PAGES < len(session.requested) <= PAGES + 4
+
+def test_sequential_crawl():
+    session = FakeSession()
+    assert asyncio.run(action.fetch_all_pages(1, session)) == expected_shops()
+    assert session.requested == list(range(PAGES + 1))
+
+def test_resume_does_not_fetch_pages_again(tmp_path):
+    path = str(tmp_path / 'action.checkpoint.sqlite')
+    with CheckpointStore(path) as store:
+        for page in range(5):
+            store.put(f'page:{page}', {'data': {'storeSearchV2': shops(page)}}, shops(page))
+
+    session = FakeSession()
+    with CheckpointStore(path, resume=True) as store:
+        assert asyncio.run(action.fetch_all_pages(4, session, store)) == expected_shops()
+        # The fetched pages are recorded for the next resume
+        assert store.get('page:7')['result'] == shops(7)
+    assert min(session.requested) == 5
+
+def test_coordinates_are_numbers():
+    shop = {
+        'id': 'E017', 'name': 'Penafiel', 'url': '/pt-pt/lojas/penafiel/',
+        'meta': {'initialOpeningDate': '2024-12-12T00:00:00'},
+        'address': {'street': 'Av. Central', 'houseNumber': '1110', 'houseNumberExtra': None,
+                    'postalCode': '4560-143', 'city': 'Penafiel', 'countryCode': 'PT'},
+        # As returned by the StoreSearch API
+        'geoLocation': {'long': '-8.310888888889', 'lat': '41.200471944444'},
+        'openingDays': [],
+    }
+    feature = action.process_shop(shop)
+    assert feature['geometry']['coordinates'] == [-8.310888888889, 41.200471944444]
+    assert feature['properties']['ref:FR:action:id'] == 'E017'
@@ -0,0 +1,29 @@
+from common.address import parse_address, split_housenumber, split_lines
+
+def test_default_dialect():
+    assert split_housenumber('12b, rue de la Paix') == ('12b', 'rue de la Paix')
+    assert split_housenumber('Centre commercial') == ('', 'Centre commercial')
+
+def test_number_range():
+    assert split_housenumber('112 à 114 avenue Henri Barbusse', 'marie') == ('112 à 114', 'avenue Henri Barbusse')
+    assert split_housenumber('112 avenue Henri Barbusse', 'marie') == ('', '')
+
+def test_street_line_before_place():
+    assert parse_address(('Centre Commercial CAP SUD', 'Rue de Paris'), 'bnm') == ('', 'Rue de Paris', 'Centre Commercial CAP SUD')
+    assert parse_address(('ZAC des Près', '4, rue Y'), 'gifi') == ('4', 'rue Y', 'ZAC des Près')
+    assert parse_address(('4, rue Y', '4 rue Y'), 'gifi') == ('4', 'rue Y', '')
+    # Only GiFi repeats the street: B&M keeps the second line as the place
+    assert parse_address(('4, rue Y', '4 rue Y'), 'bnm') == ('4', 'rue Y', '4 rue Y')
+
+def test_street_parts():
+    assert parse_address(split_lines('Zone du Moulin, route de Lyon'), 'stokomani') == ('', 'route de Lyon', 'Zone du Moulin')
+    assert parse_address(split_lines('Zone du Moulin, 3 route de Lyon'), 'stokomani') == ('3', 'route de Lyon', '')
+    assert parse_address(split_lines('Zone du Moulin\nLieu-dit Y'), 'stokomani') == ('', 'Lieu-dit Y', '')
+    assert parse_address(split_lines(''), 'stokomani') == ('', '', '')
+
+if __name__ == "__main__":
+    test_default_dialect()
+    test_number_range()
+    test_street_line_before_place()
+    test_street_parts()
+    print("All tests passed!")
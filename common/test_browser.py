@@ -0,0 +1,127 @@
+import importlib.util
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from common.browser import BrowserPool, ClearanceSession, HarvestError
+from common.runner import ROOT
+
+class FakeDriver:
+    started = 0
+
+    def __init__(self):
+        FakeDriver.started += 1
+        self.token = f'token-{FakeDriver.started}'
+        self.current_url = None
+
+    def get(self, url):
+        time.sleep(0.01)
+        self.current_url = url
+
+    def execute_script(self, script):
+        return 'complete' if 'readyState' in script else 'Mozilla/5.0 (Fake)'
+
+    def get_cookies(self):
+        return [{'name': 'clearance', 'value': self.token, 'domain': 'example.com', 'path': '/'}]
+
+    def quit(self):
+        pass
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+class FakeSession:
+    """Answer 403 until the request carries the current clearance cookie."""
+
+    def __init__(self):
+        self.cookies = requests.cookies.RequestsCookieJar()
+        self.headers = {}
+        self.valid = None
+
+    def get(self, url, **kwargs):
+        if self.cookies.get('clearance') == self.valid and self.headers.get('User-Agent'):
+            return FakeResponse(200)
+        return FakeResponse(403)
+
+def test_pool_is_bounded():
+    FakeDriver.started = 0
+    pool = BrowserPool(2, FakeDriver)
+    in_use = []
+    lock = threading.Lock()
+
+    def use(_):
+        with pool.browser() as driver:
+            with lock:
+                in_use.append(driver)
+            time.sleep(0.01)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(use, range(16)))
+    assert FakeDriver.started == 2
+    assert len(set(map(id, in_use))) == 2
+    pool.close()
+
+def test_cookies_are_handed_off_once():
+    FakeDriver.started = 0
+    session = FakeSession()
+    session.valid = 'token-1'
+    with BrowserPool(1, FakeDriver) as pool:
+        client = ClearanceSession(pool, 'https://example.com', session)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            statuses = list(executor.map(lambda i: client.get(f'https://example.com/{i}').status_code, range(50)))
+    assert statuses == [200] * 50
+    assert client.harvests == 1
+    assert session.headers['User-Agent'] == 'Mozilla/5.0 (Fake)'
+
+def test_clearance_session_uses_one_browser():
+    FakeDriver.started = 0
+    session = FakeSession()
+    session.valid = 'token-1'
+    # The cookies are harvested one at a time: a bigger pool starts no other browser
+    with BrowserPool(4, FakeDriver) as pool:
+        client = ClearanceSession(pool, 'https://example.com', session)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda i: client.get(f'https://example.com/{i}'), range(50)))
+    assert FakeDriver.started == 1
+
+def test_blocked_session_is_refreshed():
+    FakeDriver.started = 0
+    session = FakeSession()
+    session.valid = 'token-1'
+    with BrowserPool(1, FakeDriver) as pool:
+        client = ClearanceSession(pool, 'https://example.com', session)
+        assert client.get('https://example.com/a').status_code == 200
+
+        # The clearance expired: the same browser harvests a new cookie
+        with pool.browser() as driver:
+            driver.token = session.valid = 'token-renewed'
+        assert client.get('https://example.com/b').status_code == 200
+        assert client.harvests == 2
+
+        # Still blocked after the refreshes: the last response is returned
+        session.valid = 'never'
+        assert client.get('https://example.com/c').status_code == 403
+    assert FakeDriver.started == 1
+
+class HangingDriver(FakeDriver):
+    def execute_script(self, script):
+        raise TimeoutError('page not loaded')
+
+def load_old_action():
+    spec = importlib.util.spec_from_file_location('old_action', os.path.join(ROOT, 'Action', 'old_action.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def test_failed_harvest_skips_the_shop(capsys):
+    with BrowserPool(1, HangingDriver) as pool:
+        client = ClearanceSession(pool, 'https://example.com', FakeSession())
+        with pytest.raises(HarvestError):
+            client.get('https://example.com/a')
+        assert load_old_action().process_shop({'id': '42'}, client) is None
+    assert 'Failed to download data for shop 42' in capsys.readouterr().out
@@ -0,0 +1,78 @@
+import os
+
+from common.changeset import ChangesetWriter, diff_features, distance, write_changeset
+from common.geojson_writer import FeatureCollectionWriter, write_features
+
+def feature(ref, coordinates=(2.35, 48.85), **tags):
+    return {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': list(coordinates)},
+            'properties': {'ref': ref, **tags}}
+
+def test_distance():
+    assert round(distance([2.35, 48.85], [2.35, 48.86])) == 1112
+
+def test_string_coordinates():
+    # Outputs written before the coordinates were cast to float have strings
+    assert round(distance(['2.35', '48.85'], [2.35, 48.86])) == 1112
+    _, _, changed = diff_features([feature('a', ('2.35', '48.85'))], [feature('a', (2.35, 48.85))], 'ref')
+    assert changed == []
+
+def test_added_and_removed():
+    added, removed, changed = diff_features([feature('a'), feature('b')], [feature('b'), feature('c'), feature(None)], 'ref')
+    assert [f['properties']['ref'] for f in added] == ['c', None]
+    assert [f['properties']['ref'] for f in removed] == ['a']
+    assert changed == []
+
+def test_tag_changes():
+    old = [feature('a', name='Agen', phone='+33 1')]
+    new = [feature('a', name='Agen', website='https://example.com')]
+    _, _, changed = diff_features(old, new, 'ref')
+    assert changed[0]['changes'] == {'tags': {'phone': ['+33 1', None], 'website': [None, 'https://example.com']}}
+
+def test_opening_hours_compared_as_schedules():
+    old = [feature('a', opening_hours='Mo 09:00-19:00; Tu 09:00-19:00'), feature('b', opening_hours='Mo-Sa 09:00-19:00')]
+    new = [feature('a', opening_hours='Mo-Tu 09:00-19:00'), feature('b', opening_hours='Mo-Sa 09:00-20:00')]
+    _, _, changed = diff_features(old, new, 'ref')
+    assert changed == [{**new[1], 'changes': {'tags': {'opening_hours': ['Mo-Sa 09:00-19:00', 'Mo-Sa 09:00-20:00']}}}]
+
+def test_moved_above_threshold():
+    old = [feature('a'), feature('b')]
+    new = [feature('a', (2.3501, 48.85)), feature('b', (2.36, 48.85))]
+    _, _, changed = diff_features(old, new, 'ref', move_threshold=50)
+    assert [f['properties']['ref'] for f in changed] == ['b']
+    assert changed[0]['changes'] == {'moved': 731.7}
+
+def test_writer_matches_write_changeset(tmp_path):
+    old = [feature('a'), feature('b', name='Agen')]
+    new = [feature('b', name='Albi'), feature('c')]
+    write_changeset(str(tmp_path / 'lists'), old, new, 'ref')
+    writer = ChangesetWriter(str(tmp_path / 'stream'), old, 'ref')
+    write_features(iter(new), writer)
+
+    assert writer.removed == 1
+    for suffix in ('added.geojson', 'removed.geojson', 'changed.geojson'):
+        assert (tmp_path / f'stream.{suffix}').read_text() == (tmp_path / f'lists.{suffix}').read_text()
+    assert os.path.exists(tmp_path / 'stream.delta.osm')
+
+def test_failed_changeset_keeps_the_previous_output(tmp_path):
+    path = tmp_path / 'shops.geojson'
+    path.write_text('previous')
+    # The removed features cannot be moved in place, so the change-set fails on close
+    (tmp_path / 'shops.removed.geojson').mkdir()
+    try:
+        write_features([feature('a')], ChangesetWriter(str(tmp_path / 'shops'), [feature('b')], 'ref'),
+                       FeatureCollectionWriter(str(path)))
+    except OSError:
+        pass
+    else:
+        raise AssertionError('the change-set should have failed')
+    assert path.read_text() == 'previous'
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['shops.geojson', 'shops.removed.geojson']
+
+if __name__ == "__main__":
+    test_distance()
+    test_string_coordinates()
+    test_added_and_removed()
+    test_tag_changes()
+    test_opening_hours_compared_as_schedules()
+    test_moved_above_threshold()
+    print("All tests passed!")
@@ -0,0 +1,19 @@
+import datetime
+import os
+
+from common.charts import is_stale, read_history
+
+def test_read_history(tmp_path):
+    path = tmp_path / 'count_history.csv'
+    path.write_text('2024-12-13,815\n2025-05-01,826\n')
+    assert read_history(str(path)) == ([datetime.date(2024, 12, 13), datetime.date(2025, 5, 1)], [815, 826])
+
+def test_is_stale(tmp_path):
+    history, graphic = tmp_path / 'count_history.csv', tmp_path / 'count_history.png'
+    history.write_text('2024-12-13,815\n')
+    assert is_stale(str(history), str(graphic))
+    graphic.write_bytes(b'')
+    os.utime(history, (1000, 1000))
+    assert not is_stale(str(history), str(graphic))
+    os.utime(history, (os.path.getmtime(graphic) + 1,) * 2)
+    assert is_stale(str(history), str(graphic))
@@ -0,0 +1,37 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from common.checkpoint import CheckpointStore, remove_checkpoint
+
+def test_put_get(tmp_path):
+    with CheckpointStore(str(tmp_path / 'run.sqlite')) as store:
+        assert store.get('page:0') is None
+        store.put('page:0', {'data': [1, 2]}, [{'name': 'Agen'}])
+        assert store.get('page:0') == {'payload': {'data': [1, 2]}, 'result': [{'name': 'Agen'}]}
+        assert len(store) == 1
+
+def test_resume_keeps_completed_units(tmp_path):
+    path = str(tmp_path / 'run.sqlite')
+    with CheckpointStore(path) as store:
+        store.put('a', None, 1)
+    with CheckpointStore(path, resume=True) as store:
+        assert store.get('a')['result'] == 1
+    with CheckpointStore(path) as store:
+        assert len(store) == 0
+
+def test_concurrent_writers(tmp_path):
+    with CheckpointStore(str(tmp_path / 'run.sqlite')) as store:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda i: store.put(f'unit:{i}', i, i * 2), range(200)))
+        assert len(store) == 200
+        assert store.get('unit:199')['result'] == 398
+
+def test_remove_checkpoint(tmp_path):
+    path = str(tmp_path / 'run.sqlite')
+    with CheckpointStore(path) as store:
+        store.put('a', None, 1)
+    remove_checkpoint(path)
+    assert list(tmp_path.iterdir()) == []
+    # Removing it again, or a store never created, is not an error
+    remove_checkpoint(path)
+    with CheckpointStore(path, resume=True) as store:
+        assert len(store) == 0
@@ -0,0 +1,65 @@
+import os
+import tempfile
+
+from common.conflate import conflate, load_osm_nodes, match_features
+
+def feature(ref, lon, lat, **tags):
+    return {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [lon, lat]},
+            'properties': {'ref': ref, 'name': 'Marie Blachère', **tags}}
+
+def node(id, lon, lat, **tags):
+    return {'id': id, 'lon': lon, 'lat': lat, 'tags': tags}
+
+def test_nearest_within_radius():
+    features = [feature('a', 2.35, 48.85)]
+    nodes = [node(1, 2.3520, 48.85), node(2, 2.3505, 48.85), node(3, 2.36, 48.85)]
+    assert match_features(features, nodes, 'ref', radius=100) == {0: 1}
+    assert match_features(features, nodes[2:], 'ref', radius=100) == {}
+
+def test_ref_and_name_tie_breaks():
+    features = [feature('a', 2.35, 48.85)]
+    # Same ref wins even far away, then same name wins over distance
+    assert match_features(features, [node(1, 2.3501, 48.85), node(2, 2.5, 48.9, ref='a')], 'ref') == {0: 1}
+    assert match_features(features, [node(1, 2.3501, 48.85), node(2, 2.3505, 48.85, name='marie blachère')], 'ref') == {0: 1}
+    # A node with another ref belongs to another store
+    assert match_features(features, [node(1, 2.3501, 48.85, ref='b')], 'ref') == {}
+
+def test_each_node_matched_once():
+    features = [feature('a', 2.35, 48.85), feature('b', 2.3502, 48.85)]
+    assert match_features(features, [node(1, 2.3502, 48.85)], 'ref') == {1: 0}
+
+def test_tasks():
+    features = [feature('a', 2.35, 48.85, phone='+33 1', fixme='check'), feature('b', 0.62, 44.2)]
+    nodes = [node(10, 2.3501, 48.85, name='Marie Blachère')]
+    tasks = list(conflate(features, nodes, match_features(features, nodes, 'ref')))
+    assert tasks[0]['cooperativeWork']['operations'][0]['data'] == {
+        'id': 'node/10', 'operations': [{'operation': 'setTags', 'data': {'ref': 'a', 'phone': '+33 1'}}]}
+    assert tasks[1]['cooperativeWork']['meta'] == {'version': 2, 'type': 2}
+    assert tasks[1]['features'][0]['properties']['@id'] == 'node/-1'
+
+def test_load_osm_nodes():
+    # A temporary directory rather than tmp_path, so the test also runs from __main__
+    with tempfile.TemporaryDirectory() as directory:
+        extract = os.path.join(directory, 'extract.osm')
+        with open(extract, 'w', encoding='utf-8') as file:
+            file.write(
+                '<osm version="0.6">'
+                '<node id="1" lat="48.85" lon="2.35"><tag k="brand:wikidata" v="Q1"/></node>'
+                '<node id="2" lat="48.86" lon="2.36"><tag k="brand:wikidata" v="Q2"/></node>'
+                '<node id="3" lat="48.87" lon="2.37"><tag k="ref" v="7"/></node>'
+                '<node id="4" lat="48.88" lon="2.38"/>'
+                '<way id="5"><nd ref="1"/><tag k="brand:wikidata" v="Q1"/></way>'
+                '</osm>')
+        nodes = load_osm_nodes(extract, {'brand:wikidata': {'Q1'}}, 'ref')
+    assert nodes == [
+        {'id': 1, 'lon': 2.35, 'lat': 48.85, 'tags': {'brand:wikidata': 'Q1'}},
+        {'id': 3, 'lon': 2.37, 'lat': 48.87, 'tags': {'ref': '7'}},
+    ]
+
+if __name__ == "__main__":
+    test_nearest_within_radius()
+    test_ref_and_name_tie_breaks()
+    test_each_node_matched_once()
+    test_tasks()
+    test_load_osm_nodes()
+    print("All tests passed!")
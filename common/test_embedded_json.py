@@ -0,0 +1,33 @@
+import json
+
+from common.embedded_json import find_script, iter_scripts
+
+PAGE = b"""<!DOCTYPE html>
+<html><head>
+<script src="/app.js"></script>
+<script type='application/ld+json'>[{"name": "Agen"}]</script>
+<SCRIPT type="text/x-magento-init">{"a": 1}</SCRIPT >
+</head><body>
+<script id="__NEXT_DATA__" type="application/json">{"props": {"pageProps": {"allPois": []}}}</script>
+<script type="text/x-magento-init">{"markers": ["<b>x</b>"]}</script>
+</body></html>"""
+
+def test_find_by_id():
+    assert json.loads(find_script(PAGE, id='__NEXT_DATA__')) == {'props': {'pageProps': {'allPois': []}}}
+
+def test_find_by_type():
+    assert json.loads(find_script(PAGE, type='application/ld+json')) == [{'name': 'Agen'}]
+
+def test_iter_in_document_order():
+    assert list(iter_scripts(PAGE, type='text/x-magento-init')) == [b'{"a": 1}', b'{"markers": ["<b>x</b>"]}']
+
+def test_missing_script():
+    assert find_script(PAGE, id='missing') is None
+    assert find_script('<script id="__NEXT_DATA__">', id='__NEXT_DATA__') is None
+
+if __name__ == "__main__":
+    test_find_by_id()
+    test_find_by_type()
+    test_iter_in_document_order()
+    test_missing_script()
+    print("All tests passed!")
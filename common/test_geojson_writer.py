@@ -0,0 +1,109 @@
+import json
+
+import pytest
+
+from common.geojson_writer import FeatureCollectionWriter, write_feature_collection, write_features
+from common.osm_writer import OsmWriter
+
+FEATURES = [
+    {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [2.3522219, 48.856614]},
+     'properties': {'name': 'Marie Blachère', 'opening_hours': 'Mo-Sa 07:00-20:00', 'note': 'rue de l\'Église "A"'}},
+    {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [-1.5683251612, 48.903785811]},
+     'properties': {'name': 'Bréhal', 'ref': 12, 'tags': ['a', 'b'], 'empty': None}},
+]
+
+def collection(features):
+    return {'type': 'FeatureCollection', 'features': features}
+
+@pytest.mark.parametrize('indent', [2, 4])
+@pytest.mark.parametrize('features', [FEATURES, []])
+def test_same_bytes_as_json_dump(tmp_path, indent, features):
+    path = tmp_path / 'shops.geojson'
+    write_feature_collection(str(path), features, indent=indent)
+    expected = tmp_path / 'expected.geojson'
+    with open(expected, 'w', encoding='utf-8') as f:
+        json.dump(collection(features), f, indent=indent, ensure_ascii=False)
+    assert path.read_bytes() == expected.read_bytes()
+
+def test_ensure_ascii(tmp_path):
+    path = tmp_path / 'shops.geojson'
+    write_feature_collection(str(path), FEATURES, ensure_ascii=True)
+    assert path.read_text(encoding='ascii') == json.dumps(collection(FEATURES), indent=2)
+
+def test_compact_mode(tmp_path):
+    path = tmp_path / 'shops.geojson'
+    write_feature_collection(str(path), FEATURES, indent=None)
+    assert path.read_text(encoding='utf-8') == json.dumps(collection(FEATURES), separators=(',', ':'), ensure_ascii=False)
+
+def test_coordinate_precision(tmp_path):
+    path = tmp_path / 'shops.geojson'
+    assert write_feature_collection(str(path), FEATURES, precision=5) == 2
+    written = json.loads(path.read_text(encoding='utf-8'))['features']
+    assert [f['geometry']['coordinates'] for f in written] == [[2.35222, 48.85661], [-1.56833, 48.90379]]
+    # The features passed in are not modified
+    assert FEATURES[0]['geometry']['coordinates'] == [2.3522219, 48.856614]
+
+class BrokenWriter:
+    def __init__(self, path):
+        raise OSError(f'cannot open {path}')
+
+def test_failed_writer_leaves_previous_outputs(tmp_path):
+    path = tmp_path / 'shops.geojson'
+    path.write_text('previous')
+
+    def features():
+        yield FEATURES[0]
+        raise ValueError('fetch failed')
+
+    with pytest.raises(ValueError):
+        write_features(features(), FeatureCollectionWriter(str(path)), OsmWriter(str(tmp_path / 'shops.osm')))
+    assert path.read_text() == 'previous'
+    assert [p.name for p in tmp_path.iterdir()] == ['shops.geojson']
+
+    # A writer failing to open after the others were created leaves no temporary file
+    with pytest.raises(OSError):
+        write_features(FEATURES, FeatureCollectionWriter(str(path)), BrokenWriter(str(tmp_path / 'shops.osm')))
+    assert [p.name for p in tmp_path.iterdir()] == ['shops.geojson']
+
+    with pytest.raises(OSError):
+        write_features(FEATURES, FeatureCollectionWriter(str(path)), OsmWriter(str(tmp_path / 'missing' / 'shops.osm')))
+    assert [p.name for p in tmp_path.iterdir()] == ['shops.geojson']
+
+class FailingClose:
+    def write(self, feature):
+        pass
+
+    def close(self):
+        raise OSError('disk full')
+
+    def abort(self):
+        pass
+
+def test_failed_close_drops_the_writers_not_closed(tmp_path):
+    with pytest.raises(OSError):
+        write_features(FEATURES, FeatureCollectionWriter(str(tmp_path / 'first.geojson')), FailingClose(),
+                       FeatureCollectionWriter(str(tmp_path / 'last.geojson')))
+    assert [p.name for p in tmp_path.iterdir()] == ['first.geojson']
+
+def test_failed_replace_leaves_no_temporary_file(tmp_path):
+    # The destination is a directory, so moving the GeoJSON file in place fails
+    (tmp_path / 'shops.geojson').mkdir()
+    with pytest.raises(OSError):
+        write_features(FEATURES, FeatureCollectionWriter(str(tmp_path / 'shops.geojson')),
+                       OsmWriter(str(tmp_path / 'shops.osm')))
+    assert [p.name for p in tmp_path.iterdir()] == ['shops.geojson']
+
+    (tmp_path / 'only.osm').mkdir()
+    with pytest.raises(OSError):
+        write_features(FEATURES, OsmWriter(str(tmp_path / 'only.osm')))
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['only.osm', 'shops.geojson']
+
+def test_failed_close_in_a_with_block_leaves_no_temporary_file(tmp_path):
+    (tmp_path / 'shops.geojson').mkdir()
+    with pytest.raises(OSError):
+        write_feature_collection(str(tmp_path / 'shops.geojson'), FEATURES)
+    (tmp_path / 'shops.osm').mkdir()
+    with pytest.raises(OSError):
+        with OsmWriter(str(tmp_path / 'shops.osm')) as writer:
+            writer.write(FEATURES[0])
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['shops.geojson', 'shops.osm']
@@ -0,0 +1,53 @@
+import pytest
+
+from common.geojson_writer import write_features
+from common.history import HistoryStore, HistoryWriter, record_features
+
+def feature(ref, **tags):
+    return {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [2.35, 48.85]},
+            'properties': {'ref': ref, **tags}}
+
+def test_runs(tmp_path):
+    with HistoryStore(str(tmp_path / 'history.sqlite')) as store:
+        assert store.record_run('B', '2025-01-01', [feature('a'), feature('b')], 'ref') == (2, 0, 0)
+        assert store.record_run('B', '2025-02-01', [feature('a', phone='+33 1'), feature('c')], 'ref') == (1, 1, 1)
+        # b closed in February and reopened in March
+        assert store.record_run('B', '2025-03-01', [feature('a', phone='+33 1'), feature('b'), feature('c')], 'ref') == (1, 0, 0)
+
+        assert store.counts('B') == [('2025-01-01', 2), ('2025-02-01', 2), ('2025-03-01', 3)]
+        assert store.churn('B') == [('2025-01-01', 2, 0, 0), ('2025-02-01', 1, 1, 1), ('2025-03-01', 1, 0, 0)]
+        assert store.monthly('B') == [('2025-02', 1, 1), ('2025-03', 1, 0)]
+
+def test_seed_counts_from_csv(tmp_path):
+    counts_csv = tmp_path / 'count_history.csv'
+    counts_csv.write_text('2024-12-13,815\n2025-01-01,820\n')
+    path = str(tmp_path / 'history.sqlite')
+    record_features(path, 'B', '2025-02-01', [feature('a')], 'ref', str(counts_csv))
+    record_features(path, 'B', '2025-03-01', [feature('a')], 'ref', str(counts_csv))
+    with HistoryStore(path) as store:
+        assert store.counts('B') == [('2024-12-13', 815), ('2025-01-01', 820), ('2025-02-01', 1), ('2025-03-01', 1)]
+
+def test_failed_run_is_not_recorded(tmp_path):
+    path = str(tmp_path / 'history.sqlite')
+    record_features(path, 'B', '2025-01-01', [feature('a')], 'ref')
+
+    def features():
+        yield feature('b')
+        raise ValueError('fetch failed')
+
+    with pytest.raises(ValueError):
+        write_features(features(), HistoryWriter(path, 'B', '2025-02-01', 'ref'))
+    with HistoryStore(path) as store:
+        assert store.counts('B') == [('2025-01-01', 1)]
+        assert store.churn('B') == [('2025-01-01', 1, 0, 0)]
+
+def test_repeated_ref_is_one_store(tmp_path):
+    path = str(tmp_path / 'history.sqlite')
+    assert record_features(path, 'B', '2025-01-01', [feature('a', name='Agen'), feature('a', name='Agen')], 'ref') == (1, 0, 0)
+    # The last feature of a ref is compared with the previous run, not with the first one of the run
+    run = [feature('a', name='Albi'), feature('a', name='Agen'), feature('b'), feature('b')]
+    assert record_features(path, 'B', '2025-02-01', run, 'ref') == (1, 0, 0)
+    with HistoryStore(path) as store:
+        assert store.record_run('B', '2025-03-01', [feature('a', name='Albi'), feature('a', name='Auch')], 'ref') == (0, 1, 1)
+        assert store.churn('B') == [('2025-01-01', 1, 0, 0), ('2025-02-01', 1, 0, 0), ('2025-03-01', 0, 1, 1)]
+        assert store.counts('B') == [('2025-01-01', 2), ('2025-02-01', 4), ('2025-03-01', 2)]
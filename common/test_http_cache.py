@@ -0,0 +1,116 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+from common.http_cache import CachedSession, cache_key
+
+LAST_MODIFIED = 'Wed, 01 Jan 2025 00:00:00 GMT'
+
+class FakeServer(HTTPAdapter):
+    """Serve {url: body} with an ETag per body, answering 304 to a matching If-None-Match."""
+
+    def __init__(self, pages):
+        super().__init__()
+        self.pages = pages
+        self.sent = []
+
+    def send(self, request, **kwargs):
+        self.sent.append((request, kwargs))
+        body = self.pages[request.url]
+        etag = f'"{len(body)}-{hash(body)}"'
+        response = requests.Response()
+        response.url = request.url
+        response.request = request
+        response.headers['ETag'] = etag
+        response.headers['Last-Modified'] = LAST_MODIFIED
+        if request.headers.get('If-None-Match') == etag:
+            response.status_code = 304
+            response._content = b''
+        else:
+            response.status_code = 200
+            response._content = body
+        return response
+
+def make_session(tmp_path, server, max_bytes=1024):
+    session = CachedSession(cache_dir=str(tmp_path), max_bytes=max_bytes)
+    session.mount('http://test/', server)
+    return session
+
+def test_conditional_get_replays_304(tmp_path):
+    server = FakeServer({'http://test/a': b'A' * 100})
+    session = make_session(tmp_path, server)
+    first = session.get('http://test/a')
+    assert first.status_code == 200 and 'If-None-Match' not in server.sent[0][0].headers
+
+    second = session.get('http://test/a')
+    request = server.sent[1][0]
+    assert request.headers['If-None-Match'] == first.headers['ETag']
+    assert request.headers['If-Modified-Since'] == LAST_MODIFIED
+    assert second.status_code == 200
+    assert second.content == b'A' * 100
+    assert second.from_cache
+
+def test_changed_page_is_stored_again(tmp_path):
+    server = FakeServer({'http://test/a': b'old'})
+    session = make_session(tmp_path, server)
+    session.get('http://test/a')
+    server.pages['http://test/a'] = b'new'
+    assert session.get('http://test/a').content == b'new'
+    assert session.get('http://test/a').content == b'new'
+    assert server.sent[-1][0].headers['If-None-Match'] == f'"3-{hash(b"new")}"'
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    server = FakeServer({f'http://test/{name}': name.encode() * 400 for name in 'abc'})
+    session = make_session(tmp_path, server, max_bytes=1000)
+    session.get('http://test/a')
+    session.get('http://test/b')
+    # a is used again, so b is the least recently used when c is stored
+    session.get('http://test/a')
+    session.get('http://test/c')
+    bodies = {path.stem for path in tmp_path.glob('*.body')}
+    assert bodies == {cache_key('http://test/a'), cache_key('http://test/c')}
+
+    session.get('http://test/b')
+    assert 'If-None-Match' not in server.sent[-1][0].headers
+
+def test_evicted_body_is_fetched_with_the_same_arguments(tmp_path):
+    server = FakeServer({'http://test/a': b'A' * 100})
+    session = make_session(tmp_path, server)
+    session.get('http://test/a')
+    # Another process sharing the cache removed the body
+    for path in tmp_path.glob('*.body'):
+        path.unlink()
+
+    response = session.get('http://test/a', verify=False, timeout=5, headers={'Accept': 'text/html'})
+    assert response.content == b'A' * 100
+    request, kwargs = server.sent[-1]
+    assert 'If-None-Match' not in request.headers
+    assert request.headers['Accept'] == 'text/html'
+    assert kwargs['verify'] is False and kwargs['timeout'] == 5
+
+def test_cache_persists_across_sessions(tmp_path):
+    server = FakeServer({'http://test/a': b'A' * 100})
+    make_session(tmp_path, server).get('http://test/a')
+    response = make_session(tmp_path, server).get('http://test/a')
+    assert server.sent[-1][0].headers['If-None-Match']
+    assert response.from_cache and response.content == b'A' * 100
+
+def test_hit_on_an_evicted_entry_is_not_indexed_again(tmp_path):
+    server = FakeServer({'http://test/a': b'A' * 100})
+    session = make_session(tmp_path, server)
+    session.get('http://test/a')
+
+    # Another thread evicts the entry between the read of its body and its access time update
+    touch = session._touch
+    def evict_then_touch(key, size):
+        with session._lock:
+            session.max_bytes = 0
+            session._evict()
+            session.max_bytes = 1024
+        touch(key, size)
+    session._touch = evict_then_touch
+
+    assert session.get('http://test/a').content == b'A' * 100
+    assert session._index == {} and session._size == 0
+    session._touch = touch
+    session.get('http://test/a')
+    assert session._size == 100
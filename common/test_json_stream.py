@@ -0,0 +1,35 @@
+import io
+import json
+
+import pytest
+
+from common.json_stream import iter_json_array
+
+ITEMS = [
+    {'name': 'Agen', 'hours': {'Mo': [['09:00', '19:00']]}, 'lat': 44.2},
+    ['B&amp;M MOULINS', {'lat': 46.543408}],
+    12345678901234567890,
+    -1.5e-3,
+    'text with , and ] inside',
+    None, True, False, [], {},
+]
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 7, 64 * 1024])
+def test_same_items_as_json_load(chunk_size):
+    for indent in (None, 4):
+        raw = json.dumps(ITEMS, indent=indent)
+        assert list(iter_json_array(io.StringIO(raw), chunk_size)) == ITEMS
+
+def test_empty_array():
+    assert list(iter_json_array(io.StringIO(' [ ] '), 1)) == []
+
+@pytest.mark.parametrize('raw', ['{"a": 1}', '[1, 2', '[1 2]', '[{"a": ]'])
+def test_not_an_array(raw):
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO(raw), 3))
+
+def test_items_are_read_lazily():
+    file = io.StringIO(json.dumps([{'i': i} for i in range(10000)]))
+    items = iter_json_array(file, 1024)
+    assert next(items) == {'i': 0}
+    assert file.tell() < 2048
@@ -0,0 +1,129 @@
+import datetime
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from common.runner import ROOT, load_brand
+
+marie = load_brand('marie-blachere')
+
+FIXTURE = os.path.join(ROOT, 'benchmarks', 'fixtures', 'marie_blachere_bakeries.json')
+
+MAX_AGE = datetime.timedelta(days=90)
+
+def bakery(bakery_id, label='Marie Blachère AGEN'):
+    return {'Id': bakery_id, 'Code': '7235', 'label': label, 'City': 'AGEN', 'PostalCode': '47000',
+            'url': f'/fr/france-FR/7235/{bakery_id}/details'}
+
+def known(bakery_data, days_ago=0):
+    fetched = datetime.date.today() - datetime.timedelta(days=days_ago)
+    return {'fingerprint': marie.fingerprint(bakery_data), 'fetched': fetched.isoformat()}
+
+def test_unchanged_bakeries_are_reused():
+    bakeries = [bakery('a'), bakery('b')]
+    previous = {'a': {'id': 'feature a'}, 'b': {'id': 'feature b'}}
+    state = {'a': known(bakeries[0], days_ago=10), 'b': known(bakeries[1], days_ago=90)}
+    to_fetch, reused = marie.split_unchanged(bakeries, previous, state, MAX_AGE)
+    assert to_fetch == []
+    assert reused == previous
+
+def test_old_bakeries_are_fetched_again():
+    bakeries = [bakery('a'), bakery('b')]
+    previous = {'a': {'id': 'feature a'}, 'b': {'id': 'feature b'}}
+    state = {'a': known(bakeries[0], days_ago=91), 'b': known(bakeries[1], days_ago=89)}
+    to_fetch, reused = marie.split_unchanged(bakeries, previous, state, MAX_AGE)
+    assert to_fetch == [bakeries[0]]
+    assert reused == {'b': {'id': 'feature b'}}
+
+def test_changed_bakeries_are_fetched_again():
+    state = {'a': known(bakery('a'))}
+    changed = bakery('a', label='Marie Blachère AGEN CENTRE')
+    assert marie.fingerprint(changed) != state['a']['fingerprint']
+    to_fetch, reused = marie.split_unchanged([changed], {'a': {'id': 'feature a'}}, state, MAX_AGE)
+    assert to_fetch == [changed]
+    assert reused == {}
+
+def test_new_or_missing_bakeries_are_fetched():
+    bakeries = [bakery('a'), bakery('b')]
+    # 'a' has no state, 'b' is not in the previous GeoJSON file
+    to_fetch, reused = marie.split_unchanged(bakeries, {'a': {'id': 'feature a'}}, {'b': known(bakeries[1])}, MAX_AGE)
+    assert to_fetch == bakeries
+    assert reused == {}
+
+class FakeResponse:
+    def __init__(self, status_code, content=b''):
+        self.status_code = status_code
+        self.content = content
+
+class FakeSite:
+    """The bakery list and the bakery pages of the fixture, answering the first bakeries last."""
+
+    def __init__(self):
+        with open(FIXTURE, encoding='utf-8') as file:
+            self.bakeries = json.load(file)
+        self.pages = {marie.get_bakery_url(item['bakery']): item['page'].encode('utf-8') for item in self.bakeries}
+        self.missing = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def all_page(self):
+        data = {'props': {'pageProps': {'allPois': [item['bakery'] for item in self.bakeries]}}}
+        return f'<script id="__NEXT_DATA__" type="application/json">{json.dumps(data)}</script>'.encode('utf-8')
+
+    def get(self, url, verify=True):
+        if url == marie.ALL_URL:
+            return FakeResponse(200, self.all_page())
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        urls = list(self.pages)
+        time.sleep(0.001 * (len(urls) - urls.index(url)))
+        with self._lock:
+            self.in_flight -= 1
+        if url in self.missing:
+            return FakeResponse(404)
+        return FakeResponse(200, self.pages[url])
+
+@pytest.fixture
+def run_files(tmp_path, monkeypatch):
+    for name in ('STATE_FILE', 'CHECKPOINT_FILE', 'GEOJSON_FILE', 'OSM_FILE', 'HISTORY_FILE', 'HISTORY_DB'):
+        monkeypatch.setattr(marie, name, str(tmp_path / os.path.basename(getattr(marie, name))))
+    monkeypatch.setattr(marie, 'HERE', str(tmp_path))
+    monkeypatch.setattr(marie, 'pending_state', None)
+    monkeypatch.delenv('SCRAPER_SNAPSHOT', raising=False)
+    return tmp_path
+
+def test_concurrent_fetch_keeps_the_bakery_order(run_files):
+    site = FakeSite()
+    features = marie.transform(marie.fetch(site, concurrency=8))
+    assert 1 < site.max_in_flight <= 8
+    assert [f['properties']['ref:FR:MarieBlachere:id'] for f in features] == [item['bakery']['Id'] for item in site.bakeries]
+    assert features == marie.transform(marie.fetch(FakeSite(), concurrency=1))
+
+def test_missing_bakery_pages_are_skipped(run_files):
+    site = FakeSite()
+    missing = list(site.pages)[3]
+    site.missing.add(missing)
+    features = marie.transform(marie.fetch(site, concurrency=8))
+    assert len(features) == len(site.bakeries) - 1
+    assert missing not in {f['properties']['website'] for f in features}
+    # A bakery that was not fetched is not recorded as fetched
+    assert len(marie.pending_state) == len(site.bakeries) - 1
+
+def test_state_is_saved_once_the_outputs_are_written(run_files):
+    features = marie.transform(marie.fetch(FakeSite(), concurrency=8))
+    # The OSM file cannot be moved in place, so the write fails after the fetch
+    os.mkdir(marie.OSM_FILE)
+    with pytest.raises(OSError):
+        marie.write(features)
+    assert not os.path.exists(marie.STATE_FILE)
+
+    os.rmdir(marie.OSM_FILE)
+    marie.write(features)
+    with open(marie.STATE_FILE, encoding='utf-8') as file:
+        assert len(json.load(file)) == len(features)
+    assert marie.pending_state is None
@@ -0,0 +1,72 @@
+import datetime
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from common.geojson_writer import FeatureCollectionWriter, write_features
+from common.metrics import RunMetrics, percentile, propagate, record_response, run_instrumented, stage
+from common.osm_writer import OsmWriter
+
+FEATURES = [
+    {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [2.35, 48.85]}, 'properties': {'ref': str(i)}}
+    for i in range(10)
+]
+
+def response(status_code, content, seconds):
+    result = requests.Response()
+    result.status_code = status_code
+    result._content = content
+    result.elapsed = datetime.timedelta(seconds=seconds)
+    return result
+
+def test_percentile():
+    values = [0.5, 0.1, 0.3, 0.2, 0.4]
+    assert percentile(values, 50) == 0.3
+    assert percentile(values, 95) == 0.5
+    assert percentile([], 50) is None
+
+def parse(i):
+    with stage('parse'):
+        return i
+
+def test_stages_are_recorded_from_worker_threads():
+    metrics = RunMetrics('test')
+    with metrics.activate():
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            assert list(executor.map(propagate(parse), range(8))) == list(range(8))
+            list(executor.map(parse, range(8)))
+        with stage('transform'):
+            pass
+    with stage('transform'):
+        pass
+    assert metrics.stages['parse']['calls'] == 8
+    assert metrics.stages['transform']['calls'] == 1
+
+def test_responses():
+    metrics = RunMetrics('test')
+    with metrics.activate():
+        record_response(response(200, b'12345', 0.2))
+        record_response(response(304, b'', 0.1))
+        record_response(response(500, b'oops', 0.3))
+    record_response(response(200, b'ignored', 1.0))
+    requests_report = metrics.report()['requests']
+    assert requests_report == {
+        'count': 3, 'bytes': 9, 'not_modified': 1, 'errors': 1, 'latency_p50': 0.2, 'latency_p95': 0.3,
+    }
+
+def test_run_report(tmp_path):
+    report_file = tmp_path / 'brand.metrics.json'
+
+    def write(features):
+        write_features(features, FeatureCollectionWriter(str(tmp_path / 'brand.geojson')),
+                       OsmWriter(str(tmp_path / 'brand.osm')))
+
+    metrics = run_instrumented(str(report_file), None, lambda session: FEATURES, list, write)
+    report = json.loads(report_file.read_text())
+    assert report['name'] == metrics.name == 'brand'
+    assert report['features'] == 10
+    assert report['features_per_second'] > 0
+    assert set(report['stages']) == {'fetch', 'transform', 'write', 'serialize', 'osm-export'}
+    assert report['stages']['serialize']['calls'] == 1
+    assert report['requests']['count'] == 0
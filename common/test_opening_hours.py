@@ -0,0 +1,64 @@
+from common.opening_hours import CACHE_SIZE, compile_opening_hours, intern_schedule, make_schedule, parse_schedule, same_opening_hours
+from common.runner import load_brand
+
+WEEKDAYS = [(day, '08:30-18:00') for day in range(5)]
+
+def test_group_consecutive_days():
+    assert compile_opening_hours(WEEKDAYS) == 'Mo-Fr 08:30-18:00'
+    assert compile_opening_hours(WEEKDAYS + [(5, '08:30-12:00'), (6, '08:30-12:00')]) == 'Mo-Fr 08:30-18:00; Sa-Su 08:30-12:00'
+
+def test_split_non_consecutive_days():
+    pairs = [(0, '08:30-18:00'), (2, '08:30-18:00'), (3, '08:30-23:00'), (4, '08:30-18:00')]
+    assert compile_opening_hours(pairs) == 'Mo 08:30-18:00; We 08:30-18:00; Th 08:30-23:00; Fr 08:30-18:00'
+    assert compile_opening_hours([(0, '06:00-22:00'), (1, '06:00-22:00'), (5, '06:00-22:00')]) == 'Mo-Tu 06:00-22:00; Sa 06:00-22:00'
+
+def test_whole_week():
+    assert compile_opening_hours((day, '06:00-22:00') for day in range(7)) == '06:00-22:00'
+
+def test_several_intervals_per_day():
+    pairs = [(0, '14:00-19:00'), (0, '9:00-12:00'), (1, '09:00-12:00'), (1, '14:00-19:00')]
+    assert compile_opening_hours(pairs) == 'Mo-Tu 09:00-12:00,14:00-19:00'
+
+def test_closed():
+    assert compile_opening_hours([]) == ''
+    assert compile_opening_hours([(0, ''), (1, None)]) == ''
+
+def test_identical_schedules_are_shared():
+    assert make_schedule(WEEKDAYS) is make_schedule(list(reversed(WEEKDAYS)))
+
+def test_interned_schedules_are_bounded():
+    for minute in range(CACHE_SIZE + 10):
+        make_schedule([(0, f'08:00-{minute // 60 + 12:02d}:{minute % 60:02d}')])
+    assert intern_schedule.cache_info().currsize == CACHE_SIZE
+
+def test_action_closed_days():
+    action = load_brand('action')
+    shop = {'openingDays': [
+        {'dayName': 'Maandag', 'openingHour': [{'openFrom': '09:00', 'openUntil': '20:00'}]},
+        {'dayName': 'Dinsdag', 'openingHour': [{'openFrom': '09:00', 'openUntil': '20:00'}]},
+        {'dayName': None, 'openingHour': []},
+        {'openingHour': None},
+    ]}
+    assert action.parse_opening_hours(shop) == 'Mo-Tu 09:00-20:00'
+
+def test_previous_formats_are_the_same_schedule():
+    assert same_opening_hours('Mo, Tu, We, Th, Fr, Sa 09:00-21:00; Su 09:00-20:00', 'Mo-Sa 09:00-21:00; Su 09:00-20:00')
+    assert same_opening_hours('Mo 06:30-19:30; Tu 06:30-19:30; We 06:30-19:30', 'Mo-We 06:30-19:30')
+    assert same_opening_hours('Mo, Tu, We, Th, Fr, Sa, Su 08:00-20:00', '08:00-20:00')
+    assert same_opening_hours('Su 09:00-18:00; Mo-Sa 9:00-19:00', 'Mo-Sa 09:00-19:00; Su 09:00-18:00')
+    assert not same_opening_hours('Mo-Sa 09:00-19:00', 'Mo-Fr 09:00-19:00')
+    assert not same_opening_hours('Mo-Sa 09:00-19:00', None)
+    assert parse_schedule('Mo-Fr 09:00-19:00; PH off') is None
+    assert parse_schedule(compile_opening_hours(WEEKDAYS)) == make_schedule(WEEKDAYS)
+
+if __name__ == "__main__":
+    test_group_consecutive_days()
+    test_split_non_consecutive_days()
+    test_whole_week()
+    test_several_intervals_per_day()
+    test_closed()
+    test_identical_schedules_are_shared()
+    test_interned_schedules_are_bounded()
+    test_action_closed_days()
+    test_previous_formats_are_the_same_schedule()
+    print("All tests passed!")
@@ -0,0 +1,77 @@
+import json
+import os
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from common.osm_writer import OsmWriter
+from common.runner import ROOT, load_brand
+
+FIXTURE = os.path.join(ROOT, 'benchmarks', 'fixtures', 'marie_blachere_bakeries.json')
+
+def point(lon, lat, **properties):
+    return {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [lon, lat]}, 'properties': properties}
+
+def write_osm(path, features):
+    with OsmWriter(str(path)) as writer:
+        for feature in features:
+            writer.write(feature)
+    return path.read_text(encoding='utf-8')
+
+def test_tag_values_are_escaped(tmp_path):
+    value = 'Rue de l\'Église "A" & <B>\n\tfin\r'
+    xml = write_osm(tmp_path / 'shops.osm', [point(2.35, 48.85, name=value)])
+    assert '&amp;' in xml and '&lt;B&gt;' in xml and '&quot;A&quot;' in xml
+    assert '&#10;' in xml and '&#09;' in xml and '&#13;' in xml
+    tag = ET.fromstring(xml).find('node/tag')
+    assert tag.get('k') == 'name'
+    assert tag.get('v') == value
+
+def test_negative_ids_in_write_order(tmp_path):
+    features = [point(1.0, 45.0, ref='a'), point(2.0, 46.0), point(3.0, 47.0, ref='c')]
+    nodes = ET.fromstring(write_osm(tmp_path / 'shops.osm', features)).findall('node')
+    assert [node.get('id') for node in nodes] == ['-1', '-2', '-3']
+    assert [node.get('lon') for node in nodes] == ['1.0', '2.0', '3.0']
+    # A node without tags is written empty, like geojson2osm
+    assert list(nodes[1]) == []
+
+def test_none_properties_and_other_geometries_are_skipped(tmp_path):
+    line = {'type': 'Feature', 'geometry': {'type': 'LineString', 'coordinates': [[0, 0], [1, 1]]}, 'properties': {}}
+    features = [point(1.0, 45.0, name='A', phone=None), line, point(2.0, 46.0, name='B')]
+    nodes = ET.fromstring(write_osm(tmp_path / 'shops.osm', features)).findall('node')
+    assert [node.get('id') for node in nodes] == ['-1', '-2']
+    assert [tag.get('k') for tag in nodes[0]] == ['name']
+
+def test_duplicate_coordinates_are_kept(tmp_path):
+    features = [point(5.0, 45.0, name='Webcam 1'), point(5.0, 45.0, name='Webcam 2')]
+    nodes = ET.fromstring(write_osm(tmp_path / 'webcams.osm', features)).findall('node')
+    assert [(node.get('id'), node.find('tag').get('v')) for node in nodes] == [('-1', 'Webcam 1'), ('-2', 'Webcam 2')]
+
+def test_empty_document(tmp_path):
+    assert write_osm(tmp_path / 'shops.osm', []) == '<osm version="0.6" generator="geojson2osm"></osm>'
+
+def test_abort_keeps_the_previous_file(tmp_path):
+    path = tmp_path / 'shops.osm'
+    path.write_text('previous', encoding='utf-8')
+    with pytest.raises(RuntimeError):
+        with OsmWriter(str(path)) as writer:
+            writer.write(point(1.0, 45.0, name='A'))
+            raise RuntimeError('fetch failed')
+    assert path.read_text(encoding='utf-8') == 'previous'
+    assert os.listdir(tmp_path) == ['shops.osm']
+
+def test_same_bytes_as_geojson2osm(tmp_path):
+    geojson2osm = pytest.importorskip('geojson2osm').geojson2osm
+    marie = load_brand('marie-blachere')
+    with open(FIXTURE, encoding='utf-8') as file:
+        bakeries = json.load(file)
+    features = [marie.bakery_feature(item['bakery'], marie.parse_json_ld(item['page'].encode('utf-8'))) for item in bakeries]
+    features = [feature for feature in features if feature is not None]
+    assert features
+    # geojson2osm merges points with the same coordinates: the fixture has none
+    assert len({tuple(feature['geometry']['coordinates']) for feature in features}) == len(features)
+
+    path = tmp_path / 'marie_blachere.osm'
+    write_osm(path, features)
+    expected = geojson2osm({'type': 'FeatureCollection', 'features': features})
+    assert path.read_bytes() == expected.encode('utf-8')
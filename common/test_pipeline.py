@@ -0,0 +1,78 @@
+import json
+import threading
+import time
+
+import pytest
+
+from common.geojson_writer import FeatureCollectionWriter, write_features
+from common.pipeline import Pipeline, run_pipeline
+
+def point(i):
+    return {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [2.35, 48.85]}, 'properties': {'ref': i}}
+
+def test_records_go_through_every_stage_in_order():
+    pipeline = Pipeline(range(100), lambda i: i * 2, lambda i: None if i % 3 == 0 else i + 1)
+    assert list(pipeline) == [i * 2 + 1 for i in range(100) if i * 2 % 3 != 0]
+
+def test_slow_writer_holds_back_the_source():
+    produced = []
+
+    def source():
+        for i in range(200):
+            produced.append(i)
+            yield i
+
+    consumed = 0
+    ahead = 0
+    for _ in Pipeline(source(), lambda i: i, depth=4):
+        consumed += 1
+        time.sleep(0.001)
+        ahead = max(ahead, len(produced) - consumed)
+    assert consumed == 200
+    # Two queues of 4, and one record held by each thread
+    assert ahead <= 2 * 4 + 2
+
+def test_failure_aborts_the_writers(tmp_path):
+    path = tmp_path / 'shops.geojson'
+    path.write_text('previous')
+
+    def transform(i):
+        if i == 50:
+            raise ValueError(i)
+        return point(i)
+
+    with pytest.raises(ValueError):
+        write_features(Pipeline(range(100), transform), FeatureCollectionWriter(str(path)))
+    assert path.read_text() == 'previous'
+    assert [file.name for file in tmp_path.iterdir()] == ['shops.geojson']
+
+def test_writer_failure_stops_the_source(tmp_path):
+    def endless(session):
+        i = 0
+        while True:
+            yield i
+            i += 1
+
+    def write(features):
+        for i, _ in enumerate(features):
+            if i == 10:
+                raise OSError('disk full')
+
+    threads = threading.active_count()
+    with pytest.raises(OSError):
+        run_pipeline(str(tmp_path / 'brand.metrics.json'), None, endless, point, write, depth=2)
+    assert threading.active_count() == threads
+
+def test_run_pipeline_report(tmp_path):
+    def write(features):
+        return write_features(features, FeatureCollectionWriter(str(tmp_path / 'brand.geojson')))
+
+    report_file = tmp_path / 'brand.metrics.json'
+    metrics = run_pipeline(str(report_file), None, lambda session: range(20), point, write)
+    assert metrics.features == 20
+    report = json.loads(report_file.read_text())
+    assert report['stages']['fetch']['calls'] == 21
+    assert report['stages']['transform']['calls'] == 20
+    for stage in ('write', 'serialize', 'pipeline'):
+        assert stage in report['stages']
+    assert len(json.loads((tmp_path / 'brand.geojson').read_text())['features']) == 20
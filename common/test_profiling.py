@@ -0,0 +1,34 @@
+import pstats
+from concurrent.futures import ThreadPoolExecutor
+
+from common.metrics import propagate, run_instrumented
+from common.profiling import PROFILE_ENV
+
+def square(i):
+    return i * i
+
+def fetch(session):
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        return list(executor.map(propagate(square), range(20)))
+
+def transform(data):
+    return [{'value': value} for value in data]
+
+def test_profiles_per_stage(tmp_path, monkeypatch):
+    monkeypatch.setenv(PROFILE_ENV, '1')
+    run_instrumented(str(tmp_path / 'brand.metrics.json'), None, fetch, transform, lambda features: None)
+
+    for stage in ('fetch', 'transform', 'write'):
+        assert (tmp_path / f'brand.{stage}.prof').exists()
+    memory = (tmp_path / 'brand.memory.txt').read_text()
+    assert memory.startswith('fetch: ')
+
+    # The calls made by the worker threads are merged into the stage
+    stats = pstats.Stats(str(tmp_path / 'brand.fetch.prof')).stats
+    calls = sum(ncalls for (_, _, function), (_, ncalls, *_) in stats.items() if function == 'square')
+    assert calls == 20
+
+def test_disabled(tmp_path, monkeypatch):
+    monkeypatch.delenv(PROFILE_ENV, raising=False)
+    run_instrumented(str(tmp_path / 'brand.metrics.json'), None, fetch, transform, lambda features: None)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['brand.metrics.json']
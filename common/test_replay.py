@@ -0,0 +1,66 @@
+import http.server
+import threading
+
+import pytest
+import requests
+
+from common.http_cache import create_session
+
+class Handler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.answer(200, f'page {self.path}'.encode('utf-8'))
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.answer(201, b'posted ' + body)
+
+    def answer(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def exchanges(session, url):
+    return [
+        session.get(f'{url}/stores?page=1'),
+        session.post(f'{url}/search', data=b'{"city": "Agen"}'),
+        session.post(f'{url}/search', data=b'{"city": "Albi"}'),
+    ]
+
+def test_record_then_replay(tmp_path, monkeypatch, server):
+    monkeypatch.setenv('SCRAPER_FIXTURES', str(tmp_path))
+    monkeypatch.setenv('SCRAPER_HTTP_MODE', 'record')
+    url = f'http://127.0.0.1:{server.server_address[1]}'
+    recorded = exchanges(create_session(), url)
+    assert [r.text for r in recorded] == ['page /stores?page=1', 'posted {"city": "Agen"}', 'posted {"city": "Albi"}']
+    # One fixture per exchange: the POST body is part of the key
+    assert len(list(tmp_path.glob('*.json'))) == 3
+
+    # Replayed with the server down
+    server.shutdown()
+    server.server_close()
+    monkeypatch.setenv('SCRAPER_HTTP_MODE', 'replay')
+    replayed = exchanges(create_session(), url)
+    assert [r.text for r in replayed] == [r.text for r in recorded]
+    assert [r.status_code for r in replayed] == [200, 201, 201]
+    assert replayed[0].headers['Content-Type'] == 'text/plain; charset=utf-8'
+
+def test_missing_fixture(tmp_path, monkeypatch):
+    monkeypatch.setenv('SCRAPER_FIXTURES', str(tmp_path))
+    monkeypatch.setenv('SCRAPER_HTTP_MODE', 'replay')
+    with pytest.raises(requests.ConnectionError, match='No recorded response for POST'):
+        create_session().post('http://offline.invalid/search', data=b'{"city": "Pau"}')
@@ -0,0 +1,66 @@
+import time
+
+from common import runner
+
+PLUGIN = '''
+import time
+
+def fetch(session):
+    time.sleep(0.2)
+    return session
+
+def transform(data):
+    return [data]
+
+def write(features):
+    WRITTEN.extend(features)
+
+WRITTEN = []
+'''
+
+def make_brands(tmp_path, monkeypatch, names):
+    for name in names:
+        (tmp_path / f'{name}.py').write_text(PLUGIN)
+    (tmp_path / 'broken.py').write_text(PLUGIN.replace('time.sleep(0.2)', 'raise ValueError(session)'))
+    (tmp_path / 'exits.py').write_text(PLUGIN.replace('time.sleep(0.2)', 'exit()'))
+    monkeypatch.setattr(runner, 'ROOT', str(tmp_path))
+    monkeypatch.setattr(runner, 'BRANDS', {name: f'{name}.py' for name in [*names, 'broken', 'exits']})
+
+def test_brands_run_concurrently(tmp_path, monkeypatch):
+    make_brands(tmp_path, monkeypatch, ['a', 'b', 'c', 'd'])
+    start = time.perf_counter()
+    results = runner.run(['a', 'b', 'c', 'd'], 'session')
+    assert time.perf_counter() - start < 0.6
+    assert list(results) == ['a', 'b', 'c', 'd']
+    assert all(isinstance(seconds, float) for seconds in results.values())
+
+def test_failure_does_not_stop_other_brands(tmp_path, monkeypatch):
+    make_brands(tmp_path, monkeypatch, ['a'])
+    results = runner.run(['broken', 'exits', 'a'], 'session')
+    assert isinstance(results['broken'], ValueError)
+    assert isinstance(results['exits'], SystemExit)
+    assert isinstance(results['a'], float)
+
+STREAMING_PLUGIN = '''
+STREAMING = True
+
+def fetch(session):
+    yield from range(5)
+
+def transform(record):
+    return record * 2
+
+def write(features):
+    WRITTEN.extend(features)
+    return len(WRITTEN)
+
+WRITTEN = []
+'''
+
+def test_streaming_brand(tmp_path, monkeypatch):
+    (tmp_path / 'stream.py').write_text(STREAMING_PLUGIN)
+    monkeypatch.setattr(runner, 'ROOT', str(tmp_path))
+    monkeypatch.setattr(runner, 'BRANDS', {'stream': 'stream.py'})
+    module = runner.load_brand('stream')
+    assert isinstance(runner.run_brand(module, 'session'), float)
+    assert module.WRITTEN == [0, 2, 4, 6, 8]
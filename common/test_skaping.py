@@ -0,0 +1,83 @@
+import os
+import re
+
+import pytest
+
+from common.runner import ROOT, load_brand
+
+skaping = load_brand('skaping')
+
+FIXTURE = os.path.join(ROOT, 'benchmarks', 'fixtures', 'skaping_map.html')
+
+def regex_extraction(script_text, index):
+    """Matches of the patterns used for markers[index] and windows[index] before scan_script."""
+    marker_regex = re.compile(r'markers\[' + str(index) + r'\].*?\[(.*?), (.*?)\]')
+    window_regex = re.compile(r'windows\[' + str(index) + r'\].*(?:(?!\n\s*\n)[\s\S])*?\.setContent\(\"([\s\S]*?)\"\)')
+    return marker_regex.findall(script_text), window_regex.findall(script_text)
+
+def assert_same_as_regexes(script_text):
+    markers, windows = skaping.scan_script(script_text)
+    indexes = set(markers) | set(windows)
+    # One past the last index, and an index absent from the script
+    for index in sorted(indexes | {max(indexes, default=0) + 1, 0}):
+        assert (markers.get(index, []), windows.get(index, [])) == regex_extraction(script_text, index)
+    return markers, windows
+
+SCRIPT = '''
+var markers = [], windows = [];
+markers[1] = L.marker([44.36097, 6.604173], {icon: icon}).addTo(map);
+windows[1] = L.popup();
+markers[1].bindPopup(windows[1]);
+windows[1].setContent("<a href=\\"http://www.skaping.com/a\\">A</a>");
+
+markers[10] = L.marker([45.3, 6.4], {icon: icon}).addTo(map);
+windows[10] = L.popup();
+windows[10].setContent("<a href=\\"http://www.skaping.com/b\\">B</a>");
+
+markers[2] = L.marker([46.0, 7.0], {icon: icon}).addTo(map);
+windows[2] = L.popup();
+windows[2].setContent("C");
+windows[2].setContent("D");
+'''
+
+def test_same_matches_as_the_regexes():
+    markers, windows = assert_same_as_regexes(SCRIPT)
+    # markers[1] does not match markers[10]
+    assert markers[1] == [('44.36097', '6.604173')]
+    assert windows[1] == ['<a href=\\"http://www.skaping.com/a\\">A</a>']
+    assert windows[10] == ['<a href=\\"http://www.skaping.com/b\\">B</a>']
+    assert windows[2] == ['C', 'D']
+
+def test_blank_line_ends_a_window():
+    script = 'markers[1] = L.marker([1.0, 2.0]);\nwindows[1] = L.popup();\n \nother.setContent("A");\n'
+    assert assert_same_as_regexes(script) == ({1: [('1.0', '2.0')]}, {})
+
+def test_blank_lines_of_several_lines():
+    script = ('windows[1] = L.popup();\n\n\nwindows[1].setContent("A");\n'
+              'windows[2] = L.popup();\n \t\n  \n\nwindows[2].setContent("B");\n'
+              'windows[3] = L.popup();\nwindows[3].setContent("C");\n\n')
+    assert assert_same_as_regexes(script) == ({}, {1: ['A'], 2: ['C'], 3: ['C']})
+
+def test_script_without_blank_lines():
+    script = ''.join(f'markers[{i}] = L.marker([{i}.0, 2.0]);\nwindows[{i}] = L.popup();\nwindows[{i}].setContent("{i}");\n'
+                     for i in range(1, 200))
+    markers, windows = assert_same_as_regexes(script)
+    assert len(markers) == len(windows) == 199
+
+def test_mismatch_is_detected():
+    with pytest.raises(Exception, match='Mismatch between 1 marker and 2 for index 2'):
+        skaping.parse_html(f'<script>{SCRIPT}</script>')
+
+def test_fixture_page():
+    from bs4 import BeautifulSoup
+
+    with open(FIXTURE, encoding='utf-8') as file:
+        html_content = file.read()
+    scripts = [script.string for script in BeautifulSoup(html_content, 'html.parser').find_all('script') if script.string]
+    total = 0
+    for script_text in scripts:
+        markers, _ = assert_same_as_regexes(script_text)
+        total += len(markers)
+    features = skaping.parse_html(html_content)
+    assert len(features) == total == 846
+    assert all(feature['properties']['contact:webcam'] for feature in features)
@@ -0,0 +1,59 @@
+import pytest
+
+from common.geojson_writer import write_features
+from common.snapshot import build_column, load_snapshot, snapshot_writers
+
+pa = pytest.importorskip('pyarrow')
+
+FEATURES = [
+    {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [2.35, 48.85]},
+     'properties': {'brand': 'GiFi', 'ref': 1, 'phone': '+33 1'}},
+    {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [0.62, 44.2]},
+     'properties': {'brand': 'GiFi', 'ref': 2, 'website': 'https://example.com'}},
+]
+
+def write_snapshot(fmt, monkeypatch, tmp_path):
+    monkeypatch.setenv('SCRAPER_SNAPSHOT', fmt)
+    writers = snapshot_writers(str(tmp_path / 'shops.geojson'))
+    write_features(FEATURES, *writers)
+    return load_snapshot(writers[0].path)
+
+@pytest.mark.parametrize('fmt', ['parquet', 'arrow'])
+def test_round_trip(fmt, monkeypatch, tmp_path):
+    table = write_snapshot(fmt, monkeypatch, tmp_path)
+    assert table.to_pylist() == [
+        {'lon': 2.35, 'lat': 48.85, 'brand': 'GiFi', 'phone': '+33 1', 'ref': 1, 'website': None},
+        {'lon': 0.62, 'lat': 44.2, 'brand': 'GiFi', 'phone': None, 'ref': 2, 'website': 'https://example.com'},
+    ]
+
+def test_string_coordinates(monkeypatch, tmp_path):
+    monkeypatch.setenv('SCRAPER_SNAPSHOT', 'parquet')
+    writers = snapshot_writers(str(tmp_path / 'shops.geojson'))
+    feature = {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': ['-8.310888888889', '41.200471944444']},
+               'properties': {'brand': 'Action'}}
+    write_features([feature], *writers)
+    assert load_snapshot(writers[0].path).to_pylist() == [{'lon': -8.310888888889, 'lat': 41.200471944444, 'brand': 'Action'}]
+
+def test_repeated_strings_are_dictionary_encoded(monkeypatch, tmp_path):
+    table = write_snapshot('arrow', monkeypatch, tmp_path)
+    assert pa.types.is_dictionary(table.schema.field('brand').type)
+    assert pa.types.is_string(table.schema.field('phone').type)
+
+def test_disabled(monkeypatch):
+    monkeypatch.delenv('SCRAPER_SNAPSHOT', raising=False)
+    assert snapshot_writers('shops.geojson') == []
+
+def test_mixed_types_are_stored_as_strings():
+    values = [['a', 'b'], 'c', {'d': 1}, ['a', 'b'], ['a', 'b'], 'c', ['a', 'b'], None]
+    array = build_column(values)
+    assert pa.types.is_dictionary(array.type)
+    assert array.to_pylist() == ["['a', 'b']", 'c', "{'d': 1}", "['a', 'b']", "['a', 'b']", 'c', "['a', 'b']", None]
+    assert pa.types.is_string(build_column([['a'], 'b', {'c': 1}]).type)
+
+def test_failed_write_leaves_no_temporary_file(monkeypatch, tmp_path):
+    # The destination is a directory, so moving the snapshot in place fails
+    (tmp_path / 'shops.parquet').mkdir()
+    monkeypatch.setenv('SCRAPER_SNAPSHOT', 'parquet')
+    with pytest.raises(OSError):
+        write_features(FEATURES, *snapshot_writers(str(tmp_path / 'shops.geojson')))
+    assert [p.name for p in tmp_path.iterdir()] == ['shops.parquet']
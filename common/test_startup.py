@@ -0,0 +1,9 @@
+import pytest
+
+from common.startup import ENTRY_POINTS, import_entry_point
+
+@pytest.mark.parametrize('path', ENTRY_POINTS)
+def test_import_is_light_and_offline(path):
+    report = import_entry_point(path)
+    assert report['heavy'] == []
+    assert report['network'] == []
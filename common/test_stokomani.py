@@ -0,0 +1,69 @@
+import datetime
+import json
+import threading
+import time
+
+from common.runner import load_brand
+
+stokomani = load_brand('stokomani')
+
+WEBSITES = [f'https://www.stokomani.fr/pages/boutique-stokomani-{i}' for i in range(20)]
+TTL = datetime.timedelta(days=30)
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+class FakeSession:
+    """Answer HEAD requests with status_codes[url], 200 by default."""
+
+    def __init__(self, status_codes=None):
+        self.status_codes = status_codes or {}
+        self.checked = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def head(self, url, allow_redirects=False, timeout=None):
+        with self._lock:
+            self.checked.append(url)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.005)
+        with self._lock:
+            self.in_flight -= 1
+        return FakeResponse(self.status_codes.get(url, 200))
+
+def verify(websites, session, cache_file, ttl=TTL):
+    stokomani.verify_websites(websites, concurrency=4, ttl=ttl, session=session, cache_file=str(cache_file))
+    with open(cache_file, encoding='utf-8') as file:
+        return json.load(file)
+
+def test_websites_are_checked_concurrently(tmp_path):
+    session = FakeSession({WEBSITES[0]: 404})
+    cache = verify(WEBSITES, session, tmp_path / 'website_cache.json')
+    assert sorted(session.checked) == sorted(WEBSITES)
+    assert 1 < session.max_in_flight <= 4
+    # Only the websites answering 200 are cached
+    assert sorted(cache) == sorted(WEBSITES[1:])
+
+def test_cached_websites_are_not_checked_again(tmp_path):
+    cache_file = tmp_path / 'website_cache.json'
+    verify(WEBSITES[:10], FakeSession(), cache_file)
+    session = FakeSession()
+    cache = verify(WEBSITES, session, cache_file)
+    assert sorted(session.checked) == sorted(WEBSITES[10:])
+    assert sorted(cache) == sorted(WEBSITES)
+
+def test_expired_websites_are_checked_again(tmp_path):
+    cache_file = tmp_path / 'website_cache.json'
+    now = datetime.datetime.now()
+    cache_file.write_text(json.dumps({
+        WEBSITES[0]: (now - datetime.timedelta(days=31)).isoformat(timespec='seconds'),
+        WEBSITES[1]: (now - datetime.timedelta(days=29)).isoformat(timespec='seconds'),
+    }), encoding='utf-8')
+    session = FakeSession({WEBSITES[0]: 404})
+    cache = verify(WEBSITES[:2], session, cache_file)
+    assert session.checked == [WEBSITES[0]]
+    # An expired website that no longer answers is dropped from the cache
+    assert list(cache) == [WEBSITES[1]]